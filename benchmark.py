@@ -0,0 +1,561 @@
+import time
+from argparse import ArgumentParser
+
+from utils import get_urlfingerprint
+
+
+def _synthetic_urls(count, start=0):
+    hosts = ["www.ics.uci.edu", "www.cs.uci.edu",
+             "www.informatics.uci.edu", "www.stat.uci.edu"]
+    for i in range(start, start + count):
+        yield f"https://{hosts[i % 4]}/~user{i % 997}/pages/{i}.html?id={i}"
+
+
+def bench_seen(sizes):
+    ''' Bytes per url and lookups per second of the frontier's seen filter. '''
+    from crawler.seen import SeenFilter
+
+    for size in sizes:
+        seen = SeenFilter()
+        start = time.perf_counter()
+        for url in _synthetic_urls(size):
+            seen.add(get_urlfingerprint(url))
+        add_time = time.perf_counter() - start
+
+        lookups = min(size, 1000000)
+        start = time.perf_counter()
+        hits = sum(get_urlfingerprint(url) in seen
+                   for url in _synthetic_urls(lookups))
+        hit_time = time.perf_counter() - start
+        start = time.perf_counter()
+        false_positives = sum(get_urlfingerprint(url) in seen
+                              for url in _synthetic_urls(lookups, size))
+        miss_time = time.perf_counter() - start
+
+        print(f"seen filter, {size} urls:")
+        print(f"\tbytes per url: {seen.nbytes / size:.2f} "
+              f"({len(seen.filters)} bloom filters, {seen.nbytes} bytes)")
+        print(f"\tadds per second: {size / add_time:,.0f}")
+        print(f"\tlookups per second (hits): {lookups / hit_time:,.0f} "
+              f"({hits} hits)")
+        print(f"\tlookups per second (misses): {lookups / miss_time:,.0f} "
+              f"(false positive rate {false_positives / lookups:.4f}, "
+              f"only these reach the save file)")
+
+
+def _legacy_tokenize(content):
+    # tokenizer.tokenize before it was rewritten on top of a compiled regex
+    tokens = []
+    current_token = ""
+    for s in content:
+        s = s.replace(u'\xa0', u' ')
+        for c in s:
+            if (c.isalnum() and c.isascii()) or c == "'":
+                current_token += c.lower()
+            else:
+                if len(current_token) > 0:
+                    tokens.append(current_token)
+                current_token = ""
+        if len(current_token) > 0:
+            tokens.append(current_token)
+        current_token = ""
+    return tokens
+
+
+def _synthetic_page(words, seed=0):
+    import random
+    rng = random.Random(seed)
+    vocabulary = ["research", "Computer", "Science", "don't", "2022", "x",
+                  "UCI", "informatics", "caf\u00e9", "na\u00efve", "\u212a",
+                  "Irvine,CA", "a\xa0b", "(949)", "e-mail", "<ics>"]
+    lines = list()
+    for i in range(0, words, 12):
+        lines.append(" ".join(rng.choice(vocabulary) for _ in range(12)))
+    return lines
+
+
+def bench_tokenize(sizes, repeat):
+    ''' Tokenizer throughput on large pages, against the original one. '''
+    import tokenizer
+
+    for size, layout in [(size, layout) for size in sizes
+                         for layout in ("lines", "one string")]:
+        page = _synthetic_page(size)
+        if layout == "one string":
+            page = ["\n".join(page)]
+        kilobytes = sum(len(line) + 1 for line in page) / 1024
+        expected = _legacy_tokenize(page)
+        assert tokenizer.tokenize(page) == expected
+        assert list(tokenizer.iterTokens(page)) == expected
+        assert tokenizer.countTokens(page) == \
+            tokenizer.computeWordFrequencies(expected)
+
+        print(f"tokenize, {size} word page as {layout} "
+              f"({kilobytes:,.0f} KB):")
+        for name, run in [
+                ("legacy tokenize", lambda: _legacy_tokenize(page)),
+                ("tokenize", lambda: tokenizer.tokenize(page)),
+                ("iterTokens", lambda: sum(1 for _ in tokenizer.iterTokens(page))),
+                ("legacy tokenize + count", lambda: tokenizer.computeWordFrequencies(
+                    _legacy_tokenize(page))),
+                ("countTokens (streaming)", lambda: tokenizer.countTokens(page))]:
+            best = min(_timed(run) for _ in range(repeat))
+            print(f"\t{name}: {best * 1000:.1f} ms "
+                  f"({kilobytes / best / 1024:.1f} MB/s)")
+
+
+def _synthetic_html(words, seed=0):
+    lines = _synthetic_page(words, seed)
+    body = list()
+    for i, line in enumerate(lines):
+        if i % 10 == 0:
+            body.append(f'<h2 class="title">Section {i}</h2>')
+        body.append(f'<p>{line} <a href="/~user{i}/page{i}.html">link '
+                    f'<b>{i}</b></a> <i>more</i>text</p>')
+    return ("<!DOCTYPE html><html><head><meta charset=\"utf-8\">"
+            "<title>Benchmark page</title><style>p { color: red; }</style>"
+            "<script>var x = 1;</script></head><body>"
+            + "\n".join(body) + "</body></html>").encode("utf-8")
+
+
+def _legacy_extract(content):
+    # scraper.extract_next_links before the single-pass extractor
+    from bs4 import BeautifulSoup
+    soup = BeautifulSoup(content, 'html.parser')
+    tokens = soup.get_text().split('\n')
+    tokens = _legacy_tokenize([t for t in tokens if len(t.strip()) > 0])
+    hrefs = [link.get('href') for link in soup.find_all('a')]
+    return tokens, hrefs
+
+
+def bench_extract(sizes, repeat):
+    ''' Parse time per KB of the html extraction stage, for every backend
+    that is installed. '''
+    import extractor
+
+    runs = [("html.parser extractor",
+             lambda html: extractor.extract(html, "html.parser"))]
+    if extractor.etree is not None:
+        runs.append(("lxml extractor",
+                     lambda html: extractor.extract(html, "lxml")))
+    try:
+        import bs4
+        runs.insert(0, ("legacy BeautifulSoup + tokenize", _legacy_extract))
+    except ImportError:
+        print("bs4 is not installed, skipping the legacy baseline.")
+
+    for size in sizes:
+        html = _synthetic_html(size)
+        kilobytes = len(html) / 1024
+        page = extractor.extract(html, "html.parser")
+        print(f"extract, {size} word page ({kilobytes:,.0f} KB, "
+              f"{len(page.tokens)} tokens, {len(page.hrefs)} links):")
+        for name, run in runs:
+            best = min(_timed(lambda: run(html)) for _ in range(repeat))
+            print(f"\t{name}: {best * 1000:.1f} ms "
+                  f"({best * 1000000 / kilobytes:.1f} us/KB)")
+
+
+def bench_simhash_index(size, k, blocks, queries):
+    ''' Build time, memory and query rate of the near-duplicate index,
+    checked against a linear scan on a sample of the queries. '''
+    import random
+    import tracemalloc
+    from local_simhash import hamming_distance
+    from simhash_index import SimhashIndex
+
+    rng = random.Random(0)
+    fingerprints = [rng.getrandbits(64) for _ in range(size)]
+    tracemalloc.start()
+    start = time.perf_counter()
+    index = SimhashIndex(k, blocks)
+    for fingerprint in fingerprints:
+        index.add(fingerprint)
+    build_time = time.perf_counter() - start
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    # half of the queries are stored fingerprints with k bits flipped, the
+    # other half random fingerprints
+    probes = list()
+    for i in range(queries):
+        if i % 2:
+            probes.append(rng.getrandbits(64))
+        else:
+            fingerprint = rng.choice(fingerprints)
+            for bit in rng.sample(range(64), k):
+                fingerprint ^= 1 << bit
+            probes.append(fingerprint)
+    start = time.perf_counter()
+    found = [index.find_near_duplicate(probe) for probe in probes]
+    query_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    sample = probes[:20]
+    for probe, result in zip(sample, found):
+        expected = any(hamming_distance(probe, fingerprint) <= k
+                       for fingerprint in fingerprints)
+        assert expected == (result is not None)
+    scan_time = (time.perf_counter() - start) / len(sample)
+
+    print(f"simhash index, {size} fingerprints, k = {k}, "
+          f"{index.blocks} blocks ({len(index.tables)} tables):")
+    print(f"\tbuild: {build_time:.1f} s, {memory / 2 ** 20:.0f} MiB "
+          f"({memory / size:.0f} bytes per fingerprint)")
+    print(f"\tqueries per second: {queries / query_time:,.0f} "
+          f"({sum(r is not None for r in found)} of {queries} near-duplicates)")
+    print(f"\tlinear scan: {1 / scan_time:,.1f} queries per second")
+
+
+def _legacy_is_valid(url):
+    # scraper.is_valid before the precomputed url filter
+    import re
+    from urllib.parse import urlparse
+    parsed = urlparse(url)
+    if parsed.scheme not in set(["http", "https"]):
+        return False
+    if re.match(
+        r".*\.(css|js|bmp|gif|jpe?g|ico"
+        + r"|png|tiff?|mid|mp2|mp3|mp4"
+        + r"|wav|avi|mov|mpeg|ram|m4v|mkv|ogg|ogv|pdf"
+        + r"|ps|eps|tex|ppt|pptx|pps|ppsx|doc|docx|xls|xlsx|names"
+        + r"|data|dat|exe|bz2|tar|msi|bin|7z|psd|dmg|iso"
+        + r"|epub|dll|cnf|tgz|sha1"
+        + r"|thmx|mso|arff|rtf|jar|csv"
+        + r"|rm|smil|wmv|swf|wma|zip|rar|gz)$", parsed.path.lower()):
+        return False
+    valid_urls = [".ics.uci.edu", ".cs.uci.edu", ".informatics.uci.edu", ".stat.uci.edu"]
+    for valid_url in valid_urls:
+        if (re.search(valid_url, parsed.netloc)):
+            return True
+    return False
+
+
+def _synthetic_links(count, seed=0):
+    import random
+    rng = random.Random(seed)
+    hosts = ["www.ics.uci.edu", "vision.ics.uci.edu", "www.cs.uci.edu",
+             "www.informatics.uci.edu", "www.stat.uci.edu", "www.uci.edu",
+             "github.com", "WWW.ICS.UCI.EDU:8080"]
+    extensions = ["html", "php", "", "pdf", "jpg", "css", "txt", "tar.gz"]
+    for i in range(count):
+        scheme = "mailto" if i % 50 == 0 else rng.choice(("http", "https"))
+        extension = rng.choice(extensions)
+        path = f"/~user{i % 997}/dir{i % 31}/page{i}"
+        if extension:
+            path = f"{path}.{extension}"
+        yield f"{scheme}://{rng.choice(hosts)}{path}?id={i}"
+
+
+def bench_urlfilter(size, repeat):
+    ''' Checks per second of the url filter against the original is_valid,
+    one url at a time and as a batch. '''
+    from utils.urlfilter import UrlFilter
+
+    urls = list(_synthetic_links(size))
+    url_filter = UrlFilter()
+    allowed = url_filter.filter(urls)
+    # The original matched hosts case-sensitively and let upper case hosts
+    # (which are the same hosts) through; that is the only difference.
+    differences = set(allowed).symmetric_difference(
+        url for url in urls if _legacy_is_valid(url))
+    assert all("ICS" in url for url in differences)
+
+    print(f"url filter, {size} urls ({len(allowed)} allowed, "
+          f"{len(differences)} upper case hosts only allowed by the filter):")
+    for name, run in [
+            ("legacy is_valid", lambda: [url for url in urls if _legacy_is_valid(url)]),
+            ("UrlFilter.allows", lambda: [url for url in urls if url_filter.allows(url)]),
+            ("UrlFilter.filter (batch)", lambda: url_filter.filter(urls))]:
+        best = min(_timed(run) for _ in range(repeat))
+        print(f"\t{name}: {best:.2f} s ({size / best:,.0f} urls per second)")
+
+
+class _StageTimer(object):
+    # Wall time of every call to the functions it wraps, by stage name.
+
+    def __init__(self):
+        self.times = dict()     # key = stage, val = list of seconds
+        self.patched = list()   # (owner, attribute, original)
+
+    def wrap(self, owner, attribute, stage):
+        import inspect
+        import functools
+        original = getattr(owner, attribute)
+        times = self.times.setdefault(stage, list())
+        if inspect.iscoroutinefunction(original):
+            @functools.wraps(original)
+            async def timed(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return await original(*args, **kwargs)
+                finally:
+                    times.append(time.perf_counter() - start)
+        else:
+            @functools.wraps(original)
+            def timed(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return original(*args, **kwargs)
+                finally:
+                    times.append(time.perf_counter() - start)
+        setattr(owner, attribute, timed)
+        self.patched.append((owner, attribute, original))
+
+    def restore(self):
+        for owner, attribute, original in reversed(self.patched):
+            setattr(owner, attribute, original)
+        self.patched = list()
+
+
+def _percentile(values, fraction):
+    # values must be sorted
+    return values[min(int(fraction * len(values)), len(values) - 1)]
+
+
+CRAWL_SCENARIOS = {
+    # name: config overrides, as (section, key, value)
+    "thread": [("LOCAL PROPERTIES", "WORKER", "thread")],
+    "async": [("LOCAL PROPERTIES", "WORKER", "async"),
+              ("LOCAL PROPERTIES", "THREADCOUNT", "1")],
+    "pipeline": [("LOCAL PROPERTIES", "WORKER", "thread"),
+                 ("LOCAL PROPERTIES", "PARSEPROCESSES", "2")],
+}
+
+
+def _crawl_scenario(name, config_file, address, site, threads):
+    import resource
+    import scraper
+    import crawler.worker
+    from configparser import ConfigParser
+    from utils.config import Config
+    from utils.robots import robots_cache
+    from utils.async_download import AsyncDownloader
+    from crawler import Crawler
+    from crawler.frontier import Frontier
+    from crawler.worker import Worker, AsyncWorker
+
+    cparser = ConfigParser()
+    cparser.read(config_file)
+    cparser["CRAWLER"]["SEEDURL"] = site.url(0)
+    cparser["CRAWLER"]["POLITENESS"] = "0"
+    cparser["CRAWLER"]["INCREMENTAL"] = "false"
+    cparser["LOCAL PROPERTIES"]["THREADCOUNT"] = str(threads)
+    cparser["LOCAL PROPERTIES"]["PARSEPROCESSES"] = "0"
+    cparser["LOCAL PROPERTIES"]["PROCESSES"] = "1"
+    for section, key, value in CRAWL_SCENARIOS[name]:
+        cparser[section][key] = value
+    config = Config(cparser)
+    # Instead of registering with the real cache server.
+    config.cache_server = address
+
+    timer = _StageTimer()
+    timer.wrap(crawler.worker, "download", "download")
+    timer.wrap(AsyncDownloader, "download", "download")
+    timer.wrap(scraper, "scraper", "scraper")
+    timer.wrap(scraper, "extract", "  extract (html, tokens)")
+    timer.wrap(scraper, "computeWordFrequencies", "  word frequencies")
+    timer.wrap(scraper, "simhash", "  simhash")
+    timer.wrap(scraper, "apply_page", "  apply_page")
+    timer.wrap(Frontier, "next_tbd_url", "frontier next_tbd_url")
+    timer.wrap(Frontier, "add_url", "frontier add_url")
+    timer.wrap(Frontier, "mark_url_complete", "frontier mark_url_complete")
+    try:
+        worker_factory = AsyncWorker if config.worker_mode == "async" \
+            else Worker
+        crawl = Crawler(config, True, worker_factory=worker_factory)
+        for host in site.HOSTS:
+            robots_cache.add(f"https://{host}/", site.ROBOTS_TXT)
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        cpu = time.process_time()
+        start = time.perf_counter()
+        crawl.start()
+        elapsed = time.perf_counter() - start
+        cpu = time.process_time() - cpu
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss
+    finally:
+        timer.restore()
+
+    downloads = sorted(timer.times["download"])
+    pages = len(downloads)
+    traps = scraper.traps.summary()
+    print(f"crawl, {name} workers, {site.pages} page site, "
+          f"{config.threads_count} threads:")
+    print(f"	pages: {pages} in {elapsed:.1f} s "
+          f"({pages / elapsed:,.1f} pages per second, "
+          f"{scraper.crawl_stats.page_count} counted)")
+    print(f"	cpu per page: {cpu * 1000 / max(pages, 1):.1f} ms "
+          f"(crawler process only), peak rss growth: {rss / 1024:.0f} MiB")
+    if downloads:
+        print(f"	download latency: p50 "
+              f"{_percentile(downloads, 0.5) * 1000:.1f} ms, p90 "
+              f"{_percentile(downloads, 0.9) * 1000:.1f} ms, p99 "
+              f"{_percentile(downloads, 0.99) * 1000:.1f} ms, max "
+              f"{downloads[-1] * 1000:.1f} ms")
+    print(f"	trap detector refused: {sum(traps['rejected'].values())} "
+          f"({', '.join(f'{reason} {count}' for reason, count in sorted(traps['rejected'].items())) or 'none'})")
+    print(f"	{'stage':<28}{'calls':>8}{'total s':>10}{'mean ms':>10}"
+          f"{'p50 ms':>10}{'p99 ms':>10}")
+    for stage, times in timer.times.items():
+        if not times:
+            continue
+        times = sorted(times)
+        print(f"	{stage:<28}{len(times):>8}{sum(times):>10.2f}"
+              f"{sum(times) * 1000 / len(times):>10.2f}"
+              f"{_percentile(times, 0.5) * 1000:>10.2f}"
+              f"{_percentile(times, 0.99) * 1000:>10.2f}")
+    if config.parse_processes:
+        print("	(pages are parsed in other processes, their stages are "
+              "not timed)")
+
+
+def bench_crawl(scenarios, pages, threads, latency, config_file):
+    ''' Whole crawls of a synthetic site (see utils/cache_emulator.py)
+    served by a local cache server emulator: throughput, cpu and memory per
+    page, download latency and time spent in each stage. The emulator runs
+    in its own process so its cpu is not counted with the crawler's, and
+    every crawl runs from scratch in a temporary directory. '''
+    import os
+    import logging
+    import tempfile
+    import multiprocessing
+    from utils.cache_emulator import SyntheticSite, serve
+
+    site = SyntheticSite(pages)
+    config_file = os.path.abspath(config_file)
+    context = multiprocessing.get_context("spawn")
+    receiver, sender = context.Pipe(duplex=False)
+    server = context.Process(
+        target=serve, args=(site, latency, sender), daemon=True)
+    server.start()
+    address = tuple(receiver.recv())
+    logging.disable(logging.INFO)
+    cwd = os.getcwd()
+    try:
+        for name in scenarios:
+            with tempfile.TemporaryDirectory() as directory:
+                os.chdir(directory)
+                try:
+                    _crawl_scenario(name, config_file, address, site, threads)
+                finally:
+                    os.chdir(cwd)
+    finally:
+        logging.disable(logging.NOTSET)
+        server.terminate()
+        server.join()
+
+
+def _legacy_decode(wire):
+    # utils.download before responses were decoded lazily
+    import pickle
+    import cbor
+    resp_dict = cbor.loads(wire)
+    raw_response = pickle.loads(resp_dict["response"])
+    return raw_response.headers, raw_response.content
+
+
+def _decode(wire):
+    from utils.response import Response, decode_cache_response
+    resp = Response(decode_cache_response(wire))
+    return resp.headers, resp.body
+
+
+def bench_response(sizes, pages, repeat):
+    ''' Decode time and memory of a cache server response, from the bytes
+    read off the socket to the page's headers and body: the peak while one
+    page is decoded (the copies made on the way) and what each of `pages`
+    pages in flight holds afterwards. '''
+    import tracemalloc
+    from utils.cache_emulator import cache_response
+
+    runs = [("legacy cbor.loads + pickle.loads", _legacy_decode),
+            ("lazy stand-in, body view", _decode)]
+    for size in sizes:
+        body = _synthetic_html(size)
+        wire = cache_response(
+            "https://www.ics.uci.edu/page.html", 200,
+            {"Content-Type": "text/html"}, body)
+        print(f"response, {size} word page ({len(body) / 1024:,.0f} KB "
+              f"body, {len(wire) / 1024:,.0f} KB response), {pages} pages "
+              f"in flight:")
+        for name, decode in runs:
+            best = min(_timed(lambda: decode(wire)) for _ in range(repeat))
+            in_flight = list()
+            decode_peak = 0
+            tracemalloc.start()
+            for _ in range(pages):
+                # Every page arrives in its own buffer, as from the socket.
+                buffer = bytes(bytearray(wire))
+                tracemalloc.reset_peak()
+                before = tracemalloc.get_traced_memory()[0]
+                in_flight.append(decode(buffer))
+                decode_peak = max(
+                    decode_peak, tracemalloc.get_traced_memory()[1] - before)
+                del buffer
+            held = tracemalloc.get_traced_memory()[0]
+            tracemalloc.stop()
+            del in_flight
+            print(f"\t{name}: {best * 1000000:.0f} us per page, "
+                  f"{decode_peak / 1024:,.0f} KB peak while decoding, "
+                  f"{held / pages / 1024:,.0f} KB held per page")
+
+
+def _timed(run):
+    start = time.perf_counter()
+    run()
+    return time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    subparsers = parser.add_subparsers(dest="benchmark", required=True)
+    seen_parser = subparsers.add_parser("seen")
+    seen_parser.add_argument(
+        "--sizes", type=int, nargs="+", default=[1000000, 10000000])
+    tokenize_parser = subparsers.add_parser("tokenize")
+    tokenize_parser.add_argument(
+        "--sizes", type=int, nargs="+", default=[20000, 200000])
+    tokenize_parser.add_argument("--repeat", type=int, default=3)
+    extract_parser = subparsers.add_parser("extract")
+    extract_parser.add_argument(
+        "--sizes", type=int, nargs="+", default=[2000, 20000, 200000])
+    extract_parser.add_argument("--repeat", type=int, default=3)
+    simhash_parser = subparsers.add_parser("simhash-index")
+    simhash_parser.add_argument("--size", type=int, default=1000000)
+    simhash_parser.add_argument("--k", type=int, default=3)
+    simhash_parser.add_argument("--blocks", type=int, default=None)
+    simhash_parser.add_argument("--queries", type=int, default=100000)
+    urlfilter_parser = subparsers.add_parser("urlfilter")
+    urlfilter_parser.add_argument("--size", type=int, default=1000000)
+    urlfilter_parser.add_argument("--repeat", type=int, default=3)
+    response_parser = subparsers.add_parser("response")
+    response_parser.add_argument(
+        "--sizes", type=int, nargs="+", default=[2000, 20000, 200000])
+    response_parser.add_argument("--pages", type=int, default=50)
+    response_parser.add_argument("--repeat", type=int, default=3)
+    crawl_parser = subparsers.add_parser("crawl")
+    crawl_parser.add_argument(
+        "--scenarios", nargs="+", choices=sorted(CRAWL_SCENARIOS),
+        default=["thread", "async"])
+    crawl_parser.add_argument("--pages", type=int, default=2000)
+    crawl_parser.add_argument("--threads", type=int, default=8)
+    crawl_parser.add_argument(
+        "--latency", type=float, default=0.0,
+        help="seconds the emulated cache server waits before answering")
+    crawl_parser.add_argument("--config_file", type=str, default="config.ini")
+    args = parser.parse_args()
+    if args.benchmark == "seen":
+        bench_seen(args.sizes)
+    elif args.benchmark == "tokenize":
+        bench_tokenize(args.sizes, args.repeat)
+    elif args.benchmark == "extract":
+        bench_extract(args.sizes, args.repeat)
+    elif args.benchmark == "simhash-index":
+        bench_simhash_index(args.size, args.k, args.blocks, args.queries)
+    elif args.benchmark == "urlfilter":
+        bench_urlfilter(args.size, args.repeat)
+    elif args.benchmark == "response":
+        bench_response(args.sizes, args.pages, args.repeat)
+    elif args.benchmark == "crawl":
+        bench_crawl(args.scenarios, args.pages, args.threads, args.latency,
+                    args.config_file)
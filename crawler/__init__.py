@@ -1,21 +1,47 @@
+from threading import Thread, Event
+
 from utils import get_logger
+from utils.logs import log_hub
+from utils.robots import robots_cache
+from utils.canonical import canonicalizer
+from utils.metrics import metrics
+import scraper
 from crawler.frontier import Frontier
 from crawler.worker import Worker
+from crawler.pipeline import PagePipeline
 
 class Crawler(object):
     def __init__(self, config, restart, frontier_factory=Frontier, worker_factory=Worker):
         self.config = config
+        log_hub.configure(config)
         self.logger = get_logger("CRAWLER")
+        metrics.configure(config)
+        robots_cache.configure(config)
+        scraper.url_filter.configure(config)
+        canonicalizer.configure(config)
+        scraper.traps.configure(config)
+        scraper.revisits.configure(config)
+        scraper.near_duplicates.configure(config, restart)
+        scraper.crawl_stats.configure(config, restart)
+        self.stopped = Event()
+        self.persister = Thread(target=self._persist_loop, daemon=True)
         self.frontier = frontier_factory(config, restart)
+        self.pipeline = None
+        if config.parse_processes:
+            self.pipeline = PagePipeline(
+                config.parse_processes, config.parse_queue,
+                config.backpressure, config)
         self.workers = list()
         self.worker_factory = worker_factory
 
     def start_async(self):
         self.workers = [
-            self.worker_factory(worker_id, self.config, self.frontier)
+            self.worker_factory(
+                worker_id, self.config, self.frontier, pipeline=self.pipeline)
             for worker_id in range(self.config.threads_count)]
         for worker in self.workers:
             worker.start()
+        self.persister.start()
 
     def start(self):
         self.start_async()
@@ -24,3 +50,31 @@ class Crawler(object):
     def join(self):
         for worker in self.workers:
             worker.join()
+        if self.pipeline is not None:
+            self.pipeline.close()
+        self.stopped.set()
+        self.persister.join()
+        self._persist()
+        traps = scraper.traps.summary()
+        self.logger.info(
+            f"Trap detector refused {traps['rejected']}, blacklisted "
+            f"{len(traps['blacklisted'])} url patterns.")
+        if self.config.results_file:
+            scraper.crawl_stats.write_results_file(self.config.results_file)
+            self.logger.info("Wrote final results.")
+        metrics.close()
+        log_hub.flush()
+
+    def _persist(self):
+        # Off the crawl path: merge the workers' stats into the page log and
+        # snapshot, save the near-duplicate index and page history,
+        # checkpoint the queue and write the metrics snapshot.
+        scraper.crawl_stats.flush()
+        scraper.revisits.flush()
+        self.frontier.checkpoint()
+        scraper.near_duplicates.save()
+        metrics.write()
+
+    def _persist_loop(self):
+        while not self.stopped.wait(self.config.stats_interval):
+            self._persist()
@@ -1,18 +1,62 @@
 import os
-import shelve
+import time
+import heapq
 
-from threading import Thread, RLock
+from itertools import count
+from threading import Thread, RLock, Condition
 from queue import Queue, Empty
+from urllib.parse import urlparse
 
-from utils import get_logger, get_urlhash, normalize
-from scraper import is_valid
+from utils import get_logger, get_urlfingerprint, normalize
+from utils.metrics import metrics
+from scraper import url_filter, traps, revisits
+from crawler.store import open_store
+from crawler.seen import SeenFilter
+from crawler.segments import SegmentQueue
+from crawler.snapshot import FrontierSnapshot
+from crawler.scoring import make_scorer, path_depth
 
 class Frontier(object):
     def __init__(self, config, restart):
         self.logger = get_logger("FRONTIER")
         self.config = config
-        self.to_be_downloaded = list()
-        
+
+        # Politeness is enforced per host: every netloc has its own queue of
+        # urls and a time before which it must not be contacted again. Hosts
+        # that have urls waiting sit in a heap ordered by that ready time
+        # until they are due; among the due hosts, the one whose best url
+        # scores lowest goes first.
+        #
+        # Queues are heaps of [score, sequence, url, depth, inlinks] ordered
+        # by the scorer (see crawler/scoring.py). An entry whose url is None
+        # was replaced by a better scored copy and is skipped.
+        self.scorer = make_scorer(config.priority, traps)
+        self.sequence = count()
+        self.host_queues = dict()       # key = netloc, val = heap of entries
+        self.host_sizes = dict()        # key = netloc, val = live entries
+        self.queued = dict()            # key = url, val = its live entry
+        self.host_ready_at = dict()     # key = netloc, val = time.monotonic()
+        self.host_delays = dict()       # key = netloc, val = delay in seconds
+        self.ready_heap = list()        # (ready time, netloc)
+        self.due_hosts = set()          # netlocs with urls that may be contacted now
+        self.scheduled_hosts = set()    # netlocs in ready_heap or due_hosts
+        self.active = dict()            # key = url in progress, val = its depth
+        self.tbd_count = 0              # urls queued in memory
+        self.in_progress = 0
+
+        # New urls wait on disk in a SegmentQueue (crawler/segments.py);
+        # once the queues above are down to half of max_queued, they are
+        # topped up with the best scored ones. Memory stays flat however
+        # many urls the crawl finds.
+        self.max_queued = config.max_queued
+
+        # Guards every structure above and the save file; workers wait on it
+        # for a host to become due or for new urls to be discovered.
+        self.lock = RLock()
+        self.url_available = Condition(self.lock)
+        metrics.gauge("frontier", self._gauges)
+
+        fresh = restart or not os.path.exists(self.config.save_file)
         if not os.path.exists(self.config.save_file) and not restart:
             # Save file does not exist, but request to load save.
             self.logger.info(
@@ -22,12 +66,30 @@ class Frontier(object):
             # Save file does exists, but request to start from seed.
             self.logger.info(
                 f"Found save file {self.config.save_file}, deleting it.")
-            os.remove(self.config.save_file)
         # Load existing save file, or create one if it does not exist.
-        self.save = shelve.open(self.config.save_file)
+        self.save = open_store(self.config, restart)
+        self.queue = SegmentQueue(
+            self.config.queue_dir, restart=fresh,
+            band_width=self.config.queue_band_width,
+            segment_bytes=self.config.segment_size)
+        # In-memory filter in front of the save file: only urls it reports as
+        # possibly seen cost a lookup on disk. It is checkpointed with the
+        # trap detector; fingerprints added since go to seen_delta.
+        self.seen = SeenFilter(
+            self.config.seen_capacity, self.config.seen_error_rate)
+        self.seen_delta = list()
+        self.snapshot = FrontierSnapshot(
+            self.config.checkpoint_file, restart=fresh)
+        # Every url the save file commits as seen is on disk in the queue
+        # and the snapshot's delta.
+        self.save.before_commit = self._before_commit
         if restart:
             for url in self.config.seed_urls:
                 self.add_url(url)
+            # Incremental crawl: revisit the pages whose time has come.
+            with self.lock:
+                for url in revisits.due_urls():
+                    self._add(normalize(url), path_depth(url))
         else:
             # Set the frontier state with contents of save file.
             self._parse_save_file()
@@ -39,34 +101,257 @@ class Frontier(object):
         ''' This function can be overridden for alternate saving techniques. '''
         total_count = len(self.save)
         tbd_count = 0
-        for url, completed in self.save.values():
-            if not completed and is_valid(url):
-                self.to_be_downloaded.append(url)
-                tbd_count += 1
+        with self.lock:
+            if self.queue.resumed and self._load_snapshot():
+                # Back to the last checkpoint: the seen filter and the urls
+                # that were in memory or in progress, the rest still in the
+                # queue's segments.
+                for score, url, depth in self.queue.hot:
+                    if self._pending(url):
+                        self._enqueue(url, depth, score=score)
+                        tbd_count += 1
+                tbd_count += len(self.queue)
+            else:
+                # No checkpoint (e.g. a save file of an older version):
+                # rebuild the seen filter and queue every url that was not
+                # downloaded.
+                for fingerprint in self.save.fingerprints():
+                    self.seen.add(fingerprint)
+                for url in url_filter.filter(self.save.pending()):
+                    # How the url was found is not saved, its path tells roughly.
+                    depth = path_depth(url)
+                    self.queue.push(
+                        self.scorer.url_score(url, depth, 1), url, depth)
+                    tbd_count += 1
         self.logger.info(
             f"Found {tbd_count} urls to be downloaded from {total_count} "
             f"total urls discovered.")
 
+    def _load_snapshot(self):
+        # Caller must hold self.lock.
+        loaded = self.snapshot.load()
+        if loaded is None:
+            return False
+        self.seen, trap_state = loaded
+        traps.restore(trap_state)
+        return True
+
+    def _before_commit(self):
+        self.queue.flush()
+        self.snapshot.log(self.seen_delta)
+        self.seen_delta = list()
+
+    def _enqueue(self, url, depth, inlinks=1, score=None):
+        # Caller must hold self.lock.
+        netloc = urlparse(url).netloc
+        if score is None:
+            score = self.scorer.url_score(url, depth, inlinks)
+        entry = [score, next(self.sequence), url, depth, inlinks]
+        queue = self.host_queues.get(netloc)
+        if queue is None:
+            queue = self.host_queues[netloc] = list()
+            self.host_sizes[netloc] = 0
+        heapq.heappush(queue, entry)
+        self.host_sizes[netloc] += 1
+        self.queued[url] = entry
+        self.tbd_count += 1
+        if netloc not in self.scheduled_hosts:
+            self.scheduled_hosts.add(netloc)
+            heapq.heappush(
+                self.ready_heap, (self.host_ready_at.get(netloc, 0), netloc))
+            self.url_available.notify()
+
+    def _link_again(self, url):
+        # Caller must hold self.lock. A queued url was linked once more.
+        entry = self.queued[url]
+        score, _, _, depth, inlinks = entry
+        new_score = self.scorer.url_score(url, depth, inlinks + 1)
+        if new_score == score:
+            entry[4] += 1
+            return
+        entry[2] = None
+        entry = [new_score, next(self.sequence), url, depth, inlinks + 1]
+        heapq.heappush(self.host_queues[urlparse(url).netloc], entry)
+        self.queued[url] = entry
+
+    def _head(self, netloc):
+        # Best live entry of a host's queue, left in the queue.
+        queue = self.host_queues[netloc]
+        while queue[0][2] is None:
+            heapq.heappop(queue)
+        return queue[0]
+
+    def _host_priority(self, netloc):
+        return self._head(netloc)[0] + self.scorer.host_score(netloc)
+
+    def _pending(self, url):
+        # Caller must hold self.lock. False for urls queued, in progress or
+        # downloaded: after a resume, the segments read again what was
+        # taken out of them since the checkpoint.
+        return (url not in self.queued and url not in self.active
+                and not self.save.completed(get_urlfingerprint(url)))
+
+    def _refill(self):
+        # Caller must hold self.lock.
+        for score, url, depth in self.queue.pop_best(
+                max(self.max_queued - self.tbd_count, 1)):
+            if self._pending(url):
+                self._enqueue(url, depth, score=score)
+
+    def checkpoint(self):
+        ''' Saves where the queue is read up to, the urls taken out of it but
+        not downloaded yet, the seen filter and the trap detector, so that a
+        restart resumes from there instead of scanning the save file. '''
+        with metrics.timer("frontier.checkpoint"), self.lock:
+            hot = [(entry[0], url, entry[3])
+                   for url, entry in self.queued.items()]
+            hot.extend((self.scorer.url_score(url, depth, 1), url, depth)
+                       for url, depth in self.active.items())
+            self.save.flush()
+            self.queue.checkpoint(hot)
+            self.snapshot.checkpoint(self.seen, traps.state())
+            self.seen_delta = list()
+
+    def _gauges(self):
+        # Sizes of the frontier for the metrics snapshot.
+        with self.lock:
+            largest = heapq.nlargest(
+                20, self.host_sizes.items(), key=lambda item: item[1])
+            return {
+                "queued": self.tbd_count,
+                "spilled": len(self.queue),
+                "in_progress": self.in_progress,
+                "hosts": len(self.host_queues),
+                "due_hosts": len(self.due_hosts),
+                "largest_host_queues": dict(largest),
+            }
+
+    def _host_delay(self, netloc):
+        return max(self.host_delays.get(netloc, 0), self.config.time_delay)
+
+    def next_tbd_url(self):
+        ''' Non-blocking variant of get_tbd_url.
+
+        Returns (url, None) when a host is due, (None, seconds) when urls are
+        queued but every host is still inside its politeness window or other
+        workers may still discover urls, and (None, None) when the crawl is
+        finished. '''
+        with metrics.timer("frontier.next"), self.lock:
+            if self.queue and self.tbd_count <= self.max_queued // 2:
+                self._refill()
+            while not self.due_hosts and not self.ready_heap and self.queue:
+                # Everything read back was downloaded already.
+                self._refill()
+            now = time.monotonic()
+            while self.ready_heap and self.ready_heap[0][0] <= now:
+                self.due_hosts.add(heapq.heappop(self.ready_heap)[1])
+            if self.due_hosts:
+                netloc = min(self.due_hosts, key=self._host_priority)
+                self.due_hosts.discard(netloc)
+                self._head(netloc)
+                _, _, url, depth, _ = heapq.heappop(self.host_queues[netloc])
+                del self.queued[url]
+                self.host_sizes[netloc] -= 1
+                self.tbd_count -= 1
+                self.in_progress += 1
+                self.active[url] = depth
+                next_ready = now + self._host_delay(netloc)
+                self.host_ready_at[netloc] = next_ready
+                if self.host_sizes[netloc]:
+                    heapq.heappush(self.ready_heap, (next_ready, netloc))
+                else:
+                    del self.host_queues[netloc]
+                    del self.host_sizes[netloc]
+                    self.scheduled_hosts.discard(netloc)
+                return url, None
+            if self.ready_heap:
+                return None, self.ready_heap[0][0] - now
+            if self.in_progress:
+                # Urls being downloaded right now may add more to the frontier.
+                return None, float("inf")
+            return None, None
+
     def get_tbd_url(self):
-        try:
-            return self.to_be_downloaded.pop()
-        except IndexError:
-            return None
+        with self.lock:
+            while True:
+                url, wait = self.next_tbd_url()
+                if url:
+                    return url
+                if wait is None:
+                    # Crawl is finished, commit whatever is still buffered.
+                    self.save.flush()
+                    return None
+                self.url_available.wait(None if wait == float("inf") else wait)
+
+    def set_host_delay(self, url, delay):
+        ''' Sets the politeness delay (in seconds) for the host of url, e.g.
+        from its robots.txt. Never lowers the delay below config.time_delay. '''
+        netloc = urlparse(url).netloc
+        with self.lock:
+            previous = self._host_delay(netloc)
+            self.host_delays[netloc] = delay or 0
+            current = self._host_delay(netloc)
+            if netloc in self.host_ready_at and current > previous:
+                # Push back the next request already scheduled for the host.
+                self.host_ready_at[netloc] += current - previous
+                if netloc in self.due_hosts:
+                    if self.host_ready_at[netloc] > time.monotonic():
+                        self.due_hosts.discard(netloc)
+                        heapq.heappush(
+                            self.ready_heap,
+                            (self.host_ready_at[netloc], netloc))
+                elif netloc in self.scheduled_hosts:
+                    self.ready_heap = [
+                        (self.host_ready_at[host] if host == netloc else t, host)
+                        for t, host in self.ready_heap]
+                    heapq.heapify(self.ready_heap)
 
-    def add_url(self, url):
+    def add_url(self, url, parent=None):
+        ''' Adds url, found on the page of parent (a url this frontier
+        handed out) or a seed if parent is None. '''
         url = normalize(url)
-        urlhash = get_urlhash(url)
-        if urlhash not in self.save:
-            self.save[urlhash] = (url, False)
-            self.save.sync()
-            self.to_be_downloaded.append(url)
-    
+        with metrics.timer("frontier.add"), self.lock:
+            self._add(url, self._depth(url, parent))
+
+    def _depth(self, url, parent):
+        if parent is None:
+            return 0
+        depth = self.active.get(parent)
+        return path_depth(url) if depth is None else depth + 1
+
+    def _add(self, url, depth):
+        # Caller must hold self.lock.
+        fingerprint = get_urlfingerprint(url)
+        if fingerprint not in self.seen or fingerprint not in self.save:
+            # Urls the trap detector refuses, or downloaded recently in an
+            # incremental crawl, are not remembered, they may be admitted
+            # when found again.
+            if not revisits.due(url) or not traps.admit(url):
+                return
+            self.seen.add(fingerprint)
+            self.seen_delta.append(fingerprint)
+            # Queued before the save file records it, see before_commit.
+            self.queue.push(self.scorer.url_score(url, depth, 1), url, depth)
+            self.save.add(fingerprint, url)
+            self.url_available.notify()
+            metrics.count("dedup.url.miss")
+        else:
+            metrics.count("dedup.url.hit")
+            if url in self.queued:
+                self._link_again(url)
+
     def mark_url_complete(self, url):
-        urlhash = get_urlhash(url)
-        if urlhash not in self.save:
-            # This should not happen.
-            self.logger.error(
-                f"Completed url {url}, but have not seen it before.")
-
-        self.save[urlhash] = (url, True)
-        self.save.sync()
+        fingerprint = get_urlfingerprint(url)
+        with metrics.timer("frontier.complete"), self.lock:
+            if fingerprint not in self.seen:
+                # This should not happen.
+                self.logger.error(
+                    f"Completed url {url}, but have not seen it before.")
+
+            self.save.mark_complete(fingerprint, url)
+            traps.complete(url)
+            self.active.pop(url, None)
+            self.in_progress = max(self.in_progress - 1, 0)
+            # Wake every waiting worker: either new urls were added while this
+            # one was in progress, or the crawl may now be finished.
+            self.url_available.notify_all()
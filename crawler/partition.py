@@ -0,0 +1,234 @@
+import os
+import copy
+import bisect
+import multiprocessing
+
+from hashlib import blake2b
+from threading import Thread
+from collections import OrderedDict
+from multiprocessing.connection import wait
+from urllib.parse import urlparse
+
+from utils import get_logger, get_urlfingerprint, normalize
+from utils.logs import log_hub
+from utils.stats import CrawlStats
+from crawler import Crawler
+from crawler.frontier import Frontier
+from crawler.worker import Worker
+
+
+def _ring_hash(key):
+    return int.from_bytes(
+        blake2b(key.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+def partition_path(path, partition):
+    ''' frontier.db -> frontier.3.db: the file of one crawl process. '''
+    root, ext = os.path.splitext(path)
+    return f"{root}.{partition}{ext}"
+
+
+def partition_config(config, partition):
+    ''' Copy of config with the save, stats, simhash, metrics and log files
+    (and metrics port) of one crawl process. Partitions do not write
+    results.txt, the parent does. '''
+    config = copy.copy(config)
+    config.save_file = partition_path(config.save_file, partition)
+    config.queue_dir = partition_path(config.queue_dir, partition)
+    config.checkpoint_file = partition_path(config.checkpoint_file, partition)
+    config.revisit_file = partition_path(config.revisit_file, partition)
+    config.simhash_file = partition_path(config.simhash_file, partition)
+    config.stats_page_log = partition_path(config.stats_page_log, partition)
+    config.stats_snapshot = partition_path(config.stats_snapshot, partition)
+    config.metrics_file = partition_path(config.metrics_file, partition)
+    if config.metrics_port:
+        config.metrics_port += partition
+    # Processes never share a log file: rotating one from several processes
+    # loses records.
+    config.log_partition = partition
+    config.results_file = None
+    return config
+
+
+class HashRing(object):
+    ''' Consistent hashing of hosts onto partitions. Every partition owns
+    `replicas` points on a 64-bit ring and a host belongs to the first point
+    after its hash, so hosts spread evenly and changing the number of
+    partitions only moves the hosts of the partitions added or removed. '''
+
+    def __init__(self, partitions, replicas=64):
+        points = sorted(
+            (_ring_hash(f"partition-{partition}-{replica}"), partition)
+            for partition in range(partitions) for replica in range(replicas))
+        self.partitions = partitions
+        self.points = [point for point, _ in points]
+        self.owners = [partition for _, partition in points]
+
+    def owner(self, netloc):
+        index = bisect.bisect(self.points, _ring_hash(netloc.lower()))
+        return self.owners[index % len(self.owners)]
+
+
+class Coordination(object):
+    ''' State shared by the crawl processes to agree on when the crawl is
+    over. A partition is idle when its frontier has nothing queued or in
+    progress; forwarded urls are counted from before they are sent until
+    the receiver has queued them (and cleared its idle flag), so every
+    partition idle with nothing outstanding means no url is left anywhere. '''
+
+    def __init__(self, context, partitions):
+        self.lock = context.Lock()
+        self.idle_flags = context.Array("b", partitions, lock=False)
+        self.outstanding = context.Value("q", 0, lock=False)
+        self.stopped = context.Event()
+
+    def sent(self):
+        with self.lock:
+            self.outstanding.value += 1
+
+    def received(self, partition):
+        with self.lock:
+            self.idle_flags[partition] = 0
+            self.outstanding.value -= 1
+
+    def idle(self, partition):
+        ''' Marks partition idle and returns True if the whole crawl is done
+        (or was stopped). '''
+        with self.lock:
+            self.idle_flags[partition] = 1
+            return self.stopped.is_set() or (
+                not self.outstanding.value and all(self.idle_flags))
+
+
+class PartitionedFrontier(Frontier):
+    ''' Frontier of one crawl process. It only queues urls of the hosts the
+    ring gives to its partition, so its per-host politeness state is
+    complete; urls of other hosts are forwarded to their owner's inbox. '''
+
+    POLL_INTERVAL = 0.5
+    # Foreign urls already forwarded, so links repeated on every page of a
+    # host do not cross process boundaries again and again.
+    FORWARD_CACHE_SIZE = 100000
+
+    def __init__(self, config, restart, partition, ring, queues, coordination):
+        self.partition = partition
+        self.ring = ring
+        self.queues = queues
+        self.coordination = coordination
+        self.forwarded = OrderedDict()
+        super().__init__(config, restart)
+        self.receiver = Thread(target=self._receive, daemon=True)
+        self.receiver.start()
+
+    def add_url(self, url, parent=None):
+        url = normalize(url)
+        owner = self.ring.owner(urlparse(url).netloc)
+        if owner == self.partition:
+            super().add_url(url, parent)
+            return
+        fingerprint = get_urlfingerprint(url)
+        with self.lock:
+            if fingerprint in self.forwarded:
+                self.forwarded.move_to_end(fingerprint)
+                return
+            self.forwarded[fingerprint] = None
+            if len(self.forwarded) > self.FORWARD_CACHE_SIZE:
+                self.forwarded.popitem(last=False)
+            depth = self._depth(url, parent)
+        self.coordination.sent()
+        self.queues[owner].put((url, depth))
+
+    def _receive(self):
+        inbox = self.queues[self.partition]
+        while True:
+            message = inbox.get()
+            if message is None:
+                return
+            with self.lock:
+                self._add(*message)
+            self.coordination.received(self.partition)
+
+    def next_tbd_url(self):
+        with self.lock:
+            url, wait = super().next_tbd_url()
+            if url or wait is not None:
+                return url, wait
+            # Nothing left here, but other partitions may still forward urls.
+            if self.coordination.idle(self.partition):
+                return None, None
+            return None, self.POLL_INTERVAL
+
+    def close(self):
+        self.queues[self.partition].put(None)
+        self.receiver.join()
+
+
+def run_partition(partition, config, restart, queues, coordination,
+                  worker_factory):
+    config = partition_config(config, partition)
+    ring = HashRing(len(queues))
+    crawler = Crawler(
+        config, restart,
+        frontier_factory=lambda config, restart: PartitionedFrontier(
+            config, restart, partition, ring, queues, coordination),
+        worker_factory=worker_factory)
+    crawler.start()
+    crawler.frontier.close()
+
+
+class PartitionedCrawler(object):
+    ''' Runs config.processes crawl processes, each with its own frontier,
+    save file, stats and simhash index, over a partition of the hosts.
+    When they are done the per-process stats are merged into the configured
+    stats files and results.txt. '''
+
+    def __init__(self, config, restart, worker_factory=Worker):
+        self.config = config
+        self.restart = restart
+        log_hub.configure(config)
+        self.logger = get_logger("CRAWLER")
+        # spawn: the parent may already run threads (logging, robots), which
+        # a forked child would inherit in an unknown state.
+        context = multiprocessing.get_context("spawn")
+        self.queues = [context.Queue() for _ in range(config.processes)]
+        self.coordination = Coordination(context, config.processes)
+        self.processes = [
+            context.Process(
+                target=run_partition, name=f"Partition-{partition}",
+                args=(partition, config, restart, self.queues,
+                      self.coordination, worker_factory))
+            for partition in range(config.processes)]
+
+    def start_async(self):
+        for process in self.processes:
+            process.start()
+
+    def start(self):
+        self.start_async()
+        self.join()
+
+    def join(self):
+        running = {process.sentinel: process for process in self.processes}
+        while running:
+            for sentinel in wait(list(running)):
+                process = running.pop(sentinel)
+                process.join()
+                if process.exitcode:
+                    # The others would wait forever for its urls.
+                    self.logger.error(
+                        f"{process.name} exited with code {process.exitcode}, "
+                        f"stopping the crawl.")
+                    self.coordination.stopped.set()
+        self.merge_stats()
+        self.logger.info("Wrote final results.")
+        log_hub.flush()
+
+    def merge_stats(self):
+        ''' Rebuilds the configured page log, snapshot and results file from
+        those of every partition. '''
+        stats = CrawlStats()
+        stats.configure(self.config, restart=True)
+        for partition in range(self.config.processes):
+            config = partition_config(self.config, partition)
+            stats.absorb(config.stats_page_log, config.stats_snapshot)
+        stats.write_results_file(self.config.results_file)
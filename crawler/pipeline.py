@@ -0,0 +1,85 @@
+import multiprocessing
+
+from concurrent.futures import ProcessPoolExecutor
+from threading import BoundedSemaphore
+
+from utils import get_logger
+from utils.canonical import canonicalizer
+from utils.metrics import metrics
+import scraper
+
+
+def _init_process(config):
+    # The pool's processes import scraper afresh, with the defaults.
+    if config is not None:
+        scraper.url_filter.configure(config)
+        canonicalizer.configure(config)
+
+
+def _process_page(url, content):
+    # Runs in the pool: the page and what was timed and counted parsing it.
+    page = scraper.process_page(url, content)
+    return page, metrics.drain()
+
+
+class PagePipeline(object):
+    ''' Parses downloaded pages in a pool of processes so that download
+    threads (or async tasks) never wait on the CPU.
+
+    submit() hands the body of a page to scraper.process_page in the pool;
+    when it is parsed, scraper.apply_page records it (stats, near-duplicate
+    index) in this process and the callback gets the links. At most
+    queue_size pages are waiting or being parsed. When that many are,
+    backpressure "block" makes submit() wait for a free slot, which slows
+    the downloads down to the parse rate, and "inline" parses the page in
+    the calling thread instead. '''
+
+    BACKPRESSURE = ("block", "inline")
+
+    def __init__(self, processes, queue_size, backpressure="block",
+                 config=None):
+        if backpressure not in self.BACKPRESSURE:
+            raise ValueError(
+                f"Unknown backpressure {backpressure}, "
+                f"use one of {', '.join(self.BACKPRESSURE)}.")
+        self.logger = get_logger("PIPELINE")
+        self.backpressure = backpressure
+        self.slots = BoundedSemaphore(queue_size)
+        # spawn: forking a process that runs threads copies their locks in
+        # whatever state they are.
+        self.executor = ProcessPoolExecutor(
+            processes or None, mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_process,
+            initargs=(config,))
+
+    def submit(self, url, resp, done):
+        ''' Scrapes resp and calls done(url, links) once it is parsed.
+        Returns False, without calling done, if the page is not to be
+        scraped at all. '''
+        content = scraper.scrapable_content(url, resp)
+        if content is None:
+            return False
+        if not self.slots.acquire(blocking=self.backpressure == "block"):
+            done(url, scraper.apply_page(
+                url, resp.status, scraper.process_page(url, content)))
+            return True
+        # A memoryview can not be pickled: the pool gets a copy.
+        future = self.executor.submit(_process_page, url, bytes(content))
+        future.add_done_callback(
+            lambda future: self._parsed(url, resp.status, future, done))
+        return True
+
+    def _parsed(self, url, status, future, done):
+        self.slots.release()
+        links = list()
+        try:
+            page, drained = future.result()
+            metrics.absorb(drained)
+            links = scraper.apply_page(url, status, page)
+        except Exception as e:
+            self.logger.error(f"Failed to scrape {url}: {e!r}.")
+        finally:
+            done(url, links)
+
+    def close(self):
+        self.executor.shutdown(wait=True)
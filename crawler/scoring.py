@@ -0,0 +1,105 @@
+from math import log2
+from urllib.parse import urlsplit
+
+
+class Scorer(object):
+    ''' One criterion of the frontier's order; lower scores are downloaded
+    first. url_score ranks the urls of one host when they are queued.
+    host_score is asked every time the frontier chooses between hosts that
+    are due, so it can follow the progress of the crawl. '''
+
+    def url_score(self, url, depth, inlinks):
+        return 0.0
+
+    def host_score(self, netloc):
+        return 0.0
+
+
+class DepthScorer(Scorer):
+    ''' Pages fewer links away from the seeds first (breadth first). '''
+
+    def url_score(self, url, depth, inlinks):
+        return depth
+
+
+class InlinkScorer(Scorer):
+    ''' Pages linked from many crawled pages first. '''
+
+    def url_score(self, url, depth, inlinks):
+        return -log2(inlinks) if inlinks > 1 else 0.0
+
+
+class FreshnessScorer(Scorer):
+    ''' Hosts with fewer pages downloaded so far first. '''
+
+    def __init__(self, traps):
+        self.traps = traps
+
+    def host_score(self, netloc):
+        return log2(1 + self.traps.host_stats(netloc)[0])
+
+
+class YieldScorer(Scorer):
+    ''' Hosts whose pages had new content (not near-duplicates, not too
+    small) first. '''
+
+    def __init__(self, traps):
+        self.traps = traps
+
+    def host_score(self, netloc):
+        return 1.0 - self.traps.host_stats(netloc)[1]
+
+
+# Name in the PRIORITY config -> factory taking the trap detector, whose
+# per-host stats the host scorers read.
+SCORERS = {
+    "depth": lambda traps: DepthScorer(),
+    "inlinks": lambda traps: InlinkScorer(),
+    "freshness": FreshnessScorer,
+    "yield": YieldScorer,
+}
+
+
+class CompositeScorer(Scorer):
+    ''' Weighted sum of scorers. With no scorers every url scores 0 and the
+    frontier is first in, first out per host. '''
+
+    def __init__(self, weighted=()):
+        self.weighted = [(weight, scorer) for scorer, weight in weighted
+                         if weight]
+        self.url_scorers = [
+            (weight, scorer) for weight, scorer in self.weighted
+            if type(scorer).url_score is not Scorer.url_score]
+        self.host_scorers = [
+            (weight, scorer) for weight, scorer in self.weighted
+            if type(scorer).host_score is not Scorer.host_score]
+
+    def url_score(self, url, depth, inlinks):
+        return sum(weight * scorer.url_score(url, depth, inlinks)
+                   for weight, scorer in self.url_scorers)
+
+    def host_score(self, netloc):
+        return sum(weight * scorer.host_score(netloc)
+                   for weight, scorer in self.host_scorers)
+
+
+def make_scorer(priority, traps):
+    ''' Builds the scorer of a PRIORITY config value, a list of name:weight
+    (e.g. "depth:1, inlinks:1, yield:4"). '''
+    weighted = list()
+    for item in priority.split(","):
+        if not item.strip():
+            continue
+        name, _, weight = item.partition(":")
+        name = name.strip().lower()
+        if name not in SCORERS:
+            raise ValueError(
+                f"Unknown scorer {name}, use one of {', '.join(SCORERS)}.")
+        weighted.append((SCORERS[name](traps), float(weight or 1)))
+    return CompositeScorer(weighted)
+
+
+def path_depth(url):
+    ''' Depth of a url whose link depth is unknown (e.g. loaded from the
+    save file): the number of segments of its path. '''
+    return len([segment for segment in urlsplit(url).path.split("/") if segment])
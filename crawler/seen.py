@@ -0,0 +1,120 @@
+import math
+import struct
+
+
+class BloomFilter(object):
+    ''' Fixed-size Bloom filter over 64-bit url fingerprints (see
+    utils.get_urlfingerprint). Answers "definitely not seen" or "possibly
+    seen"; the bit positions are derived from the two 32-bit halves of the
+    fingerprint by double hashing, so nothing is hashed again. '''
+
+    # capacity, error rate, bits, hashes, count; the bit array follows.
+    HEADER = struct.Struct("!QdQIQ")
+
+    def __init__(self, capacity, error_rate):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.num_bits = max(8, int(
+            -capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.num_hashes = max(1, round(
+            self.num_bits / capacity * math.log(2)))
+        self.bits = bytearray((self.num_bits + 7) // 8)
+        self.count = 0
+
+    def _positions(self, fingerprint):
+        fingerprint &= 0xFFFFFFFFFFFFFFFF
+        h1 = fingerprint & 0xFFFFFFFF
+        h2 = (fingerprint >> 32) | 1
+        num_bits = self.num_bits
+        return [(h1 + i * h2) % num_bits for i in range(self.num_hashes)]
+
+    def add(self, fingerprint):
+        bits = self.bits
+        for pos in self._positions(fingerprint):
+            bits[pos >> 3] |= 1 << (pos & 7)
+        self.count += 1
+
+    def __contains__(self, fingerprint):
+        bits = self.bits
+        for pos in self._positions(fingerprint):
+            if not bits[pos >> 3] & (1 << (pos & 7)):
+                return False
+        return True
+
+    def __len__(self):
+        return self.count
+
+    @property
+    def nbytes(self):
+        return len(self.bits)
+
+    def to_bytes(self):
+        return self.HEADER.pack(
+            self.capacity, self.error_rate, self.num_bits, self.num_hashes,
+            self.count) + bytes(self.bits)
+
+    @classmethod
+    def from_bytes(cls, data, offset=0):
+        ''' Returns (filter, offset after it) read from data at offset. '''
+        bloom = cls.__new__(cls)
+        (bloom.capacity, bloom.error_rate, bloom.num_bits, bloom.num_hashes,
+         bloom.count) = cls.HEADER.unpack_from(data, offset)
+        offset += cls.HEADER.size
+        end = offset + (bloom.num_bits + 7) // 8
+        bloom.bits = bytearray(data[offset:end])
+        return bloom, end
+
+
+class SeenFilter(object):
+    ''' Scalable Bloom filter: a chain of BloomFilters, each twice the
+    capacity of the previous one with a tighter error rate, so the overall
+    false positive rate stays near error_rate however many urls are added.
+    The frontier only asks its store about urls this filter reports as
+    possibly seen. '''
+
+    GROWTH = 2
+    TIGHTENING = 0.5
+
+    def __init__(self, capacity=1000000, error_rate=0.01):
+        self.error_rate = error_rate
+        self.filters = [
+            BloomFilter(capacity, error_rate * (1 - self.TIGHTENING))]
+
+    def add(self, fingerprint):
+        current = self.filters[-1]
+        if current.count >= current.capacity:
+            current = BloomFilter(
+                current.capacity * self.GROWTH,
+                current.error_rate * self.TIGHTENING)
+            self.filters.append(current)
+        current.add(fingerprint)
+
+    def __contains__(self, fingerprint):
+        for bloom in reversed(self.filters):
+            if fingerprint in bloom:
+                return True
+        return False
+
+    def __len__(self):
+        return sum(bloom.count for bloom in self.filters)
+
+    @property
+    def nbytes(self):
+        return sum(bloom.nbytes for bloom in self.filters)
+
+    def to_bytes(self):
+        ''' The filters as they are, bit arrays included, so a restart loads
+        them instead of adding every fingerprint of the store again. '''
+        return struct.pack("!dI", self.error_rate, len(self.filters)) + \
+            b"".join(bloom.to_bytes() for bloom in self.filters)
+
+    @classmethod
+    def from_bytes(cls, data):
+        seen = cls.__new__(cls)
+        seen.error_rate, count = struct.unpack_from("!dI", data)
+        offset = struct.calcsize("!dI")
+        seen.filters = list()
+        for _ in range(count):
+            bloom, offset = BloomFilter.from_bytes(data, offset)
+            seen.filters.append(bloom)
+        return seen
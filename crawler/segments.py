@@ -0,0 +1,339 @@
+import os
+import json
+import zlib
+import struct
+
+from math import floor
+
+
+BLOCK_HEADER = struct.Struct("!III")    # crc32, payload length, record count
+SCORE = struct.Struct("!f")
+MANIFEST = "manifest.json"
+
+
+def _put_varint(out, value):
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def _get_varint(data, pos):
+    value = shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, pos
+        shift += 7
+
+
+def _shared_prefix(a, b):
+    # Binary search on slices: a few comparisons in C instead of a Python
+    # loop over every byte.
+    low, high = 0, min(len(a), len(b))
+    while low < high:
+        middle = (low + high + 1) // 2
+        if a[:middle] == b[:middle]:
+            low = middle
+        else:
+            high = middle - 1
+    return low
+
+
+def encode_block(entries):
+    ''' One block of (score, url, depth) entries. Urls are sorted so that
+    each one is stored as the length of the prefix it shares with the
+    previous one and the rest: urls of a host share at least
+    scheme://host/, and often most of their path. '''
+    out = bytearray()
+    previous = b""
+    for score, url, depth in sorted(entries, key=lambda entry: entry[1]):
+        url = url.encode("utf-8")
+        shared = _shared_prefix(url, previous)
+        _put_varint(out, shared)
+        _put_varint(out, len(url) - shared)
+        out += url[shared:]
+        _put_varint(out, depth)
+        out += SCORE.pack(score)
+        previous = url
+    return BLOCK_HEADER.pack(
+        zlib.crc32(out), len(out), len(entries)) + bytes(out)
+
+
+def decode_block(payload):
+    entries = list()
+    previous = b""
+    pos = 0
+    while pos < len(payload):
+        shared, pos = _get_varint(payload, pos)
+        length, pos = _get_varint(payload, pos)
+        url = previous[:shared] + payload[pos:pos + length]
+        pos += length
+        depth, pos = _get_varint(payload, pos)
+        score, = SCORE.unpack_from(payload, pos)
+        pos += SCORE.size
+        entries.append((score, url.decode("utf-8"), depth))
+        previous = url
+    return entries
+
+
+def read_blocks(f, offset=0):
+    ''' Yields (offset, record count, payload) of the valid blocks of an
+    open segment from offset on, stopping at a torn or corrupt block. '''
+    f.seek(offset)
+    while True:
+        header = f.read(BLOCK_HEADER.size)
+        if len(header) < BLOCK_HEADER.size:
+            return
+        crc, length, count = BLOCK_HEADER.unpack(header)
+        payload = f.read(length)
+        if len(payload) < length or zlib.crc32(payload) != crc:
+            return
+        yield offset, count, payload
+        offset += BLOCK_HEADER.size + length
+
+
+class _Band(object):
+    ''' Urls whose scores fall in one band, first in first out, in segment
+    files read from (segment, offset) on. '''
+
+    def __init__(self):
+        self.segments = list()  # segment numbers, oldest first
+        self.read_at = None     # (segment, offset of the next block, records of it already read)
+        self.count = 0          # unread records
+        self.buffer = list()    # entries not written yet
+
+
+class SegmentQueue(object):
+    ''' Disk-backed queue of the frontier for crawls larger than memory.
+
+    Every queued url is appended to a segment file of its score band
+    (scores are cut into bands band_width wide); pop_best() reads the
+    lowest band first, first in first out within a band. Segments are
+    append-only and hold blocks of prefix-compressed urls, each with a crc;
+    a new one is started past segment_bytes and read ones are deleted by
+    the next checkpoint. Writes are buffered until flush(), which the frontier
+    calls before its save file commits, so the queue never loses a url the
+    save file already knows.
+
+    checkpoint() records where every band is read up to, plus the urls
+    taken out but not downloaded yet, in a small manifest. A restart
+    resumes from there: only block headers of the unread part are read,
+    to count the urls and drop a torn last block. '''
+
+    def __init__(self, directory, restart=False, band_width=1.0,
+                 segment_bytes=8 << 20):
+        self.directory = directory
+        self.band_width = band_width
+        self.segment_bytes = segment_bytes
+        self.bands = dict()     # key = band, val = _Band
+        self.next_segment = 0
+        self.checkpoints = 0
+        self.retired = list()   # segments read to the end, deleted at the next checkpoint
+        self.hot = list()       # (score, url, depth) saved by the last checkpoint
+        self.resumed = not restart and os.path.exists(self._path(MANIFEST))
+        if not self.resumed and os.path.isdir(directory):
+            # Without a manifest (a crawl killed before its first checkpoint)
+            # the frontier queues its pending urls again from the save file,
+            # so what the segments hold is stale.
+            for name in os.listdir(directory):
+                os.remove(os.path.join(directory, name))
+        os.makedirs(directory, exist_ok=True)
+        if self.resumed:
+            self._recover()
+
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+
+    def _segment_path(self, segment):
+        return self._path(f"{segment:08d}.seg")
+
+    def _hot_path(self, checkpoint):
+        return self._path(f"hot.{checkpoint}")
+
+    def __len__(self):
+        return sum(band.count for band in self.bands.values())
+
+    def push(self, score, url, depth):
+        key = floor(score / self.band_width) if self.band_width else 0
+        band = self.bands.get(key)
+        if band is None:
+            band = self.bands[key] = _Band()
+        band.buffer.append((score, url, depth))
+        band.count += 1
+
+    def flush(self, sync=False):
+        ''' Writes the buffered urls, one block per band. '''
+        for band in self.bands.values():
+            if band.buffer:
+                self._write(band, encode_block(band.buffer), sync)
+                band.buffer = list()
+
+    def _write(self, band, block, sync):
+        if not band.segments or os.path.getsize(
+                self._segment_path(band.segments[-1])) >= self.segment_bytes:
+            band.segments.append(self.next_segment)
+            if band.read_at is None:
+                band.read_at = (self.next_segment, 0, 0)
+            self.next_segment += 1
+        with open(self._segment_path(band.segments[-1]), "ab") as f:
+            f.write(block)
+            if sync:
+                f.flush()
+                os.fsync(f.fileno())
+
+    def pop_best(self, n):
+        ''' Removes and returns up to n (score, url, depth) entries from the
+        lowest bands. '''
+        self.flush()
+        entries = list()
+        for key in sorted(self.bands):
+            band = self.bands[key]
+            while band.count and len(entries) < n:
+                entries.extend(self._read(band, n - len(entries)))
+            if len(entries) >= n:
+                break
+        for key in [key for key, band in self.bands.items() if not band.count]:
+            self._drop(self.bands.pop(key))
+        return entries
+
+    def _read(self, band, n):
+        segment, offset, skip = band.read_at
+        with open(self._segment_path(segment), "rb") as f:
+            for offset, count, payload in read_blocks(f, offset):
+                entries = decode_block(payload)[skip:skip + min(n, band.count)]
+                skip += len(entries)
+                band.count -= len(entries)
+                if skip == count:
+                    offset += BLOCK_HEADER.size + len(payload)
+                    skip = 0
+                band.read_at = (segment, offset, skip)
+                return entries
+        # Read to the end of this segment.
+        band.segments.remove(segment)
+        self.retired.append(segment)
+        band.read_at = (band.segments[0], 0, 0) if band.segments else None
+        if band.read_at is None:
+            band.count = 0
+        return []
+
+    def _drop(self, band):
+        # A restart from the last checkpoint reads them again, up to where
+        # the hot urls of the next checkpoint take over.
+        self.retired.extend(band.segments)
+
+    def checkpoint(self, hot):
+        ''' Makes the queue durable: flushes and syncs the segments, saves
+        the hot (score, url, depth) entries, which the frontier took out and
+        has not downloaded, and the read positions. '''
+        self.flush(sync=True)
+        # The hot urls of a checkpoint get a file of their own, so a crash
+        # before the manifest is replaced leaves the previous pair intact.
+        checkpoint = self.checkpoints + 1
+        with open(self._hot_path(checkpoint), "wb") as f:
+            f.write(encode_block(hot))
+            f.flush()
+            os.fsync(f.fileno())
+        manifest = {
+            "checkpoint": checkpoint,
+            "next_segment": self.next_segment,
+            "bands": {
+                str(key): {"segments": band.segments, "read_at": band.read_at}
+                for key, band in self.bands.items()},
+        }
+        with open(self._path(f"{MANIFEST}.tmp"), "w") as f:
+            json.dump(manifest, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(self._path(f"{MANIFEST}.tmp"), self._path(MANIFEST))
+        if os.path.exists(self._hot_path(self.checkpoints)):
+            os.remove(self._hot_path(self.checkpoints))
+        self.checkpoints = checkpoint
+        for segment in self.retired:
+            os.remove(self._segment_path(segment))
+        self.retired = list()
+
+    def _recover(self):
+        with open(self._path(MANIFEST)) as f:
+            manifest = json.load(f)
+        self.checkpoints = manifest["checkpoint"]
+        self.next_segment = manifest["next_segment"]
+        with open(self._hot_path(self.checkpoints), "rb") as f:
+            for _, _, payload in read_blocks(f):
+                self.hot.extend(decode_block(payload))
+        # The manifest only knows the segments of the checkpoint; those
+        # started after it are adopted by the band of their urls.
+        known = set()
+        for key, state in manifest["bands"].items():
+            band = self.bands[int(key)] = _Band()
+            band.segments = list(state["segments"])
+            band.read_at = tuple(state["read_at"]) if state["read_at"] else None
+            known.update(band.segments)
+        for name in sorted(os.listdir(self.directory)):
+            if name.startswith("hot.") and name != f"hot.{self.checkpoints}":
+                # written by a checkpoint the crash interrupted
+                os.remove(self._path(name))
+            if not name.endswith(".seg"):
+                continue
+            segment = int(name[:-4])
+            if segment in known:
+                continue
+            if segment < self.next_segment:
+                # fully read before the checkpoint, not deleted yet
+                os.remove(self._path(name))
+            else:
+                self._adopt(segment)
+        for key, band in list(self.bands.items()):
+            self._count(band)
+            if not band.count:
+                self._drop(self.bands.pop(key))
+
+    def _adopt(self, segment):
+        # A segment created after the checkpoint: its band is the one of its
+        # first url's score.
+        with open(self._segment_path(segment), "rb") as f:
+            for _, _, payload in read_blocks(f):
+                score = decode_block(payload)[0][0]
+                break
+            else:
+                score = None
+        if score is None:
+            os.remove(self._segment_path(segment))
+            return
+        key = floor(score / self.band_width) if self.band_width else 0
+        band = self.bands.get(key)
+        if band is None:
+            band = self.bands[key] = _Band()
+        band.segments.append(segment)
+        if band.read_at is None:
+            band.read_at = (segment, 0, 0)
+        self.next_segment = max(self.next_segment, segment + 1)
+
+    def _count(self, band):
+        band.count = 0
+        for segment in list(band.segments):
+            path = self._segment_path(segment)
+            if not os.path.exists(path):
+                band.segments.remove(segment)
+                continue
+            offset = skip = 0
+            if band.read_at and band.read_at[0] == segment:
+                _, offset, skip = band.read_at
+            end = offset
+            with open(path, "rb") as f:
+                for end, count, payload in read_blocks(f, offset):
+                    band.count += count - skip
+                    skip = 0
+                    end += BLOCK_HEADER.size + len(payload)
+            if end < os.path.getsize(path):
+                # torn block written when the crawler was killed
+                with open(path, "r+b") as f:
+                    f.truncate(end)
+        if band.segments and (
+                band.read_at is None or band.read_at[0] not in band.segments):
+            band.read_at = (band.segments[0], 0, 0)
+
+    def close(self):
+        self.flush(sync=True)
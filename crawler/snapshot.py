@@ -0,0 +1,82 @@
+import os
+import json
+import zlib
+import struct
+
+from array import array
+
+from crawler.seen import SeenFilter
+
+
+class FrontierSnapshot(object):
+    ''' What the frontier needs to resume besides its store and queue: the
+    seen filter and the trap detector's counters.
+
+    checkpoint() writes both to one binary file (the filter's bit arrays as
+    they are, the counters as compressed json) and replaces it atomically.
+    Fingerprints added since are appended to a write-ahead delta file,
+    which the frontier writes before every commit of its store, so loading
+    the snapshot and replaying the delta gives back every url the store
+    knows without reading the store. '''
+
+    MAGIC = b"FSNP"
+    HEADER = struct.Struct("!4sIII")    # magic, crc32, filter bytes, counter bytes
+
+    def __init__(self, path, restart=False):
+        self.path = path
+        self.delta_path = f"{path}.delta"
+        if restart:
+            for path in (self.path, self.delta_path):
+                if os.path.exists(path):
+                    os.remove(path)
+        self.delta = open(self.delta_path, "ab")
+
+    def log(self, fingerprints):
+        ''' Appends fingerprints added to the seen filter to the delta. '''
+        if fingerprints:
+            self.delta.write(array("q", fingerprints).tobytes())
+            self.delta.flush()
+
+    def checkpoint(self, seen, trap_state):
+        seen = seen.to_bytes()
+        traps = zlib.compress(
+            json.dumps(trap_state, separators=(",", ":")).encode("utf-8"))
+        with open(f"{self.path}.tmp", "wb") as f:
+            f.write(self.HEADER.pack(
+                self.MAGIC, zlib.crc32(traps, zlib.crc32(seen)),
+                len(seen), len(traps)))
+            f.write(seen)
+            f.write(traps)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(f"{self.path}.tmp", self.path)
+        # A crash before this only replays fingerprints already included.
+        self.delta.truncate(0)
+
+    def load(self):
+        ''' Returns (seen filter, trap counters) of the last checkpoint with
+        the delta replayed, or None if there is no valid snapshot. '''
+        if not os.path.exists(self.path):
+            return None
+        with open(self.path, "rb") as f:
+            data = f.read()
+        if len(data) < self.HEADER.size:
+            return None
+        magic, crc, seen_size, traps_size = self.HEADER.unpack_from(data)
+        seen = data[self.HEADER.size:self.HEADER.size + seen_size]
+        traps = data[self.HEADER.size + seen_size:]
+        if (magic != self.MAGIC or len(traps) != traps_size
+                or zlib.crc32(traps, zlib.crc32(seen)) != crc):
+            return None
+        seen = SeenFilter.from_bytes(seen)
+        with open(self.delta_path, "rb") as f:
+            delta = f.read()
+        fingerprints = array("q")
+        # A torn last write leaves a partial fingerprint, never committed.
+        fingerprints.frombytes(delta[:len(delta) - len(delta) % 8])
+        for fingerprint in fingerprints:
+            seen.add(fingerprint)
+        return seen, json.loads(zlib.decompress(traps).decode("utf-8"))
+
+    def close(self):
+        self.delta.close()
@@ -0,0 +1,259 @@
+import os
+import time
+import zlib
+import struct
+import sqlite3
+
+from abc import ABC, abstractmethod
+
+
+class FrontierStore(ABC):
+    ''' Persistent record of every url the frontier has seen, keyed by its
+    64-bit fingerprint, with a flag telling whether it was downloaded.
+
+    Writes are buffered and group-committed once commit_batch writes are
+    pending or commit_interval seconds passed since the last commit, so a
+    page with hundreds of links costs one flush instead of hundreds. After a
+    crash the store keeps every batch committed before it, and possibly part
+    of the batch being committed (see LogStore): every record is valid on
+    its own, as its url was queued first. The frontier serializes access,
+    so stores are not thread safe on their own.
+
+    before_commit, if set, is called before every commit: the frontier
+    writes its url queue there, so no url is committed as seen without
+    being queued. '''
+
+    def __init__(self, path, commit_batch=500, commit_interval=1.0):
+        self.path = path
+        self.commit_batch = commit_batch
+        self.commit_interval = commit_interval
+        self.buffer = dict()    # key = fingerprint, val = (url, completed)
+        self.last_commit = time.monotonic()
+        self.before_commit = None
+
+    def __contains__(self, fingerprint):
+        return fingerprint in self.buffer or self._contains(fingerprint)
+
+    def __len__(self):
+        self.flush()
+        return self._count()
+
+    def completed(self, fingerprint):
+        ''' True if the url of fingerprint was marked complete. '''
+        if fingerprint in self.buffer:
+            return self.buffer[fingerprint][1]
+        return self._completed(fingerprint)
+
+    def add(self, fingerprint, url):
+        self._write(fingerprint, url, False)
+
+    def mark_complete(self, fingerprint, url):
+        self._write(fingerprint, url, True)
+
+    def _write(self, fingerprint, url, completed):
+        self.buffer[fingerprint] = (url, completed)
+        if (len(self.buffer) >= self.commit_batch
+                or time.monotonic() - self.last_commit >= self.commit_interval):
+            self.flush()
+
+    def flush(self):
+        if self.buffer:
+            if self.before_commit is not None:
+                self.before_commit()
+            self._commit(self.buffer)
+            self.buffer = dict()
+        self.last_commit = time.monotonic()
+
+    def pending(self):
+        ''' Yields the urls that were added but never marked complete. '''
+        self.flush()
+        return self._pending()
+
+    def fingerprints(self):
+        ''' Yields the fingerprint of every url in the store. '''
+        self.flush()
+        return self._fingerprints()
+
+    def close(self):
+        self.flush()
+        self._close()
+
+    @abstractmethod
+    def _contains(self, fingerprint):
+        pass
+
+    @abstractmethod
+    def _count(self):
+        pass
+
+    @abstractmethod
+    def _completed(self, fingerprint):
+        pass
+
+    @abstractmethod
+    def _commit(self, records):
+        pass
+
+    @abstractmethod
+    def _pending(self):
+        pass
+
+    @abstractmethod
+    def _fingerprints(self):
+        pass
+
+    def _close(self):
+        pass
+
+    @classmethod
+    def files(cls, path):
+        return [path]
+
+
+class SQLiteStore(FrontierStore):
+    ''' Default store: one SQLite table in WAL mode. A group commit is a
+    single transaction, so a crash leaves the last committed batch. '''
+
+    def __init__(self, path, **kwargs):
+        super().__init__(path, **kwargs)
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        # The fingerprint is the rowid, so lookups are a single b-tree search.
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS urls ("
+            "fingerprint INTEGER PRIMARY KEY, url TEXT NOT NULL, "
+            "completed INTEGER NOT NULL)")
+        # Partial index so restart only reads the urls still to download.
+        self.db.execute(
+            "CREATE INDEX IF NOT EXISTS tbd ON urls(completed) "
+            "WHERE completed = 0")
+        self.db.commit()
+
+    def _contains(self, fingerprint):
+        return self.db.execute(
+            "SELECT 1 FROM urls WHERE fingerprint = ?", (fingerprint,)
+            ).fetchone() is not None
+
+    def _count(self):
+        return self.db.execute("SELECT COUNT(*) FROM urls").fetchone()[0]
+
+    def _completed(self, fingerprint):
+        row = self.db.execute(
+            "SELECT completed FROM urls WHERE fingerprint = ?", (fingerprint,)
+            ).fetchone()
+        return bool(row and row[0])
+
+    def _commit(self, records):
+        with self.db:
+            self.db.executemany(
+                "INSERT OR REPLACE INTO urls VALUES (?, ?, ?)",
+                ((fingerprint, url, int(completed))
+                 for fingerprint, (url, completed) in records.items()))
+
+    def _pending(self):
+        for url, in self.db.execute(
+                "SELECT url FROM urls WHERE completed = 0"):
+            yield url
+
+    def _fingerprints(self):
+        for fingerprint, in self.db.execute("SELECT fingerprint FROM urls"):
+            yield fingerprint
+
+    def _close(self):
+        self.db.close()
+
+    @classmethod
+    def files(cls, path):
+        return [path, f"{path}-wal", f"{path}-shm"]
+
+
+class LogStore(FrontierStore):
+    ''' Append-only log of (fingerprint, url, completed) records, replayed into
+    memory on open. Each record carries its length and a crc32; a torn or
+    corrupt tail left by a crash is truncated on recovery, keeping the
+    records of a torn batch that were written before it. '''
+
+    HEADER = struct.Struct("!IIB")  # crc32, payload length, completed
+    FINGERPRINT = struct.Struct("!q")
+
+    def __init__(self, path, **kwargs):
+        super().__init__(path, **kwargs)
+        self.index = dict()     # key = fingerprint, val = (url, completed)
+        self._recover()
+        self.log = open(path, "ab")
+
+    def _recover(self):
+        if not os.path.exists(self.path):
+            return
+        good = 0
+        with open(self.path, "rb") as log:
+            data = log.read()
+        while good + self.HEADER.size <= len(data):
+            crc, length, completed = self.HEADER.unpack_from(data, good)
+            start = good + self.HEADER.size
+            payload = data[start:start + length]
+            if (len(payload) != length
+                    or zlib.crc32(payload, completed) != crc):
+                break
+            fingerprint, = self.FINGERPRINT.unpack_from(payload)
+            url = payload[self.FINGERPRINT.size:].decode("utf-8")
+            self.index[fingerprint] = (url, bool(completed))
+            good = start + length
+        if good != len(data):
+            with open(self.path, "r+b") as log:
+                log.truncate(good)
+
+    def _contains(self, fingerprint):
+        return fingerprint in self.index
+
+    def _count(self):
+        return len(self.index)
+
+    def _completed(self, fingerprint):
+        record = self.index.get(fingerprint)
+        return bool(record and record[1])
+
+    def _commit(self, records):
+        chunks = list()
+        for fingerprint, (url, completed) in records.items():
+            payload = (self.FINGERPRINT.pack(fingerprint)
+                       + url.encode("utf-8"))
+            chunks.append(self.HEADER.pack(
+                zlib.crc32(payload, completed), len(payload), completed))
+            chunks.append(payload)
+        self.log.write(b"".join(chunks))
+        self.log.flush()
+        os.fsync(self.log.fileno())
+        self.index.update(records)
+
+    def _pending(self):
+        for url, completed in list(self.index.values()):
+            if not completed:
+                yield url
+
+    def _fingerprints(self):
+        return iter(list(self.index))
+
+    def _close(self):
+        self.log.close()
+
+
+STORES = {"sqlite": SQLiteStore, "log": LogStore}
+
+
+def open_store(config, restart=False):
+    ''' Opens the store configured by STORE/SAVE in config.ini, deleting its
+    files first on restart. '''
+    store_class = STORES[config.store]
+    if restart:
+        delete_store(config)
+    return store_class(
+        config.save_file, commit_batch=config.commit_batch,
+        commit_interval=config.commit_interval)
+
+
+def delete_store(config):
+    for path in STORES[config.store].files(config.save_file):
+        if os.path.exists(path):
+            os.remove(path)
@@ -1,36 +1,68 @@
+import asyncio
+
 from threading import Thread
 
 from inspect import getsource
 from utils.download import download
+from utils.async_download import AsyncDownloader
 from utils import get_logger
+from utils.robots import robots_cache
+from utils.gate import ContentGate
+from utils.metrics import metrics
 import scraper
-import time
 
 
 class Worker(Thread):
-    def __init__(self, worker_id, config, frontier):
+    def __init__(self, worker_id, config, frontier, pipeline=None):
         self.logger = get_logger(f"Worker-{worker_id}", "Worker")
         self.config = config
         self.frontier = frontier
+        self.pipeline = pipeline
+        self.content_gate = ContentGate(
+            config.max_page_bytes, config.oversize_policy)
         # basic check for requests in scraper
         assert {getsource(scraper).find(req) for req in {"from requests import", "import requests"}} == {-1}, "Do not use requests in scraper.py"
         assert {getsource(scraper).find(req) for req in {"from urllib.request import", "import urllib.request"}} == {-1}, "Do not use urllib.request in scraper.py"
         super().__init__(daemon=True)
 
-    def _write_to_results_file(self):
-        with open('results.txt', 'w') as f:
-            sorted_visited_and_words = sorted(scraper.visited_and_words.items(), key=lambda item: item[1], reverse=True)
-            # print(sorted_visited_and_words)
-            f.write('WORD COUNTS\n')
-            for item in sorted_visited_and_words:
-                f.write(f"{item[0]}: {item[1]}\n")
-            
-            f.write('\nWORD FREQUENCIES\n')
-
-            sorted_word_frequencies = sorted(scraper.word_frequencies.items(), key=lambda item: item[1], reverse=True)[:50]
-            # print(sorted_word_frequencies)
-            for item in sorted_word_frequencies:
-                f.write(f"{item[0]}: {item[1]}\n")
+    def _process(self, tbd_url, resp):
+        submitted = False
+        try:
+            self.logger.info(
+                f"Downloaded {tbd_url}, status <{resp.status}>, "
+                f"using cache {self.config.cache_server}.")
+            # robots.txt crawl delay is enforced per host by the frontier
+            with metrics.timer("robots.delay"):
+                delay = robots_cache.crawl_delay(tbd_url)
+            self.frontier.set_host_delay(tbd_url, delay)
+            # skip binaries and oversized pages before anything parses them
+            rejected = self.content_gate.check(resp)
+            if rejected:
+                self.logger.info(f"Skipped {tbd_url}: {rejected}.")
+                return
+            if resp.truncated:
+                self.logger.info(
+                    f"Truncated {tbd_url} to {self.config.max_page_bytes} bytes.")
+            if scraper.unchanged_page(tbd_url, resp):
+                self.logger.info(f"Unchanged {tbd_url}, not parsed again.")
+                return
+            if self.pipeline is None:
+                scraped_urls = scraper.scraper(tbd_url, resp)
+                for scraped_url in scraped_urls:
+                    self.frontier.add_url(scraped_url, parent=tbd_url)
+            else:
+                # Parsed in the pipeline's processes, _scraped completes it.
+                submitted = self.pipeline.submit(tbd_url, resp, self._scraped)
+        finally:
+            if not submitted:
+                self.frontier.mark_url_complete(tbd_url)
+
+    def _scraped(self, tbd_url, scraped_urls):
+        try:
+            for scraped_url in scraped_urls:
+                self.frontier.add_url(scraped_url, parent=tbd_url)
+        finally:
+            self.frontier.mark_url_complete(tbd_url)
 
     def run(self):
         while True:
@@ -38,19 +70,51 @@ class Worker(Thread):
             if not tbd_url:
                 self.logger.info("Frontier is empty. Stopping Crawler.")
                 break
-            resp = download(tbd_url, self.config, self.logger)
-            self.logger.info(
-                f"Downloaded {tbd_url}, status <{resp.status}>, "
-                f"using cache {self.config.cache_server}.")
-            scraped_urls, politeness_delay = scraper.scraper(tbd_url, resp)
-            for scraped_url in scraped_urls:
-                self.frontier.add_url(scraped_url)
-            self.frontier.mark_url_complete(tbd_url)
-            time.sleep((politeness_delay if politeness_delay else self.config.time_delay))  # politeness delay
+            try:
+                with metrics.timer("download"):
+                    resp = download(tbd_url, self.config, self.logger)
+            except BaseException:
+                self.frontier.mark_url_complete(tbd_url)
+                raise
+            self._process(tbd_url, resp)
+
+
+class AsyncWorker(Worker):
+    ''' Runs an asyncio event loop that keeps up to ASYNCCONCURRENCY downloads
+    in flight over pooled connections to the cache server. Scraping is CPU
+    bound, so each downloaded page is handed to a thread of the loop's
+    executor and the loop goes on downloading. '''
 
-            if scraper.num_visited % 25 == 0:
-                print('WRITING TO FILE')
-                self._write_to_results_file()
+    # seconds between frontier polls while no host is due
+    POLL_INTERVAL = 0.05
 
-        print('FINAL WRITE')
-        self._write_to_results_file()
\ No newline at end of file
+    async def _crawl_task(self, downloader):
+        loop = asyncio.get_running_loop()
+        while True:
+            tbd_url, wait = self.frontier.next_tbd_url()
+            if tbd_url is None:
+                if wait is None:
+                    return
+                # No host is due yet, or urls may still be discovered.
+                await asyncio.sleep(min(wait, self.POLL_INTERVAL))
+                continue
+            try:
+                with metrics.timer("download"):
+                    resp = await downloader.download(tbd_url)
+            except BaseException:
+                self.frontier.mark_url_complete(tbd_url)
+                raise
+            await loop.run_in_executor(None, self._process, tbd_url, resp)
+
+    async def _crawl(self):
+        downloader = AsyncDownloader(self.config, self.logger)
+        try:
+            await asyncio.gather(*(
+                self._crawl_task(downloader)
+                for _ in range(self.config.async_concurrency)))
+        finally:
+            downloader.close()
+
+    def run(self):
+        asyncio.run(self._crawl())
+        self.logger.info("Frontier is empty. Stopping Crawler.")
\ No newline at end of file
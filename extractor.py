@@ -0,0 +1,125 @@
+import re
+from collections import namedtuple
+from html.parser import HTMLParser
+
+from tokenizer import tokenize
+
+try:
+    from lxml import etree
+except ImportError:
+    etree = None
+
+# Text of these elements is not page text (BeautifulSoup's get_text() skips it too).
+SKIPPED_TAGS = {"script", "style", "template"}
+
+# <meta charset="..."> or <meta http-equiv="Content-Type" content="...; charset=...">
+CHARSET_PATTERN = re.compile(rb"""<meta[^>]+charset=["']?([a-zA-Z0-9_-]+)""", re.IGNORECASE)
+
+# Bytes handed to lxml at a time when the page is a memoryview.
+FEED_CHUNK = 65536
+
+Page = namedtuple("Page", ["tokens", "hrefs", "base_href"])
+
+
+class _PageTarget(object):
+    ''' Receives parser events and keeps what the scraper needs: the text
+    outside of SKIPPED_TAGS and the href of every <a> and <base>. Works as an
+    lxml parser target and backs the html.parser fallback below. '''
+
+    def __init__(self):
+        self.text = []
+        self.hrefs = []
+        self.base_href = None
+        self.skip_depth = 0
+
+    def start(self, tag, attrs):
+        tag = tag.lower()
+        if tag in SKIPPED_TAGS:
+            self.skip_depth += 1
+        elif tag == "a":
+            href = attrs.get("href")
+            if href:
+                self.hrefs.append(href)
+        elif tag == "base" and self.base_href is None:
+            self.base_href = attrs.get("href")
+
+    def end(self, tag):
+        if tag.lower() in SKIPPED_TAGS and self.skip_depth:
+            self.skip_depth -= 1
+
+    def data(self, data):
+        if not self.skip_depth:
+            self.text.append(data)
+
+    def close(self):
+        return self
+
+
+class _StdlibParser(HTMLParser):
+    def __init__(self, target):
+        super().__init__(convert_charrefs=True)
+        self.target = target
+
+    def handle_starttag(self, tag, attrs):
+        self.target.start(tag, dict(attrs))
+
+    def handle_startendtag(self, tag, attrs):
+        self.target.start(tag, dict(attrs))
+        self.target.end(tag)
+
+    def handle_endtag(self, tag):
+        self.target.end(tag)
+
+    def handle_data(self, data):
+        self.target.data(data)
+
+
+def _sniff_encoding(content):
+    match = CHARSET_PATTERN.search(content, 0, 2048)
+    if match:
+        encoding = match.group(1).decode("ascii")
+        try:
+            "".encode(encoding)
+            return encoding
+        except LookupError:
+            pass
+    return None
+
+
+def _parse_lxml(content, encoding):
+    target = _PageTarget()
+    parser = etree.HTMLParser(target=target, encoding=encoding)
+    if isinstance(content, memoryview):
+        # lxml only reads bytes: feed the view in chunks rather than copy
+        # the whole page at once.
+        for start in range(0, len(content), FEED_CHUNK):
+            parser.feed(bytes(content[start:start + FEED_CHUNK]))
+    else:
+        parser.feed(content)
+    return parser.close()
+
+
+def _parse_stdlib(content, encoding):
+    target = _PageTarget()
+    parser = _StdlibParser(target)
+    parser.feed(str(content, encoding or "utf-8", "replace"))
+    parser.close()
+    return target
+
+
+def extract(content, backend=None):
+    ''' Parses an html document (bytes or a memoryview) in a single pass and returns a Page
+    with its text tokens, the hrefs of its links and its <base href>.
+
+    Uses lxml's event-driven parser when it is installed and html.parser
+    otherwise; backend="lxml" or backend="html.parser" forces one. '''
+    if backend is None:
+        backend = "lxml" if etree is not None else "html.parser"
+    encoding = _sniff_encoding(content)
+    if backend == "lxml":
+        target = _parse_lxml(content, encoding)
+    else:
+        target = _parse_stdlib(content, encoding)
+    # Adjacent strings are joined like get_text() does, so a token split by
+    # an inline tag (e.g. "<b>In</b>formatics") stays one token.
+    return Page(tokenize(["".join(target.text)]), target.hrefs, target.base_href)
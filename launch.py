@@ -4,6 +4,8 @@ from argparse import ArgumentParser
 from utils.server_registration import get_cache_server
 from utils.config import Config
 from crawler import Crawler
+from crawler.partition import PartitionedCrawler
+from crawler.worker import Worker, AsyncWorker
 
 
 def main(config_file, restart):
@@ -11,7 +13,12 @@ def main(config_file, restart):
     cparser.read(config_file)
     config = Config(cparser)
     config.cache_server = get_cache_server(config, restart)
-    crawler = Crawler(config, restart)
+    worker_factory = AsyncWorker if config.worker_mode == "async" else Worker
+    if config.processes > 1:
+        crawler = PartitionedCrawler(
+            config, restart, worker_factory=worker_factory)
+    else:
+        crawler = Crawler(config, restart, worker_factory=worker_factory)
     crawler.start()
 
 
@@ -1,126 +1,107 @@
-from hashlib import sha256
+from hashlib import blake2b
 from tokenizer import computeWordFrequencies
- 
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
 N_GRAM_LENGTH = 3
 FEATURE_HASH_LENGTH = 64    # in bits (AI tutor said 64 is good place to start)
+FEATURE_HASH_BYTES = FEATURE_HASH_LENGTH // 8
+NUMPY_MIN_FEATURES = 256    # below this the pure Python path is faster
 
 ### PRIVATE HELPER FUNCTIONS ###
 
-def _bytestring_to_binary(bytes):
-    # https://www.geeksforgeeks.org/convert-bytes-to-bits-in-python/
-    # From AI tutor:
-    #   1. Convert the bytes object to an integer using int.from_bytes(), specifying the byte order (typically 'big' for network order).
-    #   2. Use the bin() function to convert the integer to a binary string. This string will have a prefix of '0b'.
-    #   3. Slice off the '0b' prefix to get the binary string.
-    return bin(int.from_bytes(bytes, byteorder='big'))[2:]
-
 def _extract_features(tokens):
-    # Convert tokens to features (e.g., n-grams)
+    # Convert tokens to features (n-grams of N_GRAM_LENGTH consecutive tokens, joined by a space)
     # Return a list of features
-    features = []
+    # Documents shorter than one n-gram get the whole token sequence as their only feature
+    # Every n-gram counts, the last one included: the original range(len(tokens) - N_GRAM_LENGTH)
+    # left it out, so a document of exactly N_GRAM_LENGTH tokens had no feature. The original never
+    # produced a fingerprint (it called .encode() on lists); fingerprints stored by crawls that used
+    # the simhash package are not comparable with these, start such a crawl again with --restart
+    if len(tokens) < N_GRAM_LENGTH:
+        return [" ".join(tokens)] if tokens else []
 
-    for i in range(len(tokens) - N_GRAM_LENGTH):
-        features.append(tokens[i:i+N_GRAM_LENGTH])
-
-    return features
+    return [" ".join(tokens[i:i+N_GRAM_LENGTH]) for i in range(len(tokens) - N_GRAM_LENGTH + 1)]
 
 def _get_feature_weights(features):
     # A common approach to feature weights is to use term frequency
     # Returns a dictionary where key = feature and value = feature frequency
-    # Implementing term frequency for n-grams from AI tutor:
-    #   1. Generate N-grams: You first need to generate all possible n-grams from the text. This usually involves sliding a window of size 'n'
-    #   over the words in the text and collecting the words that fall within the window at each position.
-    #       a. DONE; THIS IS THE PARAM features
-    #   2. Count N-grams: Count how many times each unique n-gram appears in the text. This gives you the raw frequency of each n-gram.
-    #       a. USE countWordFrequencies() from tokenizer
-    #   3. Calculate Term Frequency: The term frequency (TF) for each n-gram can be calculated by taking the raw frequency of the n-gram and 
-    #   possibly normalizing it by the total number of n-grams in the document to prevent a bias towards longer documents.
-    #       a. WILL SKIP NORMALIZATION FOR NOW BUT CAN IMPLEMENT LATER IF NECESSARY
+    # (raw n-gram counts, not normalized by document length)
     return computeWordFrequencies(features)
 
 def _hash_features(features):
-    # Hash each feature into a binary string
-    # Return a list of binary hash strings
-
-    hashes = []
-
-    for feature in features:
-        # encode the string to bytes
-        encoded = feature.encode()
-
-        # apply sha256
-        hash_digest = sha256(encoded).digest()
-
-        # convert hash digest to binary
-        binary = _bytestring_to_binary(hash_digest)
-
-        # truncate binary string to the first FEATURE_HASH_LENGTH bits
-        binary = binary[:FEATURE_HASH_LENGTH]
-
-        hashes.append(binary)
-    
-    return hashes
-
-def _create_simhash(features, hashes, feature_weights):
-    # Initialize a vector V of N elements to 0 (N is the bit length of hash)
-    # For each feature and its corresponding hash
-        # For each bit in the hash
-            # If the bit is 1, add the feature's weight to V's corresponding element
-            # If the bit is 0, subtract the feature's weight
-    # Initialize simhash to an empty binary string
-    # For each element in V
-        # If the element is positive, append '1' to simhash
-        # Else, append '0'
-    # Return simhash
-
-    v = [0] * FEATURE_HASH_LENGTH
-
-    for i, feature in enumerate(features):
-        for j, bit in enumerate(hashes[i]):
-            if bit == '1':
-                v[j] += feature_weights[feature]
-            else:
-                v[j] -= feature_weights[feature]
-
-    simhash = ''
-
-    for element in v:
-        if element > 0:
-            simhash += '1'
-        else:
-            simhash += '0'
+    # Hash each feature into FEATURE_HASH_BYTES bytes; bit i of the fingerprint comes from bit i of the
+    # big-endian integer of the digest
+    # blake2b is implemented in C and, unlike hash(), gives the same value in every process, which keeps
+    # fingerprints comparable across restarts
+    # Return a list of digests (bytes)
+    return [blake2b(feature.encode(), digest_size=FEATURE_HASH_BYTES).digest() for feature in features]
+
+def _create_simhash(hashes, weights):
+    # V[i] = sum of the weights of features whose hash has bit i set
+    #      - sum of the weights of features whose hash has bit i unset
+    # Bit i of the simhash is 1 if V[i] > 0
+    # Instead of looping over the 64 bits of every hash, each hash adds its weight to one counter per byte
+    # (8 steps per feature); the per-bit sums are read off those byte counters at the end
+    if np is not None and len(hashes) >= NUMPY_MIN_FEATURES:
+        return _create_simhash_numpy(hashes, weights)
+
+    byte_weights = [dict() for _ in range(FEATURE_HASH_BYTES)]     # byte position -> byte value -> weight
+    total = 0
+    for digest, weight in zip(hashes, weights):
+        total += weight
+        for position, value in enumerate(digest):
+            counts = byte_weights[position]
+            counts[value] = counts.get(value, 0) + weight
+
+    simhash = 0
+    for position, counts in enumerate(byte_weights):
+        # byte 0 of the big-endian digest holds the 8 most significant bits
+        shift = (FEATURE_HASH_BYTES - 1 - position) * 8
+        for bit in range(8):
+            mask = 1 << bit
+            set_weight = sum(weight for value, weight in counts.items() if value & mask)
+            if 2 * set_weight - total > 0:
+                simhash |= 1 << (shift + bit)
 
     return simhash
 
-def _calculate_hamming_distance(hash1, hash2):
-    # Calculate the number of differing bits between hash1 and hash2
-    # Return the Hamming distance
-
-    # Assumes hash1 and hash2 are same length
-
-    dist = 0
+def _create_simhash_numpy(hashes, weights):
+    # Same result as _create_simhash: all digests become one (features x 64) bit matrix and V is a single
+    # matrix-vector product
+    bits = np.unpackbits(np.frombuffer(b"".join(hashes), dtype=np.uint8).reshape(len(hashes), FEATURE_HASH_BYTES), axis=1)
+    weights = np.asarray(weights, dtype=np.int64)
+    v = 2 * (weights @ bits) - weights.sum()
+    # column 0 is the most significant bit
+    return int.from_bytes(np.packbits(v > 0).tobytes(), byteorder='big')
 
-    for i in range(len(hash1)):
-        if hash1[i] != hash2[i]:
-            dist += 1
-
-    return dist
+def _calculate_hamming_distance(hash1, hash2):
+    # Number of differing bits between hash1 and hash2 = popcount of their XOR
+    return bin(hash1 ^ hash2).count("1")
 
 
 ### PUBLIC FUNCTIONS (CALL THESE IN SCRAPER.PY) ###
 
 # input should be the list of tokens from tokenize()
+# returns the simhash as a FEATURE_HASH_LENGTH-bit integer
 def simhash(tokens):
     features = _extract_features(tokens)
     feature_weights = _get_feature_weights(features)
-    hashes = _hash_features(features)
+    hashes = _hash_features(feature_weights)
+
+    return _create_simhash(hashes, list(feature_weights.values()))
 
-    return _create_simhash(features, hashes, feature_weights)
+
+def hamming_distance(simhash1, simhash2):
+    return _calculate_hamming_distance(simhash1, simhash2)
 
 
 def is_near_duplicate(simhash1, simhash2, threshold):
     # Calculate the Hamming distance between simhash1 and simhash2
     # If the distance is less than or equal to the threshold, return True (near-duplicate)
     # Else, return False (not a near-duplicate)
-    
+
     return _calculate_hamming_distance(simhash1, simhash2) <= threshold
@@ -1,77 +1,206 @@
-from collections import defaultdict
+import os
+import json
+import time
+import struct
+
+from argparse import ArgumentParser
+from configparser import ConfigParser
 from urllib.parse import urlparse
 
-def generate_report():
-    unique_pages = 0
-    longest_page = ""
-    word_frequencies_mode = False
-    subdomain_list = defaultdict(int)
-    
-    with open('report.txt', 'w') as report:
-        with open('results.txt', 'r') as results:
-            for line in results:
-                # break line up into url/word and count
-                if line != "WORD COUNTS\n" and line != "WORD FREQUENCIES\n" and line != '\n':
-                    item, count = line.split(': ')
-
-                # get page with highest number of words
-                if unique_pages == 1:
-                    longest_page = (item, count)
-                
-                # begin retrieving the 50 most common words
-                if line == "WORD FREQUENCIES\n":
-                    word_frequencies_mode = True
-                    log_msg = "TOP 50 COMMON WORDS:\n"
-                    print(log_msg)
-                    report.write(log_msg)
-
-                # if still going through url/wordcount pairs, increment unique page count and check for ics.uci.edu subdomain
-                if not word_frequencies_mode and line != '\n':
-                    unique_pages += 1
-                    if line != "WORD COUNTS\n" and "ics.uci.edu" in item:
-                        # ParseResult(scheme='http', netloc='www.openlab.ics.uci.edu', path='', params='', query='', fragment='')
-                        parsed_url = urlparse(item)
-                        subdomain = f"http://{parsed_url.netloc.removeprefix('www.')}"
-                        subdomain_list[subdomain] += 1
-            # in word/frequency count pairs --> print it out
-                else:
-                    if line != "WORD FREQUENCIES\n":
-                        log_msg = f"\t{line}"
-                        print(log_msg)
-                        report.write(log_msg)
-
-    
-        # How many unique pages did you find?
-        unique_pages -= 1   # account for counting the WORD COUNTS header
-        log_msg = f"Number of unique pages: {unique_pages}"
-        print(log_msg)
-        report.write(f'\n{log_msg}\n')
-
-        # What is the longest page in terms of the number of words?
-        log_msg = f"The longest page in terms of number of words is {longest_page[0]} with {longest_page[1]} words."
-        print(log_msg)
-        report.write(f'\n{log_msg}\n')
-
-        # What are the 50 most common words in the entire set of pages crawled under these domains ?
-        # printed above in the for loop
-        
-        # How many subdomains did you find in the ics.uci.edu domain? Submit the list of subdomains 
-        # ordered alphabetically and the number of unique pages detected in each subdomain.
-        subdomains_sorted = sorted(subdomain_list.items(), key=lambda x: x[0])
-        
-        log_msg = f"The number of ics.uci.edu subdomains is {len(subdomains_sorted)}."
-        print(log_msg)
-        report.write(f'\n{log_msg}\n')
-
-        log_msg = "ics.uci.edu subdomains:\n"
-        print(log_msg)
-        report.write(f'\n{log_msg}')
-
-        for subdomain, count in subdomains_sorted:
-            log_msg = f'\t{subdomain}, {count}'
-            print(log_msg)
-            report.write(f'{log_msg}\n')
+from utils import get_urlfingerprint
+from utils.config import Config
+from utils.stats import PAGE_RECORD, read_page_log
+from crawler.seen import SeenFilter
+from crawler.partition import partition_path
+
+
+class StreamingReport(object):
+    ''' Report of a crawl read from its page logs (see utils/stats.py) in one
+    streaming pass, remembering how far each log was read so the next update
+    only reads the pages logged since. This works while the crawl is still
+    writing: a torn last record is read again next time.
+
+    No page text or url list is kept: urls are deduplicated with a scalable
+    Bloom filter of error_rate (a repeated url, e.g. downloaded again after
+    a crash, is counted once; a new one is missed with probability
+    error_rate), which grows by a few bytes per url past capacity, and only
+    the longest page and a count per subdomain are kept. Subdomains are
+    counted for every domain in domains. '''
+
+    STATE_MAGIC = b"RPST"
+
+    def __init__(self, domains, capacity=1000000, error_rate=1e-6):
+        self.domains = sorted({domain.strip().lower() for domain in domains})
+        self.offsets = dict()   # key = page log, val = bytes already read
+        self.seen = SeenFilter(capacity, error_rate)
+        self.pages = 0
+        self.repeated = 0
+        self.longest = None     # [url, word count]
+        self.subdomains = {domain: dict() for domain in self.domains}
+
+    def _domain(self, host):
+        # Longest of the domains host is or is under, if any.
+        matches = [domain for domain in self.domains
+                   if host == domain or host.endswith(f".{domain}")]
+        return max(matches, key=len) if matches else None
+
+    def _count(self, url, word_count):
+        fingerprint = get_urlfingerprint(url)
+        if fingerprint in self.seen:
+            self.repeated += 1
+            return
+        self.seen.add(fingerprint)
+        self.pages += 1
+        if self.longest is None or word_count > self.longest[1]:
+            self.longest = [url, word_count]
+        host = (urlparse(url).hostname or "").lower()
+        domain = self._domain(host)
+        if domain:
+            subdomain = f"http://{host.removeprefix('www.')}"
+            counts = self.subdomains[domain]
+            counts[subdomain] = counts.get(subdomain, 0) + 1
+
+    def update(self, page_log_path):
+        ''' Counts the pages logged since the last update. Returns how many,
+        or None if the log is shorter than what was read (the crawl was
+        restarted) and the report must be built again. '''
+        offset = self.offsets.get(page_log_path, 0)
+        if not os.path.exists(page_log_path):
+            return 0 if not offset else None
+        if offset > os.path.getsize(page_log_path):
+            return None
+        count = 0
+        for url, word_count in read_page_log(page_log_path, offset):
+            offset += PAGE_RECORD.size + len(url.encode("utf-8"))
+            self._count(url, word_count)
+            count += 1
+        self.offsets[page_log_path] = offset
+        return count
+
+    def save(self, path):
+        state = json.dumps({
+            "domains": self.domains,
+            "offsets": self.offsets,
+            "pages": self.pages,
+            "repeated": self.repeated,
+            "longest": self.longest,
+            "subdomains": self.subdomains,
+        }).encode("utf-8")
+        with open(f"{path}.tmp", "wb") as f:
+            f.write(self.STATE_MAGIC)
+            f.write(struct.pack("!I", len(state)))
+            f.write(state)
+            f.write(self.seen.to_bytes())
+        os.replace(f"{path}.tmp", path)
+
+    @classmethod
+    def load(cls, path, domains):
+        ''' The report saved at path, or a new one if there is none or it
+        was made for other domains. '''
+        report = cls(domains)
+        if not os.path.exists(path):
+            return report
+        with open(path, "rb") as f:
+            data = f.read()
+        if data[:len(cls.STATE_MAGIC)] != cls.STATE_MAGIC:
+            return report
+        offset = len(cls.STATE_MAGIC)
+        length, = struct.unpack_from("!I", data, offset)
+        offset += 4
+        state = json.loads(data[offset:offset + length].decode("utf-8"))
+        if state["domains"] != report.domains:
+            return report
+        report.offsets = state["offsets"]
+        report.pages = state["pages"]
+        report.repeated = state["repeated"]
+        report.longest = state["longest"]
+        report.subdomains = state["subdomains"]
+        report.seen = SeenFilter.from_bytes(data[offset + length:])
+        return report
+
+    def write(self, path, top_words):
+        lines = ["TOP 50 COMMON WORDS:"]
+        lines.extend(f"\t{word}: {count}" for word, count in top_words)
+        lines.append("")
+        lines.append(f"Number of unique pages: {self.pages}")
+        if self.longest:
+            lines.append("")
+            lines.append(
+                f"The longest page in terms of number of words is "
+                f"{self.longest[0]} with {self.longest[1]} words.")
+        for domain in self.domains:
+            subdomains = sorted(self.subdomains[domain].items())
+            lines.append("")
+            lines.append(
+                f"The number of {domain} subdomains is {len(subdomains)}.")
+            lines.append(f"{domain} subdomains:")
+            lines.extend(
+                f"\t{subdomain}, {count}" for subdomain, count in subdomains)
+        text = "\n".join(lines) + "\n"
+        with open(f"{path}.tmp", "w") as f:
+            f.write(text)
+        os.replace(f"{path}.tmp", path)
+        return text
+
+
+def top_words(snapshot_paths, n=50):
+    ''' The n most frequent words of the stats snapshots (one per crawl
+    process), as the crawl counted them so far. '''
+    counts = dict()
+    for path in snapshot_paths:
+        if not os.path.exists(path):
+            continue
+        with open(path) as f:
+            for word, count in json.load(f)["top_words"]:
+                counts[word] = counts.get(word, 0) + count
+    return sorted(counts.items(), key=lambda item: item[1], reverse=True)[:n]
+
+
+def stats_files(config):
+    ''' The page logs and snapshots the crawl writes. A partitioned crawl
+    writes one of each per process and only merges them at the end. '''
+    if config.processes > 1:
+        partitions = range(config.processes)
+        return ([partition_path(config.stats_page_log, p) for p in partitions],
+                [partition_path(config.stats_snapshot, p) for p in partitions])
+    return [config.stats_page_log], [config.stats_snapshot]
+
+
+def generate_report(config_file="config.ini", state_file="report.state",
+                    report_file="report.txt", follow=0, restart=False):
+    ''' Writes report_file from the crawl's stats, reading only the pages
+    logged since the last report. With follow, updates it every follow
+    seconds until interrupted. '''
+    cparser = ConfigParser()
+    cparser.read(config_file)
+    config = Config(cparser)
+    page_logs, snapshots = stats_files(config)
+    report = StreamingReport(config.allowed_domains) if restart else \
+        StreamingReport.load(state_file, config.allowed_domains)
+    while True:
+        for page_log in page_logs:
+            if report.update(page_log) is None:
+                # The crawl was restarted since the last report.
+                report = StreamingReport(config.allowed_domains)
+                for page_log in page_logs:
+                    report.update(page_log)
+                break
+        report.save(state_file)
+        print(report.write(report_file, top_words(snapshots)))
+        if not follow:
+            return
+        time.sleep(follow)
 
 
 if __name__ == '__main__':
-    generate_report()
\ No newline at end of file
+    parser = ArgumentParser()
+    parser.add_argument("--config_file", type=str, default="config.ini")
+    parser.add_argument("--state_file", type=str, default="report.state")
+    parser.add_argument("--report_file", type=str, default="report.txt")
+    parser.add_argument(
+        "--follow", type=float, default=0,
+        help="update the report every FOLLOW seconds while crawling")
+    parser.add_argument("--restart", action="store_true", default=False)
+    args = parser.parse_args()
+    generate_report(args.config_file, args.state_file, args.report_file,
+                    args.follow, args.restart)
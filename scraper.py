@@ -1,16 +1,23 @@
-import re
-from urllib.parse import urlparse
-import urllib.robotparser
-from simhash import Simhash
+from collections import namedtuple
+from urllib.parse import urljoin
+from local_simhash import simhash
 from time import sleep
-from bs4 import BeautifulSoup
-from tokenizer import tokenize, computeWordFrequencies
-from collections import defaultdict
-
-visited_and_words = {}  # key = url, val = # of words on page
-simhash_values = []
-word_frequencies = defaultdict(int) # key = word, val = frequency
-num_visited = int()
+from tokenizer import computeWordFrequencies
+from extractor import extract
+from utils.robots import robots_cache
+from utils.stats import CrawlStats
+from utils.urlfilter import UrlFilter
+from utils.canonical import canonicalizer
+from utils.traps import TrapDetector, USEFUL, DUPLICATE, LOW_VALUE, FAILED
+from utils.revisit import RevisitHistory, OUTCOME, WORD_COUNT, SIMHASH, LAST_FETCHED
+from utils.metrics import metrics
+from simhash_index import SimhashIndex
+
+crawl_stats = CrawlStats()  # pages and their # of words, word frequencies
+near_duplicates = SimhashIndex()    # simhashes of the pages kept so far
+url_filter = UrlFilter()    # which urls to crawl, configured by the crawler
+traps = TrapDetector()      # what each url pattern yields, the frontier asks it before adding urls
+revisits = RevisitHistory() # what pages looked like when last downloaded, for incremental crawls
 
 stopwords = {
     "a", "about", "above", "after", "again", "against", "all", "am", "an", "and",
@@ -37,6 +44,10 @@ stopwords = {
 def scraper(url, resp):
     return extract_next_links(url, resp)
 
+# A page parsed by process_page: its number of words, its word frequencies
+# without stopwords, its simhash and the absolute urls it links to
+ScrapedPage = namedtuple("ScrapedPage", ["word_count", "word_frequencies", "fingerprint", "links"])
+
 def extract_next_links(url, resp):
     # url: the URL that was used to get the page
     # resp.url: the actual url of the page
@@ -46,162 +57,146 @@ def extract_next_links(url, resp):
     #         resp.raw_response.url: the url, again
     #         resp.raw_response.content: the content of the page!
     # Return a list with the hyperlinks (as strings) scrapped from resp.raw_response.content
-
-    # ParseResult(scheme='http', netloc='www.openlab.ics.uci.edu', path='', params='', query='', fragment='')
-    parsed_url = urlparse(url)
-    
-    hyperlinks_list = []
-    politeness_delay = None
+    #
+    # Scraping is split in three steps so the CPU heavy one can run in another process
+    # (see crawler/pipeline.py): scrapable_content and apply_page use the crawler's state,
+    # process_page only uses its arguments.
+    content = scrapable_content(url, resp)
+    if content is None:
+        return []
+    return apply_page(url, resp.status, process_page(url, content))
+
+def unchanged_page(url, resp):
+    # In an incremental crawl, True if the page is the same as when it was last downloaded:
+    # what was recorded for it then is recorded again, and it is not parsed (its links were
+    # followed then, and are revisited on their own schedule)
+    known = revisits.unchanged(url, resp)
+    if known is None:
+        if revisits.enabled:
+            metrics.count("dedup.unchanged.miss")
+        return False
+    metrics.count("dedup.unchanged.hit")
+    outcome, word_count, fingerprint = known[OUTCOME], known[WORD_COUNT], known[SIMHASH]
+    # A page already downloaded during this crawl (e.g. again after a resume) is in the
+    # stats already: it is counted once
+    if word_count and known[LAST_FETCHED] < crawl_stats.started:
+        crawl_stats.record_page(url, word_count, {})
+    if outcome == USEFUL:
+        near_duplicates.add_if_new(fingerprint)
+    traps.record(url, outcome)
+    return True
+
+def scrapable_content(url, resp):
+    # Returns the body to parse, or None if the page should not be scraped
     
-    # parse robots.txt to check for politness delay
-    try:
-        robots_url = f"{parsed_url.scheme}://{parsed_url.netloc}/robots.txt"
-        robots = urllib.robotparser.RobotFileParser()
-        robots.set_url(robots_url)
-        robots.read()
-        
-        # if url can be fetched, request politness delay in seconds
-        if robots.can_fetch("*", url):
-            robots_delay = robots.request_rate("*")
-            # if the delay does not eexist, default to 0.5 from config.ini
-            politeness_delay = robots_delay.seconds if robots_delay else 0.5
-            print('POLITENESS DELAY: ' + str(politeness_delay))
-        
-        # url cannot be scraped, return
-        else:
-            return hyperlinks_list, politeness_delay
-        
-    except Exception as e:
-        print(e)
+    # check robots.txt (cached per host, the crawl delay it asks for is
+    # enforced by the frontier)
+    with metrics.timer("robots.fetch"):
+        allowed = robots_cache.can_fetch(url)
+    if not allowed:
+        return None
     
     # checks if page is responsive 
-    if (resp.status < 400 and resp.status >= 200):
-        crawlURL = url
-
-        # check if page already visited
-        if crawlURL in visited_and_words:
-            return hyperlinks_list, politeness_delay
-
-        # scrape text from soup
-        soup = BeautifulSoup(resp.raw_response.content, 'html.parser')
+    # (the frontier hands every url out once, so it was not visited before)
+    if not (resp.status < 400 and resp.status >= 200):
+        # else check error if status is not 200
+        traps.record(url, FAILED)
+        return None
+
+    # check if there is a body at all before parsing anything
+    # (resp.body is a view of the page after the worker's content gate)
+    if not resp.raw_response or not resp.body:
+        traps.record(url, FAILED)
+        return None
+    return resp.body
+
+def process_page(url, content):
+    # Parses the page and returns a ScrapedPage, or None if the page has nothing worth keeping
+    # Pure function of its arguments: it runs in the pipeline's processes
+
+    # retrieve tokens and link hrefs from the html in a single pass
+    with metrics.timer("parse"):
+        page = extract(content)
+    tokens = page.tokens
+
+    # check if the url is dead (no tokens), returns the hyperlink list
+    if len(tokens) == 0:
+        metrics.count("pages.empty")
+        return None
         
-        # retrieve tokens from text
-        tokens = soup.get_text().split('\n') 
-        tokens = tokenize([t for t in tokens if len(t.strip()) > 0])
-
-        # check if the url is dead (no tokens), returns the hyperlink list and politness delay
-        if len(tokens) == 0:
-            return hyperlinks_list, politeness_delay
-            
-        # count word frequencies from tokens
+    # count word frequencies from tokens
+    with metrics.timer("tokenize"):
         freqs = computeWordFrequencies(tokens)
-        print(f"UNIQUE TOKENS = {len(freqs.items())}")
-
-        # check if page is too small (<100 unique tokens) or too large (>15,000 unique tokens)
-        unique_tokens = len(freqs.keys())
-        if unique_tokens < 100 or unique_tokens > 15000:
-            print('TOO SMALL/LARGE')
-            return hyperlinks_list, politeness_delay
-
-        # if the url is a redirect code, do not add it to the visited_and_words, but will continue to parse the content
-        if resp.status < 300:
-            visited_and_words[url] = len(tokens)
-            global num_visited
-            num_visited += 1
-
-        # add to word_frequencies
-        for word in freqs:
-            if word not in stopwords:
-                word_frequencies[word] += freqs[word]
-        
-        # check if similar to previous pages using Simhash
-        current = Simhash(tokens).value
-        if current not in simhash_values:
-            simhash_values.append(current)
-        else:
-            return hyperlinks_list, politeness_delay     # url is similar to previous
-                
-        # scrape links from soup
-        for link in soup.find_all('a'):
-            try:
-                href = link.get('href')
-                new_link = ""
-
-                if not href or not is_valid(href):
-                    continue
-                
-                if href[:2] == "//":
-                    # if link href starts with //, add parsed_url.scheme + ':' to the front
-                        # ex: <a href="//www.ics.uci.edu/ugrad/livechat.php">
-                    new_link = parsed_url.scheme + ':' + href
-                elif href[0] == "/":
-                    # if link href starts with /, it's a relative link --> add base URL to front
-                        # ex: <scheme>://<netloc><link href>
-                    new_link = parsed_url.scheme + '://' + parsed_url.netloc + href
-                elif href[0] == "#":
-                    # if link href starts with #, it's a fragment of url --> do nothing
-                        # ex: #carouselExampleIndicators
-                        #     <a href="#" id="back2Top" title="Back to top"> 
-                    continue
-                elif href.find('://') == -1:
-                    if href.find(':') == -1:
-                        # ex: employment/employ_faculty.php
-                        new_link = parsed_url.scheme + '://' + parsed_url.netloc + '/' + href
-                    else:
-                        # ex: mailto:ichair@ics.uci.edu
-                        #     tel: ...
-                        #     data ...
-                        #     urn:isbn:0451450523
-                        continue
-                else:
-                    # ex: https://campusgroups.uci.edu/rsvp?id=1841688
-                    new_link = href
-                
-                # check if there is a fragment (aka check if contains #); if so, strip from the url
-                fragment_index = new_link.find("#") 
-                if fragment_index != -1:
-                    new_link = new_link[:fragment_index]
-
-                # add new_link to frontier
-                hyperlinks_list.append(new_link)
-            
-            except TypeError as e:
-                print(e)
+
+    # check if page is too small (<100 unique tokens) or too large (>15,000 unique tokens)
+    unique_tokens = len(freqs.keys())
+    if unique_tokens < 100 or unique_tokens > 15000:
+        metrics.count("pages.too_small_or_large")
+        return None
+
+    # scrape links from the page: hrefs are resolved against the page's url (or its <base href>)
+    # with urljoin and canonicalized, so ../, query-only and //host links all work, fragments
+    # are dropped and the same page linked in different ways is added once
+    # ex: <a href="../about/">, <a href="?page=2">, <a href="//www.ics.uci.edu/ugrad/livechat.php">
+    base_url = url
+    if page.base_href:
+        try:
+            base_url = urljoin(url, page.base_href)
+        except ValueError:
+            pass
+    with metrics.timer("links"):
+        hyperlinks_list = url_filter.filter(canonicalizer.resolve_links(base_url, page.hrefs))
+
+    with metrics.timer("simhash"):
+        fingerprint = simhash(tokens)
+
+    # word frequencies leave out stopwords
+    return ScrapedPage(
+        len(tokens),
+        {word: count for word, count in freqs.items() if word not in stopwords},
+        fingerprint,
+        hyperlinks_list)
+
+def apply_page(url, status, page):
+    # Records a page returned by process_page and returns the links to add to the frontier
+    # (what the page yielded is also recorded for the trap detector)
+    if page is None:
+        traps.record(url, LOW_VALUE)
+        revisits.record_page(url, LOW_VALUE)
+        return []
+
+    # if the url is a redirect code, do not add it to the crawl stats, but will continue to parse the content
+    word_count = 0
+    if status < 300:
+        crawl_stats.record_page(url, page.word_count, page.word_frequencies)
+        word_count = page.word_count
     
-    # else check error if status is not 200
-    return hyperlinks_list, politeness_delay
+    # check if similar to previous pages using Simhash (within
+    # SIMHASHDISTANCE bits of a page already kept)
+    if not near_duplicates.add_if_new(page.fingerprint):
+        metrics.count("dedup.content.hit")
+        traps.record(url, DUPLICATE)
+        revisits.record_page(url, DUPLICATE, word_count)
+        return []     # url is similar to previous
+
+    metrics.count("dedup.content.miss")
+    traps.record(url, USEFUL)
+    revisits.record_page(url, USEFUL, word_count, page.fingerprint)
+
+    # add the links to frontier
+    return page.links
 
 def is_valid(url):
     # Decide whether to crawl this url or not. 
     # If you decide to crawl it, return True; otherwise return False.
-    # There are already some conditions that return False.
+    # The conditions (http(s) only, *.ics.uci.edu/*, *.cs.uci.edu/*, *.informatics.uci.edu/*,
+    # *.stat.uci.edu/*, no css/js/images/documents/archives..., allow/deny rules) are
+    # precomputed in url_filter from the CRAWLER section of config.ini, see utils/urlfilter.py
     try:
-        parsed = urlparse(url)
-
-        if parsed.scheme not in set(["http", "https"]):
-            return False
-        
-        if re.match(
-            r".*\.(css|js|bmp|gif|jpe?g|ico"
-            + r"|png|tiff?|mid|mp2|mp3|mp4"
-            + r"|wav|avi|mov|mpeg|ram|m4v|mkv|ogg|ogv|pdf"
-            + r"|ps|eps|tex|ppt|pptx|doc|docx|xls|xlsx|names"
-            + r"|data|dat|exe|bz2|tar|msi|bin|7z|psd|dmg|iso"
-            + r"|epub|dll|cnf|tgz|sha1"
-            + r"|thmx|mso|arff|rtf|jar|csv"
-            + r"|rm|smil|wmv|swf|wma|zip|rar|gz)$", parsed.path.lower()):
-            return False
-        
-        # parsed.netloc must be either *.ics.uci.edu/*, *.cs.uci.edu/*, *.informatics.uci.edu/*, *.stat.uci.edu/*
-        
-        valid_urls = [".ics.uci.edu", ".cs.uci.edu", ".informatics.uci.edu", ".stat.uci.edu"]
-        for url in valid_urls:
-            if (re.search(url, parsed.netloc)):
-                return True
-        return False
+        return url_filter.allows(url)
                 
     except TypeError:
-        print ("TypeError for ", parsed)
+        print ("TypeError for ", url)
         raise
 
 
@@ -0,0 +1,151 @@
+import os
+from array import array
+from itertools import combinations
+from threading import Lock
+
+from local_simhash import FEATURE_HASH_LENGTH as FINGERPRINT_BITS
+
+
+class SimhashIndex(object):
+    ''' Answers "is there a stored 64-bit fingerprint within Hamming distance
+    k of this one" without comparing against every stored fingerprint.
+
+    Permuted-table scheme (Manku et al., "Detecting Near-Duplicates for Web
+    Crawling"): the bits are cut into `blocks` contiguous blocks. Two
+    fingerprints at distance <= k differ in at most k blocks, so they agree
+    exactly on at least blocks - k of them. There is one table per choice of
+    blocks - k blocks, keyed by the fingerprint masked to those blocks; a
+    query only compares against the fingerprints sharing a key with it in
+    some table. blocks = k + 1 (the default) keeps k + 1 tables with
+    16-bit keys for k = 3; more blocks mean more tables but fewer
+    candidates per query. '''
+
+    FILE_MAGIC = b"SHIX"
+
+    def __init__(self, k=3, blocks=None):
+        self.lock = Lock()
+        self.path = None
+        self.saved = 0      # fingerprints already in the file at self.path
+        self._reset(k, blocks)
+
+    def _reset(self, k, blocks=None):
+        self.k = k
+        self.blocks = blocks if blocks else k + 1
+        if not k < self.blocks <= FINGERPRINT_BITS:
+            raise ValueError(f"Need k < blocks <= {FINGERPRINT_BITS}.")
+        block_masks = list()
+        for i in range(self.blocks):
+            start = i * FINGERPRINT_BITS // self.blocks
+            end = (i + 1) * FINGERPRINT_BITS // self.blocks
+            block_masks.append(((1 << (end - start)) - 1) << start)
+        self.masks = [
+            sum(chosen)
+            for chosen in combinations(block_masks, self.blocks - k)]
+        self.tables = [dict() for _ in self.masks]
+        self.fingerprints = array("Q")
+
+    def configure(self, config, restart=False):
+        ''' Sets k from config and, unless restarting, reloads the
+        fingerprints saved by a previous run. '''
+        with self.lock:
+            self._reset(config.simhash_distance, config.simhash_blocks)
+        self.path = config.simhash_file
+        self.saved = 0
+        if restart or not os.path.exists(self.path):
+            return
+        with open(self.path, "rb") as f:
+            if f.read(len(self.FILE_MAGIC)) != self.FILE_MAGIC:
+                raise ValueError(f"{self.path} is not a simhash index file.")
+            data = f.read()
+        # A crash while a save was appending may leave a torn fingerprint.
+        whole = len(data) - len(data) % 8
+        fingerprints = array("Q")
+        fingerprints.frombytes(data[:whole])
+        for fingerprint in fingerprints:
+            self.add(fingerprint)
+        self.saved = len(fingerprints)
+        if whole < len(data):
+            with open(self.path, "r+b") as f:
+                f.truncate(len(self.FILE_MAGIC) + whole)
+
+    def __len__(self):
+        return len(self.fingerprints)
+
+    def _near(self, fingerprint):
+        # The popcount of local_simhash.hamming_distance, inlined: this loop
+        # runs for every candidate of every page.
+        k = self.k
+        for mask, table in zip(self.masks, self.tables):
+            bucket = table.get(fingerprint & mask)
+            if bucket is None:
+                continue
+            if type(bucket) is int:
+                if bin(bucket ^ fingerprint).count("1") <= k:
+                    return bucket
+                continue
+            for candidate in bucket:
+                if bin(candidate ^ fingerprint).count("1") <= k:
+                    return candidate
+        return None
+
+    def _add(self, fingerprint):
+        for mask, table in zip(self.masks, self.tables):
+            key = fingerprint & mask
+            bucket = table.get(key)
+            # Most keys of wide masks hold a single fingerprint, stored as a
+            # plain int; an array is only made for the second one.
+            if bucket is None:
+                table[key] = fingerprint
+            elif type(bucket) is int:
+                table[key] = array("Q", (bucket, fingerprint))
+            else:
+                bucket.append(fingerprint)
+        self.fingerprints.append(fingerprint)
+
+    def find_near_duplicate(self, fingerprint):
+        ''' Returns a stored fingerprint within distance k, or None. '''
+        fingerprint &= 0xFFFFFFFFFFFFFFFF
+        with self.lock:
+            return self._near(fingerprint)
+
+    def add(self, fingerprint):
+        with self.lock:
+            self._add(fingerprint & 0xFFFFFFFFFFFFFFFF)
+
+    def add_if_new(self, fingerprint):
+        ''' Stores fingerprint and returns True unless a near-duplicate of it
+        is already stored, in which case returns False. '''
+        fingerprint &= 0xFFFFFFFFFFFFFFFF
+        with self.lock:
+            if self._near(fingerprint) is not None:
+                return False
+            self._add(fingerprint)
+            return True
+
+    def save(self, path=None):
+        ''' Writes every fingerprint to path, replacing the previous file
+        atomically. The configured SIMHASHFILE (the default) is a log: only
+        the fingerprints added since the last save are appended to it. '''
+        if path is None or path == self.path:
+            with self.lock:
+                added = self.fingerprints[self.saved:].tobytes()
+                count = len(self.fingerprints)
+            if self.saved and os.path.exists(self.path):
+                with open(self.path, "ab") as f:
+                    f.write(added)
+                    f.flush()
+                    os.fsync(f.fileno())
+                self.saved = count
+                return
+            path = self.path
+        with self.lock:
+            data = self.fingerprints.tobytes()
+            count = len(self.fingerprints)
+        with open(f"{path}.tmp", "wb") as f:
+            f.write(self.FILE_MAGIC)
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(f"{path}.tmp", path)
+        if path == self.path:
+            self.saved = count
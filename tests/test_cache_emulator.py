@@ -0,0 +1,138 @@
+import os
+from configparser import ConfigParser
+from urllib.parse import urljoin, urlsplit
+
+import pytest
+
+import scraper
+import crawler.worker
+from crawler import Crawler
+from crawler.worker import Worker, AsyncWorker
+from utils.async_download import AsyncDownloader
+from utils.cache_emulator import CacheServerEmulator, SyntheticSite
+from utils.config import Config
+from utils.robots import robots_cache
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_site_is_deterministic():
+    site, again = SyntheticSite(pages=50), SyntheticSite(pages=50)
+    for i in (0, 9, 10, 49):
+        assert site.get(site.url(i)) == again.get(site.url(i))
+    assert site.get(site.url(1)) != SyntheticSite(pages=50, seed=1).get(site.url(1))
+
+
+def test_site_pages():
+    site = SyntheticSite(pages=300, words=50, large_every=7, large_words=500)
+    status, headers, body = site.get(site.url(9))
+    assert status == 200 and headers["Content-Type"].startswith("text/html")
+    assert body.count(b"<a href=") == site.fanout + 1
+    assert b'href="/private/admin.html"' in body
+    # Every duplicate_every-th page has the text of the one before it.
+    assert site._text(10) == site._text(9) != site._text(11)
+    assert len(site._text(7).split()) == 500
+    assert len(site._text(8).split()) == 50
+    # Every trap_every-th page links into the traps.
+    assert b"/calendar/2020-01-01" in site.get(site.url(200))[2]
+    assert b"/calendar/" not in site.get(site.url(199))[2]
+    status, _, body = site.get("https://www.ics.uci.edu/calendar/2020-01-31")
+    assert status == 200 and b'href="/calendar/2020-02-01"' in body
+    status, _, body = site.get("https://www.cs.uci.edu/pages/archive/archive/index.html")
+    assert status == 200 and b'href="archive/index.html"' in body
+
+    assert site.get("https://www.stat.uci.edu/robots.txt")[2] == \
+        site.ROBOTS_TXT.encode()
+    assert site.get(f"https://www.ics.uci.edu/pages/{site.pages}.html")[0] == 404
+    assert site.get("https://www.ics.uci.edu/other")[0] == 404
+    assert site.get("https://example.com/pages/1.html") == (404, {}, b"")
+
+
+def _reachable(site):
+    # Pages linked from the seed, following links the way the scraper
+    # resolves them (no traps, no near-duplicates in the site).
+    found, stack = {site.url(0)}, [0]
+    while stack:
+        i = stack.pop()
+        for link in site._links(i):
+            parts = urlsplit(urljoin(site.url(i), link))
+            url = f"https://{parts.hostname}{parts.path}"
+            if url not in found and not parts.path.startswith("/private/"):
+                found.add(url)
+                stack.append(int(parts.path[len("/pages/"):-len(".html")]))
+    return found
+
+
+@pytest.fixture
+def crawl(tmp_path, monkeypatch):
+    # Crawls site from scratch in tmp_path, as benchmark.py does, and
+    # returns the urls downloaded.
+    monkeypatch.chdir(tmp_path)
+    downloaded = list()
+
+    def sync_download(url, config, logger=None):
+        downloaded.append(url)
+        return download(url, config, logger)
+    download = crawler.worker.download
+    monkeypatch.setattr(crawler.worker, "download", sync_download)
+
+    async def async_download(self, url):
+        downloaded.append(url)
+        return await download_async(self, url)
+    download_async = AsyncDownloader.download
+    monkeypatch.setattr(AsyncDownloader, "download", async_download)
+
+    def run(site, worker="thread", **options):
+        emulator = CacheServerEmulator(site)
+        cparser = ConfigParser()
+        cparser.read(os.path.join(ROOT, "config.ini"))
+        cparser["CRAWLER"]["SEEDURL"] = site.url(0)
+        cparser["CRAWLER"]["POLITENESS"] = "0"
+        cparser["CRAWLER"].update(options)
+        cparser["LOCAL PROPERTIES"]["WORKER"] = worker
+        cparser["LOCAL PROPERTIES"]["THREADCOUNT"] = "4" if worker == "thread" else "1"
+        cparser["LOCAL PROPERTIES"]["ASYNCCONCURRENCY"] = "8"
+        config = Config(cparser)
+        config.cache_server = emulator.start()
+        try:
+            crawl = Crawler(config, True, worker_factory=(
+                AsyncWorker if worker == "async" else Worker))
+            for host in site.HOSTS:
+                robots_cache.add(f"https://{host}/", site.ROBOTS_TXT)
+            crawl.start()
+        finally:
+            emulator.stop()
+        return downloaded
+    return run
+
+
+@pytest.mark.parametrize("worker", ["thread", "async"])
+def test_crawl_downloads_every_page_once(crawl, worker):
+    site = SyntheticSite(pages=60, fanout=3, words=200, duplicate_every=0,
+                         large_every=0, trap_every=0)
+    downloaded = crawl(site, worker)
+    assert len(downloaded) == len(set(downloaded))
+    # robots.txt is checked when a page is scraped: the disallowed pages
+    # are downloaded, but neither counted nor followed.
+    private = {f"https://{host}/private/admin.html" for host in site.HOSTS}
+    assert set(downloaded) == _reachable(site) | private
+    assert scraper.crawl_stats.page_count == len(downloaded) - len(private)
+    assert os.path.exists("results.txt")
+
+
+def test_crawl_stays_out_of_traps(crawl):
+    site = SyntheticSite(pages=40, fanout=3, words=200, duplicate_every=4,
+                         large_every=0, trap_every=10)
+    # About 60% of the calendar's days are near-duplicates, more than the
+    # default TRAPMINYIELD lets through but enough to stop it here.
+    downloaded = crawl(site, TRAPMINYIELD="0.8")
+    assert len(downloaded) == len(set(downloaded))
+    paths = [urlsplit(url).path for url in downloaded]
+    # The archive nests at most TRAPMAXREPEAT times, the endless calendar
+    # is blacklisted after TRAPMINSAMPLES of its pages.
+    assert max(path.count("archive") for path in paths) == 2
+    assert 20 <= sum(path.startswith("/calendar/") for path in paths) < 60
+    summary = scraper.traps.summary()
+    assert summary["rejected"]["repeating path"]
+    assert [pattern for pattern in summary["blacklisted"] if "calendar" in pattern]
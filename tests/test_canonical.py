@@ -0,0 +1,69 @@
+from types import SimpleNamespace
+
+import pytest
+
+from utils.canonical import Canonicalizer
+
+
+@pytest.mark.parametrize("url, canonical", [
+    # scheme and host lowercased, default port, userinfo and fragment dropped
+    ("HTTPS://User:pw@WWW.ICS.UCI.EDU:443/About#team",
+     "https://www.ics.uci.edu/About"),
+    ("http://www.ics.uci.edu:80/", "http://www.ics.uci.edu/"),
+    ("http://www.ics.uci.edu:8080/", "http://www.ics.uci.edu:8080/"),
+    ("https://www.ics.uci.edu./a", "https://www.ics.uci.edu/a"),
+    # trailing slashes, but the root's
+    ("https://www.ics.uci.edu", "https://www.ics.uci.edu/"),
+    ("https://www.ics.uci.edu/a/b/", "https://www.ics.uci.edu/a/b"),
+    # dot segments
+    ("https://www.ics.uci.edu/a/./b/../c", "https://www.ics.uci.edu/a/c"),
+    ("https://www.ics.uci.edu/../a", "https://www.ics.uci.edu/a"),
+    ("https://www.ics.uci.edu/a/b/..", "https://www.ics.uci.edu/a"),
+    # percent escapes: unreserved decoded, the rest uppercased
+    ("https://www.ics.uci.edu/%7euser/a%2fb", "https://www.ics.uci.edu/~user/a%2Fb"),
+    # the query is sorted as written
+    ("https://www.ics.uci.edu/?b=2&a=1", "https://www.ics.uci.edu/?a=1&b=2"),
+    ("https://www.ics.uci.edu/?foo", "https://www.ics.uci.edu/?foo"),
+    ("https://www.ics.uci.edu/dir?C=N;O=D", "https://www.ics.uci.edu/dir?C=N;O=D"),
+    ("https://www.ics.uci.edu/?q=a+b&x=%2F", "https://www.ics.uci.edu/?q=a+b&x=%2F"),
+    ("https://www.ics.uci.edu/?a=1&&b=2&", "https://www.ics.uci.edu/?a=1&b=2"),
+    # session and tracking parameters, in the query and the path
+    ("https://www.ics.uci.edu/?id=3&utm_source=x&PHPSESSID=ab",
+     "https://www.ics.uci.edu/?id=3"),
+    ("https://www.ics.uci.edu/page;jsessionid=AB12?x=1",
+     "https://www.ics.uci.edu/page?x=1"),
+    ("https://www.ics.uci.edu/page;type=a", "https://www.ics.uci.edu/page;type=a"),
+    # other schemes and malformed urls are left as they are
+    ("mailto:someone@uci.edu", "mailto:someone@uci.edu"),
+    ("http://[::1/", "http://[::1/"),
+    ("http://www.ics.uci.edu:99999/", "http://www.ics.uci.edu:99999/"),
+])
+def test_canonicalize(url, canonical):
+    assert Canonicalizer().canonicalize(url) == canonical
+
+
+def test_canonical_urls_are_fixed_points():
+    canonicalizer = Canonicalizer()
+    for url in ("https://www.ics.uci.edu/?foo", "https://www.ics.uci.edu/dir?C=N;O=D",
+                "https://www.ics.uci.edu/~user/a%2Fb?b=2&a=1"):
+        canonical = canonicalizer.canonicalize(url)
+        assert canonicalizer.canonicalize(canonical) == canonical
+
+
+def test_relative_links():
+    canonicalizer = Canonicalizer()
+    assert canonicalizer.canonicalize("../b/", "https://www.ics.uci.edu/a/c/") \
+        == "https://www.ics.uci.edu/a/b"
+    assert canonicalizer.resolve_links(
+        "https://www.ics.uci.edu/a/", ["#top", "", "b", "./b#x", "/c", "http://[::1"]) \
+        == ["https://www.ics.uci.edu/a/b", "https://www.ics.uci.edu/c"]
+
+
+def test_configure():
+    canonicalizer = Canonicalizer()
+    canonicalizer.configure(SimpleNamespace(
+        stripped_params=["ref*"], query_whitelist=["id", "page"],
+        canonical_memo_size=16))
+    assert canonicalizer.canonicalize(
+        "https://www.ics.uci.edu/?referrer=x&page=2&sort=up&ID=7") \
+        == "https://www.ics.uci.edu/?ID=7&page=2"
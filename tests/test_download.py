@@ -0,0 +1,101 @@
+import asyncio
+import logging
+from types import SimpleNamespace
+
+import pytest
+import requests
+
+from utils import download as download_module
+from utils.download import download
+from utils.async_download import AsyncDownloader
+from utils.cache_emulator import CacheServerEmulator, SyntheticSite
+
+
+SITE = SyntheticSite(pages=20)
+URL = SITE.url(3)
+
+
+@pytest.fixture(scope="module")
+def cache_server():
+    emulator = CacheServerEmulator(SITE)
+    address = emulator.start()
+    yield address
+    emulator.stop()
+
+
+def _config(cache_server, **kwargs):
+    config = SimpleNamespace(
+        cache_server=cache_server, user_agent="IR US24 test",
+        download_timeout=5, download_retries=2, download_backoff=0.01,
+        async_concurrency=4, cbor_offload_bytes=65536)
+    config.__dict__.update(kwargs)
+    return config
+
+
+def _async_download(config, urls, logger=None):
+    async def run():
+        downloader = AsyncDownloader(config, logger)
+        try:
+            return await asyncio.gather(*map(downloader.download, urls))
+        finally:
+            downloader.close()
+    return asyncio.run(run())
+
+
+def _dead_address():
+    # A port nothing listens on.
+    emulator = CacheServerEmulator(SITE)
+    address = emulator.server.server_address[:2]
+    emulator.server.server_close()
+    return address
+
+
+def test_download(cache_server):
+    resp = download(URL, _config(cache_server))
+    _, headers, body = SITE.get(URL)
+    assert resp.status == 200
+    assert resp.body == body
+    assert resp.raw_response.headers["content-type"] == headers["Content-Type"]
+
+
+def test_async_download_matches(cache_server):
+    urls = [SITE.url(i) for i in range(10)] + [
+        "https://www.ics.uci.edu/missing", SITE.url(100)]
+    # Pages of 64 bytes and more are decoded off the event loop.
+    for offload in (65536, 64):
+        config = _config(cache_server, cbor_offload_bytes=offload)
+        for resp, url in zip(_async_download(config, urls), urls):
+            expected = download(url, config)
+            assert (resp.status, resp.url) == (expected.status, expected.url)
+            assert resp.body == expected.body
+
+
+def test_retries_then_reports_a_cache_error(caplog):
+    logger = logging.getLogger("test_download")
+    config = _config(_dead_address())
+    for downloader in (lambda: download(URL, config, logger),
+                       lambda: _async_download(config, [URL], logger)[0]):
+        caplog.clear()
+        with caplog.at_level(logging.WARNING, logger="test_download"):
+            resp = downloader()
+        assert resp.status == 600 and resp.url == URL
+        assert resp.error.startswith("Spacetime Response error")
+        retries = [record for record in caplog.records
+                   if record.getMessage().startswith("Retrying")]
+        assert len(retries) == config.download_retries
+
+
+def test_retry_succeeds(cache_server, monkeypatch):
+    get = requests.Session.get
+    failures = list()
+
+    def flaky_get(self, *args, **kwargs):
+        if len(failures) < 2:
+            failures.append(None)
+            raise requests.exceptions.ConnectionError("reset")
+        return get(self, *args, **kwargs)
+    monkeypatch.setattr(requests.Session, "get", flaky_get)
+    monkeypatch.setattr(download_module, "_sessions", type(
+        download_module._sessions)())
+    resp = download(URL, _config(cache_server))
+    assert resp.status == 200 and len(failures) == 2
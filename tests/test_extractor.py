@@ -0,0 +1,51 @@
+import pytest
+
+import extractor
+from extractor import extract
+
+
+# lxml is optional, html.parser is always there.
+LXML = pytest.param("lxml", marks=pytest.mark.skipif(
+    extractor.etree is None, reason="lxml is not installed"))
+BACKENDS = [LXML, "html.parser"]
+
+PAGE = b"""<!DOCTYPE html>
+<html><head><title>ICS</title><base href="https://www.ics.uci.edu/dir/">
+<style>p { color: red }</style><script>var hidden = "<a href='/js'>";</script>
+</head><body>
+<p>Welcome to <b>In</b>formatics &amp; more</p>
+<a href="/about">About</a> <a>no href</a> <a href="">empty</a>
+<template><a href="/tpl">t</a> template text</template>
+<a href="people.html#x">People</a>
+</body></html>"""
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_extract(backend):
+    page = extract(PAGE, backend)
+    assert page.tokens == ["ics", "welcome", "to", "informatics", "more",
+                           "about", "no", "href", "empty", "people"]
+    assert page.hrefs == ["/about", "/tpl", "people.html#x"]
+    assert page.base_href == "https://www.ics.uci.edu/dir/"
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_declared_charset(backend):
+    content = '<meta charset="iso-8859-1"><p>caf\xe9 ol\xe9</p>'.encode("latin-1")
+    assert extract(content, backend).tokens == ["caf", "ol"]
+    # An unknown charset is ignored rather than raising.
+    assert extract(b'<meta charset="bogus"><p>ok</p>', backend).tokens == ["ok"]
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_memoryview_across_chunks(backend, monkeypatch):
+    monkeypatch.setattr(extractor, "FEED_CHUNK", 7)
+    content = b"<p>" + b"word " * 50 + b'<a href="/split/link">x</a></p>'
+    page = extract(memoryview(content), backend)
+    assert page == extract(content, backend)
+    assert len(page.tokens) == 51 and page.hrefs == ["/split/link"]
+
+
+@pytest.mark.skipif(extractor.etree is None, reason="lxml is not installed")
+def test_backends_agree():
+    assert extract(PAGE, "lxml") == extract(PAGE, "html.parser")
@@ -0,0 +1,96 @@
+import os
+import time
+from configparser import ConfigParser
+
+import pytest
+
+import crawler.frontier
+from crawler.frontier import Frontier
+from utils.config import Config
+from utils.traps import TrapDetector
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture
+def config(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(crawler.frontier, "traps", TrapDetector())
+    cparser = ConfigParser()
+    cparser.read(os.path.join(ROOT, "config.ini"))
+    config = Config(cparser)
+    config.save_file = str(tmp_path / "frontier.db")
+    config.queue_dir = str(tmp_path / "frontier.queue")
+    config.checkpoint_file = str(tmp_path / "frontier.snapshot")
+    config.seed_urls = ["https://www.ics.uci.edu/"]
+    config.time_delay = 0.2
+    return config
+
+
+def _drain(frontier):
+    # Every url the frontier hands out right now.
+    urls = list()
+    while True:
+        url, _ = frontier.next_tbd_url()
+        if url is None:
+            return urls
+        urls.append(url)
+
+
+def test_one_request_per_host_per_delay(config):
+    frontier = Frontier(config, restart=True)
+    seed = frontier.get_tbd_url()
+    for path in ("a", "b"):
+        frontier.add_url(f"https://www.ics.uci.edu/{path}", seed)
+    frontier.add_url("https://www.cs.uci.edu/", seed)
+    frontier.mark_url_complete(seed)
+
+    # The other host is due at once, the seed's host only after the delay.
+    assert _drain(frontier) == ["https://www.cs.uci.edu/"]
+    url, wait = frontier.next_tbd_url()
+    assert url is None and 0 < wait <= config.time_delay
+    time.sleep(wait)
+    assert len(_drain(frontier)) == 1
+    url, wait = frontier.next_tbd_url()
+    assert url is None and wait == pytest.approx(config.time_delay, abs=0.05)
+
+
+def test_hosts_are_served_in_ready_time_order(config):
+    config.seed_urls = [f"https://host{i}.ics.uci.edu/" for i in range(3)]
+    frontier = Frontier(config, restart=True)
+    first = _drain(frontier)
+    assert sorted(first) == sorted(config.seed_urls)
+    for url in first:
+        frontier.add_url(f"{url}next", url)
+        frontier.mark_url_complete(url)
+    # All three hosts were contacted at about the same time, none is due.
+    url, wait = frontier.next_tbd_url()
+    assert url is None and wait > 0
+    time.sleep(wait)
+    assert sorted(_drain(frontier)) == sorted(
+        f"{url}next" for url in config.seed_urls)
+
+
+def test_crawl_delay_pushes_back_a_scheduled_host(config):
+    frontier = Frontier(config, restart=True)
+    seed = frontier.get_tbd_url()
+    frontier.add_url("https://www.ics.uci.edu/a", seed)
+    frontier.mark_url_complete(seed)
+    frontier.set_host_delay(seed, 1.0)
+    _, wait = frontier.next_tbd_url()
+    assert wait > 0.7
+    # A delay below the configured politeness is not honoured.
+    frontier.set_host_delay(seed, 0.01)
+    assert frontier._host_delay("www.ics.uci.edu") == config.time_delay
+
+
+def test_finished_crawl(config):
+    frontier = Frontier(config, restart=True)
+    seed = frontier.get_tbd_url()
+    # Nothing queued, but the page in progress may still add urls.
+    assert frontier.next_tbd_url() == (None, float("inf"))
+    frontier.add_url(seed, seed)
+    frontier.mark_url_complete(seed)
+    assert frontier.next_tbd_url() == (None, None)
+    assert frontier.get_tbd_url() is None
@@ -0,0 +1,57 @@
+import pytest
+
+from utils.cache_emulator import cache_response
+from utils.gate import ContentGate
+from utils.response import Response, decode_cache_response
+
+
+URL = "https://www.ics.uci.edu/page.html"
+HTML = {"Content-Type": "text/html; charset=utf-8"}
+
+
+def _resp(body, headers=HTML):
+    return Response(decode_cache_response(cache_response(URL, 200, headers, body)))
+
+
+@pytest.mark.parametrize("headers, body, reason", [
+    (HTML, b"<html><p>page</p></html>", None),
+    ({"Content-Type": "Application/XHTML+xml"}, b"<html/>", None),
+    ({}, b"<html/>", None),
+    (HTML, b"", None),
+    ({"Content-Type": "application/pdf"}, b"%PDF-1.4", "content type application/pdf"),
+    ({"Content-Type": "text/plain"}, b"hello", "content type text/plain"),
+    # Binary bodies served as html.
+    (HTML, b"%PDF-1.4\n...", "pdf body"),
+    (HTML, b"PK\x03\x04slides", "zip (office document) body"),
+    ({}, b"\x89PNG\r\n\x1a\n....", "png body"),
+    (HTML, b"<html>\x00\x01\x02", "binary body"),
+])
+def test_content_checks(headers, body, reason):
+    assert ContentGate(1000).check(_resp(body, headers)) == reason
+
+
+def test_error_response_passes():
+    resp = Response({"url": URL, "status": 600, "error": "timeout"})
+    assert ContentGate(1000).check(resp) is None
+
+
+def test_oversized_body():
+    body = b"<html><p>" + b"word " * 100 + b"</p></html>"
+    resp = _resp(body)
+    assert ContentGate(100).check(resp) is None
+    assert resp.truncated and resp.content == body[:100]
+    assert len(resp.body) == 100
+
+    resp = _resp(body)
+    assert ContentGate(100, oversize="skip").check(resp) == \
+        "body larger than 100 bytes"
+    assert not resp.truncated
+
+
+def test_content_length_counts():
+    # The declared length alone makes a page oversized.
+    resp = _resp(b"<html/>", dict(HTML, **{"Content-Length": "5000"}))
+    assert ContentGate(100, oversize="skip").check(resp) == \
+        "body larger than 100 bytes"
+    resp = _resp(b"<html/>", dict(HTML, **{"Content-Length": "5000"}))
+    assert ContentGate(100).check(resp) is None and not resp.truncated
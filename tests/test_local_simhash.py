@@ -0,0 +1,62 @@
+import random
+from hashlib import blake2b
+
+import pytest
+
+import local_simhash
+from local_simhash import simhash, hamming_distance, is_near_duplicate, _extract_features
+
+
+def _reference_simhash(tokens):
+    # Textbook simhash, one bit at a time.
+    n = local_simhash.N_GRAM_LENGTH
+    if len(tokens) < n:
+        features = [" ".join(tokens)] if tokens else []
+    else:
+        features = [" ".join(tokens[i:i + n]) for i in range(len(tokens) - n + 1)]
+    weights = dict()
+    for feature in features:
+        weights[feature] = weights.get(feature, 0) + 1
+    v = [0] * 64
+    for feature, weight in weights.items():
+        value = int.from_bytes(blake2b(feature.encode(), digest_size=8).digest(), "big")
+        for bit in range(64):
+            v[bit] += weight if value >> bit & 1 else -weight
+    return sum(1 << bit for bit in range(64) if v[bit] > 0)
+
+
+def _document(rng, length):
+    return [f"w{rng.randrange(50)}" for _ in range(length)]
+
+
+@pytest.mark.parametrize("length", [0, 1, 2, 3, 4, 40, 1000])
+def test_matches_the_reference(length):
+    tokens = _document(random.Random(length), length)
+    assert simhash(tokens) == _reference_simhash(tokens)
+
+
+def test_numpy_and_python_paths_agree(monkeypatch):
+    pytest.importorskip("numpy")
+    tokens = _document(random.Random(1), 2000)
+    with_numpy = simhash(tokens)
+    monkeypatch.setattr(local_simhash, "np", None)
+    assert simhash(tokens) == with_numpy
+
+
+def test_features():
+    assert _extract_features([]) == []
+    assert _extract_features(["a", "b"]) == ["a b"]
+    # The last n-gram counts: 3 tokens are one feature, 4 tokens two.
+    assert _extract_features(["a", "b", "c"]) == ["a b c"]
+    assert _extract_features(["a", "b", "c", "d"]) == ["a b c", "b c d"]
+
+
+def test_near_duplicates():
+    rng = random.Random(2)
+    page = _document(rng, 2000)
+    edited = list(page)
+    edited[1000] = "changed"
+    other = _document(rng, 2000)
+    assert hamming_distance(simhash(page), simhash(page)) == 0
+    assert is_near_duplicate(simhash(page), simhash(edited), 3)
+    assert not is_near_duplicate(simhash(page), simhash(other), 3)
@@ -0,0 +1,162 @@
+import glob
+import json
+import logging
+import multiprocessing
+import threading
+from queue import Queue
+from types import SimpleNamespace
+
+import pytest
+
+from crawler.partition import partition_config
+from utils.logs import log_hub, _LogFile, _NonBlockingQueueHandler
+from utils.metrics import metrics
+
+
+LINES = 400
+
+
+def _config(**overrides):
+    config = SimpleNamespace(
+        log_mode="queue", log_format="text", log_max_bytes=4096,
+        log_backups=100, log_batch=64, log_queue_size=100000,
+        log_partition=None)
+    config.__dict__.update(overrides)
+    return config
+
+
+def _log(partition):
+    log_hub.configure(_config(log_partition=partition))
+    logger = log_hub.get_logger(f"Worker-{partition}", "Worker")
+    for i in range(LINES):
+        logger.info(f"partition {partition} line {i}")
+    log_hub.stop()
+
+
+def _lines(pattern):
+    lines = list()
+    for path in glob.glob(pattern):
+        with open(path) as f:
+            lines.extend(line.rsplit(" - ", 1)[1].strip() for line in f)
+    return lines
+
+
+def test_partitions_write_their_own_rotated_files(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    context = multiprocessing.get_context("spawn")
+    processes = [context.Process(target=_log, args=(partition,))
+                 for partition in range(2)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+        assert process.exitcode == 0
+    for partition in range(2):
+        # Every record once, in its process's files only, across rotations.
+        assert sorted(_lines(f"Logs/Worker.{partition}.log*")) == sorted(
+            f"partition {partition} line {i}" for i in range(LINES))
+        assert glob.glob(f"Logs/Worker.{partition}.log.1")
+    assert not glob.glob("Logs/Worker.log*")
+
+
+def test_partition_config_sets_the_log_partition():
+    config = SimpleNamespace(
+        save_file="frontier.db", queue_dir="frontier.queue",
+        checkpoint_file="frontier.snapshot", revisit_file="revisits.db",
+        simhash_file="simhash.idx", stats_page_log="pages.log",
+        stats_snapshot="stats.json", metrics_file="metrics.json",
+        metrics_port=0, results_file="results.txt", log_partition=None)
+    assert partition_config(config, 3).log_partition == 3
+    assert config.log_partition is None
+
+
+def test_configure_again_in_another_directory(tmp_path, monkeypatch):
+    # As a second crawl started in another directory would.
+    for directory in ("first", "second"):
+        (tmp_path / directory).mkdir()
+        monkeypatch.chdir(tmp_path / directory)
+        log_hub.configure(_config())
+        log_hub.get_logger("Moved").info(f"logged in {directory}")
+        log_hub.flush()
+    log_hub.stop()
+    for directory in ("first", "second"):
+        assert _lines(str(tmp_path / directory / "Logs" / "Moved.log")) == [
+            f"logged in {directory}"]
+
+
+@pytest.mark.parametrize("mode", ["queue", "sync"])
+def test_loggers_share_files_by_name(tmp_path, monkeypatch, mode):
+    monkeypatch.chdir(tmp_path)
+    log_hub.configure(_config(log_mode=mode, log_max_bytes=0))
+    loggers = [log_hub.get_logger(f"Shared-{i}", "Shared") for i in range(3)]
+    threads = [threading.Thread(target=lambda logger=logger: [
+        logger.info(f"{logger.name} line {i}") for i in range(200)])
+        for logger in loggers]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    log_hub.get_logger("Own").info("alone")
+    # Asked for again, a logger keeps the handlers it has.
+    assert log_hub.get_logger("Shared-0").handlers == loggers[0].handlers
+    log_hub.flush()
+    assert sorted(_lines("Logs/Shared.log")) == sorted(
+        f"Shared-{n} line {i}" for n in range(3) for i in range(200))
+    assert _lines("Logs/Own.log") == ["alone"]
+    log_hub.stop()
+
+
+def test_json_format(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    log_hub.configure(_config(log_format="json"))
+    logger = log_hub.get_logger("Json")
+    logger.info("caf\u00e9")
+    try:
+        1 / 0
+    except ZeroDivisionError:
+        logger.exception("failed")
+    log_hub.stop()
+    with open("Logs/Json.log", encoding="utf-8") as f:
+        records = [json.loads(line) for line in f]
+    assert [(record["logger"], record["level"]) for record in records] == [
+        ("Json", "INFO"), ("Json", "ERROR")]
+    assert records[0]["message"] == "caf\u00e9"
+    assert records[1]["message"].startswith("failed\nTraceback")
+    assert "ZeroDivisionError" in records[1]["message"]
+
+
+def test_unknown_mode():
+    with pytest.raises(ValueError):
+        log_hub.configure(_config(log_mode="async"))
+    log_hub.configure(_config())
+    log_hub.stop()
+
+
+def test_log_file_rotation(tmp_path):
+    path = str(tmp_path / "Rotated.log")
+    log_file = _LogFile(path, 100, 2)
+    for i in range(10):
+        log_file.write([f"{i} " + "x" * 40 + "\n"])
+    log_file.close()
+    # Two lines a file, the oldest ones dropped past two backups.
+    assert sorted(glob.glob(f"{path}*")) == [path, f"{path}.1", f"{path}.2"]
+    for suffix, first in (("", 8), (".1", 6), (".2", 4)):
+        with open(f"{path}{suffix}") as f:
+            assert [line.split()[0] for line in f] == [str(first), str(first + 1)]
+    # Without backups the file starts over.
+    log_file = _LogFile(str(tmp_path / "Truncated.log"), 100, 0)
+    for i in range(3):
+        log_file.write([f"{i} " + "x" * 40 + "\n"])
+    log_file.close()
+    with open(tmp_path / "Truncated.log") as f:
+        assert [line.split()[0] for line in f] == ["2"]
+
+
+def test_full_queue_drops_records():
+    handler = _NonBlockingQueueHandler(Queue(1))
+    record = logging.LogRecord("Full", logging.INFO, __file__, 0, "line", None, None)
+    dropped = metrics.snapshot()["counters"].get("logs.dropped", 0)
+    for _ in range(3):
+        handler.emit(record)
+    assert handler.queue.qsize() == 1
+    assert metrics.snapshot()["counters"]["logs.dropped"] == dropped + 2
@@ -0,0 +1,132 @@
+import json
+import random
+import threading
+import urllib.error
+import urllib.request
+from types import SimpleNamespace
+
+import pytest
+
+from utils.metrics import BUCKETS, Histogram, Metrics
+
+
+def test_histogram_percentiles():
+    rng = random.Random(0)
+    values = sorted(rng.lognormvariate(-6, 2) for _ in range(10000))
+    histogram = Histogram()
+    for value in values:
+        histogram.observe(value)
+    assert histogram.count == len(values)
+    assert histogram.max == values[-1]
+    assert histogram.total == pytest.approx(sum(values))
+    for fraction in (0.5, 0.9, 0.99):
+        true = values[int(fraction * len(values)) - 1]
+        # A bucket's upper bound: never below the true value, at most 41%
+        # above it.
+        assert true <= histogram.percentile(fraction) <= true * 2 ** 0.5
+    assert histogram.percentile(1) == values[-1]
+    assert Histogram().summary() == {"count": 0, "total": 0.0, "mean": 0.0,
+                                     "p50": 0.0, "p90": 0.0, "p99": 0.0,
+                                     "max": 0.0}
+
+
+def test_histogram_past_the_last_bucket():
+    histogram = Histogram()
+    histogram.observe(BUCKETS[-1] * 3)
+    histogram.observe(0)
+    assert histogram.percentile(0.5) == BUCKETS[0]
+    assert histogram.percentile(0.99) == BUCKETS[-1] * 3
+
+
+def test_histogram_state_and_merge():
+    first, second = Histogram(), Histogram()
+    for seconds in (0.001, 0.002, 0.5):
+        first.observe(seconds)
+    second.observe(3.0)
+    # The state goes through json (and pickle) between processes.
+    loaded = Histogram.from_state(json.loads(json.dumps(first.state())))
+    assert loaded.summary() == first.summary()
+    loaded.merge(second)
+    assert (loaded.count, loaded.max) == (4, 3.0)
+    assert loaded.total == pytest.approx(3.503)
+
+
+def test_threads_record_into_their_own_shards():
+    metrics = Metrics()
+
+    def work():
+        for _ in range(1000):
+            with metrics.timer("parse"):
+                pass
+            metrics.count("dedup.content.hit")
+        metrics.count("dedup.content.miss", 500)
+    threads = [threading.Thread(target=work) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(metrics.shards) == 8
+    snapshot = metrics.snapshot()
+    assert snapshot["stages"]["parse"]["count"] == 8000
+    assert snapshot["counters"] == {"dedup.content.hit": 8000,
+                                    "dedup.content.miss": 4000}
+    assert snapshot["rates"] == {"dedup.content": pytest.approx(2 / 3)}
+
+
+def test_gauges():
+    metrics = Metrics()
+    sizes = [3]
+    metrics.gauge("frontier.queued", lambda: sizes[0])
+    metrics.gauge("broken", lambda: 1 / 0)
+    assert metrics.snapshot()["gauges"]["frontier.queued"] == 3
+    sizes[0] = 5
+    gauges = metrics.snapshot()["gauges"]
+    assert gauges["frontier.queued"] == 5
+    assert "ZeroDivisionError" in gauges["broken"]
+
+
+def test_drain_and_absorb():
+    # What a pipeline process recorded is added to the crawler's metrics.
+    worker, crawler = Metrics(), Metrics()
+    worker.observe("parse", 0.01)
+    worker.count("pages.empty", 2)
+    crawler.observe("parse", 0.03)
+    crawler.absorb(worker.drain())
+    assert worker.drain() == ({}, {})
+    worker.count("pages.empty")
+    crawler.absorb(worker.drain())
+    snapshot = crawler.snapshot()
+    assert snapshot["stages"]["parse"]["count"] == 2
+    assert snapshot["stages"]["parse"]["max"] == 0.03
+    assert snapshot["counters"] == {"pages.empty": 3}
+
+
+def test_configure_resets(tmp_path):
+    metrics = Metrics()
+    metrics.count("pages.empty")
+    metrics.gauge("frontier.queued", lambda: 1)
+    metrics.configure(SimpleNamespace(
+        metrics_file=str(tmp_path / "metrics.json"), metrics_port=0))
+    snapshot = metrics.snapshot()
+    assert (snapshot["counters"], snapshot["gauges"]) == ({}, {})
+    metrics.count("pages.empty")
+    metrics.write()
+    with open(tmp_path / "metrics.json") as f:
+        assert json.load(f)["counters"] == {"pages.empty": 1}
+    assert not (tmp_path / "metrics.json.tmp").exists()
+
+
+def test_endpoint():
+    metrics = Metrics()
+    metrics.count("robots.hit")
+    host, port = metrics.serve(0)
+    try:
+        with urllib.request.urlopen(f"http://{host}:{port}/metrics") as resp:
+            assert resp.headers["Content-Type"] == "application/json"
+            assert json.load(resp)["counters"] == {"robots.hit": 1}
+        with pytest.raises(urllib.error.HTTPError) as error:
+            urllib.request.urlopen(f"http://{host}:{port}/other")
+        assert error.value.code == 404
+    finally:
+        metrics.close()
+    assert metrics.server is None
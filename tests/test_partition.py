@@ -0,0 +1,118 @@
+import os
+import time
+import queue
+import multiprocessing
+from configparser import ConfigParser
+
+import pytest
+
+import crawler.frontier
+from crawler.partition import (
+    HashRing, Coordination, PartitionedFrontier, partition_path)
+from utils.config import Config
+from utils.traps import TrapDetector
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HOSTS = [f"host{i}.ics.uci.edu" for i in range(4000)]
+
+
+def test_partition_path():
+    assert partition_path("frontier.db", 3) == "frontier.3.db"
+    assert partition_path("frontier.queue", 0) == "frontier.0.queue"
+    assert partition_path("Logs/stats", 1) == "Logs/stats.1"
+
+
+def test_hosts_spread_evenly():
+    ring = HashRing(4)
+    counts = [0] * 4
+    for host in HOSTS:
+        counts[ring.owner(host)] += 1
+    assert min(counts) > 0.6 * len(HOSTS) / 4
+    assert ring.owner("WWW.ICS.UCI.EDU") == ring.owner("www.ics.uci.edu")
+
+
+def test_adding_a_partition_only_moves_hosts_to_it():
+    before, after = HashRing(4), HashRing(5)
+    moved = [host for host in HOSTS if before.owner(host) != after.owner(host)]
+    assert all(after.owner(host) == 4 for host in moved)
+    assert len(moved) < 0.35 * len(HOSTS)
+
+
+def test_crawl_ends_when_every_partition_is_idle():
+    coordination = Coordination(multiprocessing.get_context("spawn"), 2)
+    assert not coordination.idle(0)
+    coordination.sent()
+    # A url on its way to partition 1 keeps the crawl going.
+    assert not coordination.idle(1)
+    coordination.received(1)
+    assert not coordination.idle(0)
+    assert coordination.idle(1)
+    coordination.stopped.set()
+    coordination.received(0)
+    assert coordination.idle(0)
+
+
+@pytest.fixture
+def frontiers(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(crawler.frontier, "traps", TrapDetector())
+    cparser = ConfigParser()
+    cparser.read(os.path.join(ROOT, "config.ini"))
+    config = Config(cparser)
+    config.time_delay = 0
+    ring = HashRing(2)
+    queues = [queue.Queue(), queue.Queue()]
+    coordination = Coordination(multiprocessing.get_context("spawn"), 2)
+    made = list()
+    for partition in range(2):
+        config.save_file = str(tmp_path / f"frontier.{partition}.db")
+        config.queue_dir = str(tmp_path / f"frontier.{partition}.queue")
+        config.checkpoint_file = str(tmp_path / f"frontier.{partition}.snapshot")
+        config.seed_urls = [f"https://{host}/" for host in HOSTS[:20]
+                            if ring.owner(host) == partition]
+        made.append(PartitionedFrontier(
+            config, True, partition, ring, queues, coordination))
+    yield made
+    for frontier in made:
+        frontier.close()
+
+
+def _drain(frontier):
+    urls = list()
+    while True:
+        url, wait = frontier.next_tbd_url()
+        if url is None:
+            return urls, wait
+        urls.append(url)
+
+
+def test_urls_are_forwarded_to_their_owner(frontiers):
+    first, second = frontiers
+    seeds, _ = _drain(first)
+    parent = seeds[0]
+    links = [f"https://{host}/page" for host in HOSTS[20:40]]
+    for url in links + links:
+        first.add_url(url, parent)
+    first.mark_url_complete(parent)
+    for url in seeds[1:]:
+        first.mark_url_complete(url)
+
+    mine, _ = _drain(first)
+    # The second partition's receiver thread queues what it was sent.
+    forwarded = list()
+    deadline = time.monotonic() + 10
+    while len(mine) + len(forwarded) < len(links) and time.monotonic() < deadline:
+        urls, _ = _drain(second)
+        forwarded.extend(url for url in urls if url.endswith("/page"))
+        for url in urls:
+            second.mark_url_complete(url)
+    assert sorted(mine + forwarded) == sorted(links)
+    assert all(first.ring.owner(url.split("/")[2]) == 0 for url in mine)
+    assert all(first.ring.owner(url.split("/")[2]) == 1 for url in forwarded)
+    # Every url crossed once, however often it was linked.
+    assert first.coordination.outstanding.value == 0
+    for url in mine:
+        first.mark_url_complete(url)
+    assert first.next_tbd_url() == (None, first.POLL_INTERVAL)
+    assert second.next_tbd_url() == (None, None)
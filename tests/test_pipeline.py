@@ -0,0 +1,77 @@
+import threading
+
+import pytest
+
+import scraper
+from crawler.pipeline import PagePipeline
+from simhash_index import SimhashIndex
+from utils.cache_emulator import SyntheticSite, cache_response
+from utils.response import Response, decode_cache_response
+from utils.revisit import RevisitHistory
+from utils.robots import RobotsCache
+from utils.stats import CrawlStats
+from utils.traps import TrapDetector
+
+
+SITE = SyntheticSite(pages=12, duplicate_every=0, large_every=0, trap_every=0)
+
+
+def _resp(i):
+    url = SITE.url(i)
+    return url, Response(decode_cache_response(cache_response(url, *SITE.get(url))))
+
+
+@pytest.fixture
+def crawl_state(monkeypatch):
+    robots = RobotsCache()
+    for host in SITE.HOSTS:
+        robots.add(f"https://{host}/", SITE.ROBOTS_TXT)
+    monkeypatch.setattr(scraper, "robots_cache", robots)
+    monkeypatch.setattr(scraper, "crawl_stats", CrawlStats())
+    monkeypatch.setattr(scraper, "near_duplicates", SimhashIndex())
+    monkeypatch.setattr(scraper, "traps", TrapDetector())
+    monkeypatch.setattr(scraper, "revisits", RevisitHistory())
+
+
+@pytest.mark.parametrize("queue_size, backpressure", [(4, "block"), (1, "inline")])
+def test_pages_parsed_in_the_pool(crawl_state, queue_size, backpressure):
+    expected = dict()
+    for i in range(SITE.pages):
+        url, resp = _resp(i)
+        expected[url] = scraper.process_page(url, resp.body).links
+
+    parsed = dict()
+    finished = threading.Event()
+
+    def done(url, links):
+        parsed[url] = links
+        if len(parsed) == SITE.pages:
+            finished.set()
+    pipeline = PagePipeline(1, queue_size, backpressure)
+    try:
+        for i in range(SITE.pages):
+            assert pipeline.submit(*_resp(i), done)
+        assert finished.wait(60)
+    finally:
+        pipeline.close()
+    assert parsed == expected
+    assert scraper.crawl_stats.merge() == SITE.pages
+    assert len(scraper.near_duplicates) == SITE.pages
+
+
+def test_pages_not_scraped(crawl_state):
+    pipeline = PagePipeline(1, 1)
+    try:
+        url = "https://www.ics.uci.edu/missing"
+        resp = Response(decode_cache_response(
+            cache_response(url, *SITE.get(url))))
+        assert not pipeline.submit(url, resp, None)
+        url = "https://www.ics.uci.edu/private/page"
+        assert not pipeline.submit(url, _resp(0)[1], None)
+    finally:
+        pipeline.close()
+
+
+def test_unknown_backpressure():
+    with pytest.raises(ValueError):
+        PagePipeline(1, 1, "drop")
@@ -0,0 +1,127 @@
+import os
+from types import SimpleNamespace
+
+from report import StreamingReport, top_words
+from utils.stats import CrawlStats, PAGE_RECORD
+
+
+DOMAINS = ["ics.uci.edu", "uci.edu"]
+
+
+def _stats(tmp_path, name="stats"):
+    stats = CrawlStats(top_words=3)
+    stats.configure(SimpleNamespace(
+        stats_top_words=3, stats_longest_pages=3,
+        stats_page_log=str(tmp_path / f"{name}.pages"),
+        stats_snapshot=str(tmp_path / f"{name}.json")), restart=True)
+    return stats
+
+
+def _log(stats, pages):
+    for url, word_count in pages:
+        stats.record_page(url, word_count, {"word": 1})
+    stats.flush()
+
+
+def test_counts_each_page_once(tmp_path):
+    stats = _stats(tmp_path)
+    _log(stats, [("https://www.ics.uci.edu/a", 5),
+                 ("https://vision.ics.uci.edu/b", 50),
+                 ("https://www.uci.edu/c", 7),
+                 ("https://example.com/d", 9)])
+    report = StreamingReport(DOMAINS)
+    assert report.update(stats.page_log_path) == 4
+    # Downloaded again after a crash, and the same page over http.
+    _log(stats, [("https://www.ics.uci.edu/a", 5),
+                 ("http://www.ics.uci.edu/a", 5)])
+    assert report.update(stats.page_log_path) == 2
+    assert report.update(stats.page_log_path) == 0
+    assert (report.pages, report.repeated) == (4, 2)
+    assert report.longest == ["https://vision.ics.uci.edu/b", 50]
+    # Each host counts for the longest domain it is under.
+    assert report.subdomains == {
+        "ics.uci.edu": {"http://ics.uci.edu": 1, "http://vision.ics.uci.edu": 1},
+        "uci.edu": {"http://uci.edu": 1}}
+
+
+def test_torn_record_is_read_again(tmp_path):
+    stats = _stats(tmp_path)
+    _log(stats, [("https://www.ics.uci.edu/a", 5)])
+    url = "https://www.ics.uci.edu/b".encode()
+    record = PAGE_RECORD.pack(8, len(url)) + url
+    with open(stats.page_log_path, "ab") as f:
+        f.write(record[:10])
+    report = StreamingReport(DOMAINS)
+    assert report.update(stats.page_log_path) == 1
+    with open(stats.page_log_path, "ab") as f:
+        f.write(record[10:])
+    assert report.update(stats.page_log_path) == 1
+    assert report.pages == 2
+
+
+def test_restarted_crawl(tmp_path):
+    stats = _stats(tmp_path)
+    _log(stats, [("https://www.ics.uci.edu/a", 5), ("https://www.ics.uci.edu/b", 5)])
+    report = StreamingReport(DOMAINS)
+    report.update(stats.page_log_path)
+    stats = _stats(tmp_path)
+    _log(stats, [("https://www.ics.uci.edu/c", 5)])
+    assert report.update(stats.page_log_path) is None
+    assert report.update(str(tmp_path / "missing.pages")) == 0
+
+
+def test_save_and_load(tmp_path):
+    stats = _stats(tmp_path)
+    _log(stats, [("https://www.ics.uci.edu/a", 5)])
+    report = StreamingReport(DOMAINS)
+    report.update(stats.page_log_path)
+    path = str(tmp_path / "report.state")
+    report.save(path)
+
+    loaded = StreamingReport.load(path, reversed(DOMAINS))
+    assert vars(loaded).keys() == vars(report).keys()
+    for name in ("domains", "offsets", "pages", "longest", "subdomains"):
+        assert getattr(loaded, name) == getattr(report, name)
+    _log(stats, [("https://www.ics.uci.edu/a", 5), ("https://www.ics.uci.edu/b", 6)])
+    assert loaded.update(stats.page_log_path) == 2
+    assert (loaded.pages, loaded.repeated) == (2, 1)
+
+    # Made for other domains, or not a report state: a new report.
+    assert StreamingReport.load(path, ["stat.uci.edu"]).pages == 0
+    with open(path, "wb") as f:
+        f.write(b"garbage")
+    assert StreamingReport.load(path, DOMAINS).pages == 0
+    assert StreamingReport.load(str(tmp_path / "none"), DOMAINS).pages == 0
+
+
+def test_write(tmp_path):
+    stats = _stats(tmp_path)
+    _log(stats, [("https://www.ics.uci.edu/a", 5)])
+    other = _stats(tmp_path, "stats.1")
+    _log(other, [("https://www.uci.edu/b", 3)])
+    report = StreamingReport(DOMAINS)
+    report.update(stats.page_log_path)
+    report.update(other.page_log_path)
+    text = report.write(
+        str(tmp_path / "report.txt"),
+        top_words([stats.snapshot_path, other.snapshot_path,
+                   str(tmp_path / "missing.json")]))
+    assert text == (
+        "TOP 50 COMMON WORDS:\n"
+        "\tword: 2\n"
+        "\n"
+        "Number of unique pages: 2\n"
+        "\n"
+        "The longest page in terms of number of words is "
+        "https://www.ics.uci.edu/a with 5 words.\n"
+        "\n"
+        "The number of ics.uci.edu subdomains is 1.\n"
+        "ics.uci.edu subdomains:\n"
+        "\thttp://ics.uci.edu, 1\n"
+        "\n"
+        "The number of uci.edu subdomains is 1.\n"
+        "uci.edu subdomains:\n"
+        "\thttp://uci.edu, 1\n")
+    with open(tmp_path / "report.txt") as f:
+        assert f.read() == text
+    assert not os.path.exists(tmp_path / "report.txt.tmp")
@@ -0,0 +1,84 @@
+import os
+import pickle
+
+import cbor
+import pytest
+import requests
+from requests.structures import CaseInsensitiveDict
+
+from utils.response import (
+    Response, decode_cache_response, load_raw_response)
+
+
+def _response(body):
+    raw = requests.models.Response()
+    raw.url = "https://www.ics.uci.edu/page.html"
+    raw.status_code = 200
+    raw.headers = CaseInsensitiveDict(
+        {"Content-Type": "text/html", "ETag": "abc"})
+    raw._content = body
+    raw.encoding = "utf-8"
+    return raw
+
+
+BODIES = [b"", b"<p>hi</p>", bytes(range(256)) * 300, b"\xff" * 3000000]
+
+
+@pytest.mark.parametrize("protocol", range(pickle.HIGHEST_PROTOCOL + 1))
+@pytest.mark.parametrize("body", BODIES, ids=lambda body: str(len(body)))
+def test_every_pickle_protocol(protocol, body):
+    raw = load_raw_response(pickle.dumps(_response(body), protocol=protocol))
+    assert bytes(raw.body) == body
+    assert raw.content == body
+    assert raw.status_code == 200
+    assert raw.url == "https://www.ics.uci.edu/page.html"
+    assert raw.headers["content-type"] == "text/html"
+    assert raw.headers.get("ETAG") == "abc"
+
+
+@pytest.mark.parametrize("protocol", [4, 5])
+def test_body_is_a_view_of_the_download(protocol):
+    pickled = pickle.dumps(_response(b"x" * 100000), protocol=protocol)
+    body = load_raw_response(pickled).body
+    assert isinstance(body, memoryview)
+    assert body.obj is pickled
+
+
+class _Malicious(object):
+    def __reduce__(self):
+        return (os.system, ("echo unsafe",))
+
+
+@pytest.mark.parametrize("protocol", range(pickle.HIGHEST_PROTOCOL + 1))
+def test_refuses_other_pickles(protocol):
+    with pytest.raises(pickle.UnpicklingError):
+        load_raw_response(pickle.dumps(_Malicious(), protocol=protocol))
+
+
+def test_decode_cache_response():
+    pickled = pickle.dumps(_response(b"<p>hi</p>"))
+    wire = cbor.dumps({"url": "u", "status": 200, "response": pickled})
+    resp_dict = decode_cache_response(wire)
+    assert resp_dict["url"] == "u" and resp_dict["status"] == 200
+    assert isinstance(resp_dict["response"], memoryview)
+    assert bytes(resp_dict["response"]) == pickled
+    # Anything but a flat map goes through cbor.loads.
+    assert decode_cache_response(cbor.dumps({"a": {"b": 1}})) == {"a": {"b": 1}}
+
+
+def test_response_is_lazy_and_truncates():
+    wire = cbor.dumps({"url": "u", "status": 200, "response": pickle.dumps(
+        _response(b"0123456789"))})
+    resp = Response(decode_cache_response(wire))
+    assert resp._raw_response is None
+    assert resp.headers["Content-Type"] == "text/html"
+    assert resp.content == b"0123456789"
+    resp.truncate(4)
+    assert resp.truncated and bytes(resp.body) == b"0123" and resp.content == b"0123"
+
+
+def test_undecodable_response_has_no_body():
+    resp = Response({"url": "u", "status": 200,
+                     "response": pickle.dumps(_Malicious())})
+    assert resp.raw_response is None and resp.body is None
+    assert resp.headers == {}
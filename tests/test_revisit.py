@@ -0,0 +1,151 @@
+import time
+from types import SimpleNamespace
+
+import pytest
+
+import scraper
+from utils import get_urlfingerprint
+from utils.revisit import RevisitHistory
+from utils.stats import CrawlStats, read_page_log
+from utils.traps import USEFUL
+
+
+URL = "https://www.ics.uci.edu/page.html"
+
+
+def _resp(body, etag="v1"):
+    return SimpleNamespace(
+        status=200, body=memoryview(body), headers={"ETag": etag})
+
+
+@pytest.fixture
+def config(tmp_path):
+    return SimpleNamespace(
+        incremental=True, revisit_file=str(tmp_path / "revisits.db"),
+        revisit_min=0, revisit_max=3600,
+        stats_top_words=50, stats_longest_pages=50,
+        stats_page_log=str(tmp_path / "pages.log"),
+        stats_snapshot=str(tmp_path / "stats.json"))
+
+
+@pytest.fixture
+def crawl(config, monkeypatch):
+    revisits = RevisitHistory()
+    revisits.configure(config)
+    monkeypatch.setattr(scraper, "revisits", revisits)
+
+    def start(restart):
+        stats = CrawlStats()
+        stats.configure(config, restart=restart)
+        monkeypatch.setattr(scraper, "crawl_stats", stats)
+        return stats
+    return revisits, start
+
+
+def _download(revisits, stats, body):
+    # What scraper.scraper does with a page that downloaded fine.
+    if scraper.unchanged_page(URL, _resp(body)):
+        return
+    stats.record_page(URL, 3, {"a": 3})
+    revisits.record_page(URL, USEFUL, 3, 1)
+
+
+def _logged(config):
+    return [url for url, _ in read_page_log(config.stats_page_log)]
+
+
+def test_unchanged_page_is_counted_once_per_crawl(config, crawl):
+    revisits, start = crawl
+    stats = start(restart=True)
+    _download(revisits, stats, b"<p>same</p>")
+    time.sleep(0.01)
+    # Downloaded again in the same crawl, e.g. after a resume.
+    _download(revisits, stats, b"<p>same</p>")
+    stats.flush()
+    assert stats.page_count == 1 and _logged(config) == [URL]
+
+    time.sleep(0.01)
+    stats = start(restart=True)
+    _download(revisits, stats, b"<p>same</p>")
+    stats.flush()
+    assert stats.page_count == 1 and _logged(config) == [URL]
+
+
+def test_resumed_crawl_keeps_its_start(config, crawl):
+    revisits, start = crawl
+    stats = start(restart=True)
+    _download(revisits, stats, b"<p>same</p>")
+    stats.flush()
+    time.sleep(0.01)
+    stats = start(restart=False)
+    _download(revisits, stats, b"<p>same</p>")
+    stats.flush()
+    assert stats.page_count == 1 and _logged(config) == [URL]
+
+
+def test_changed_body_is_parsed_even_with_the_same_validators(crawl):
+    revisits, start = crawl
+    start(restart=True)
+    revisits.unchanged(URL, _resp(b"<p>one</p>"))
+    revisits.record_page(URL, USEFUL, 3, 1)
+    assert revisits.unchanged(URL, _resp(b"<p>two</p>")) is None
+
+
+def test_disabled_history_admits_everything(config):
+    config.incremental = False
+    revisits = RevisitHistory()
+    revisits.configure(config)
+    assert revisits.unchanged(URL, _resp(b"<p>same</p>")) is None
+    assert revisits.due(URL) and list(revisits.due_urls()) == []
+
+
+def test_revisit_schedule(config, monkeypatch):
+    config.revisit_min, config.revisit_max = 10, 1000
+    revisits = RevisitHistory()
+    revisits.configure(config)
+    now = [1000.0]
+    monkeypatch.setattr(time, "time", lambda: now[0])
+
+    def download(body, url=URL):
+        if revisits.unchanged(url, _resp(body)) is None:
+            revisits.record_page(url, USEFUL, 3, 1)
+        return revisits.next_visits[get_urlfingerprint(url)] - now[0]
+
+    # First download: due again after the shortest interval.
+    assert download(b"a") == 10
+    assert not revisits.due(URL)
+    now[0] += 10
+    assert revisits.due(URL)
+    # Never seen changing: twice as long as it has been stable.
+    assert download(b"a") == 20
+    now[0] += 20
+    assert download(b"a") == 60
+    # Changed in 1 of 3 checks, 10 seconds apart on average:
+    # 1 / (-ln(2.5 / 3.5) / 10) = 29.7 seconds.
+    assert download(b"b") == pytest.approx(29.72, abs=0.01)
+    for i in range(20):
+        now[0] += 1
+        download(bytes([i]))
+    # Changing on nearly every check: the shortest interval again.
+    assert download(b"c") == 10
+    # Stable for long: the longest interval.
+    stable = "https://www.ics.uci.edu/stable.html"
+    download(b"s", stable)
+    now[0] += 5000
+    assert download(b"s", stable) == 1000
+
+
+def test_schedule_survives_a_restart(config, monkeypatch):
+    config.revisit_min = 3600
+    revisits = RevisitHistory()
+    revisits.configure(config)
+    revisits.unchanged(URL, _resp(b"a"))
+    revisits.record_page(URL, USEFUL, 3, 1)
+    revisits.flush()
+
+    reloaded = RevisitHistory()
+    reloaded.configure(config)
+    assert not reloaded.due(URL) and list(reloaded.due_urls()) == []
+    later = time.time() + 7200
+    monkeypatch.setattr(time, "time", lambda: later)
+    assert reloaded.due(URL) and list(reloaded.due_urls()) == [URL]
@@ -0,0 +1,116 @@
+import time
+import socket
+import threading
+import urllib.robotparser
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from utils.robots import RobotsCache
+
+
+ROBOTS = "User-agent: *\nDisallow: /private\nCrawl-delay: 2\n"
+
+
+@pytest.fixture
+def fetches(monkeypatch):
+    # Hosts fetched, answered with ROBOTS without any network access.
+    fetched = list()
+
+    def fetch(self, key):
+        fetched.append(key)
+        time.sleep(0.05)
+        parser = urllib.robotparser.RobotFileParser(f"{key}/robots.txt")
+        parser.parse(ROBOTS.splitlines())
+        return parser, self.ttl
+    monkeypatch.setattr(RobotsCache, "_fetch", fetch)
+    return fetched
+
+
+def test_robots_txt_is_fetched_once_per_host(fetches):
+    cache = RobotsCache()
+    assert cache.can_fetch("https://www.ics.uci.edu/a")
+    assert not cache.can_fetch("https://www.ics.uci.edu/private/b")
+    assert cache.crawl_delay("https://www.ics.uci.edu/c") == 2
+    assert cache.can_fetch("http://www.ics.uci.edu/a")
+    assert fetches == ["https://www.ics.uci.edu", "http://www.ics.uci.edu"]
+
+
+def test_concurrent_lookups_share_one_fetch(fetches):
+    cache = RobotsCache()
+    threads = [threading.Thread(target=cache.get, args=(f"https://www.ics.uci.edu/{i}",))
+               for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert fetches == ["https://www.ics.uci.edu"]
+
+
+def test_entries_expire(fetches):
+    cache = RobotsCache(ttl=0.1)
+    cache.get("https://www.ics.uci.edu/")
+    cache.get("https://www.ics.uci.edu/")
+    time.sleep(0.15)
+    cache.get("https://www.ics.uci.edu/")
+    assert len(fetches) == 2
+
+
+def test_least_recently_used_host_is_evicted(fetches):
+    cache = RobotsCache(max_size=2)
+    for host in ("a", "b", "a", "c", "a"):
+        cache.get(f"https://{host}.ics.uci.edu/")
+    assert list(cache.entries) == ["https://c.ics.uci.edu", "https://a.ics.uci.edu"]
+    assert fetches == [f"https://{host}.ics.uci.edu" for host in "abc"]
+
+
+def test_added_robots_txt_is_not_fetched(fetches):
+    cache = RobotsCache()
+    cache.add("https://www.ics.uci.edu/", "User-agent: *\nRequest-rate: 1/4\n")
+    assert cache.crawl_delay("https://www.ics.uci.edu/page") == 4
+    assert fetches == []
+
+
+class _Handler(BaseHTTPRequestHandler):
+    # /robots.txt answered with the status of the host name's first label
+    # (http://404.localhost:port/robots.txt -> 404).
+    def do_GET(self):
+        label = self.headers["Host"].split(".")[0]
+        status = int(label) if label.isdigit() else 200
+        self.send_response(status)
+        self.end_headers()
+        if status == 200:
+            self.wfile.write(ROBOTS.encode())
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server(monkeypatch):
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    thread = threading.Thread(
+        target=httpd.serve_forever, args=(0.05,), daemon=True)
+    thread.start()
+    # *.localhost names resolve to this server, whatever the resolver says.
+    getaddrinfo = socket.getaddrinfo
+
+    def resolve(host, *args, **kwargs):
+        if host.endswith("localhost"):
+            host = "127.0.0.1"
+        return getaddrinfo(host, *args, **kwargs)
+    monkeypatch.setattr(socket, "getaddrinfo", resolve)
+    yield httpd.server_address[1]
+    httpd.shutdown()
+
+
+@pytest.mark.parametrize("status, allowed, ttl", [
+    (200, False, 3600), (404, True, 3600), (403, False, 3600),
+    (503, True, 300), (None, True, 300)])
+def test_fetch_status_handling(server, status, allowed, ttl):
+    cache = RobotsCache(ttl=3600, negative_ttl=300, timeout=2)
+    # None: nothing listens on the port.
+    port = server if status else 1
+    parser, cached_for = cache._fetch(f"http://{status}.localhost:{port}")
+    assert parser.can_fetch("*", "/private/page") == allowed
+    assert cached_for == ttl
@@ -0,0 +1,85 @@
+import os
+from configparser import ConfigParser
+
+import pytest
+
+import crawler.frontier
+from crawler.frontier import Frontier
+from crawler.scoring import make_scorer, path_depth
+from utils.config import Config
+from utils.traps import TrapDetector, USEFUL, DUPLICATE
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_make_scorer():
+    traps = TrapDetector()
+    scorer = make_scorer("depth:2, inlinks, yield:0", traps)
+    assert scorer.url_score("u", 3, 1) == 6
+    assert scorer.url_score("u", 3, 4) == 4     # 2 * 3 - log2(4)
+    assert scorer.host_score("www.ics.uci.edu") == 0
+    # Nothing configured: every url scores 0, first in first out.
+    assert make_scorer(" , ", traps).url_score("u", 9, 9) == 0
+    with pytest.raises(ValueError):
+        make_scorer("depth:1, pagerank:1", traps)
+
+
+def test_host_scores_follow_the_crawl():
+    traps = TrapDetector()
+    scorer = make_scorer("freshness:1, yield:4", traps)
+    assert scorer.host_score("www.ics.uci.edu") == 0
+    for i, outcome in enumerate([USEFUL, DUPLICATE, DUPLICATE, USEFUL]):
+        traps.record(f"https://www.ics.uci.edu/{i}", outcome)
+    # log2(1 + 4 pages) + 4 * (1 - 2 / 4 new)
+    assert scorer.host_score("www.ics.uci.edu") == pytest.approx(4.3219, abs=1e-4)
+
+
+def test_path_depth():
+    assert path_depth("https://www.ics.uci.edu") == 0
+    assert path_depth("https://www.ics.uci.edu/a//b/c.html?x=/y") == 3
+
+
+@pytest.fixture
+def frontier_config(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(crawler.frontier, "traps", TrapDetector())
+    cparser = ConfigParser()
+    cparser.read(os.path.join(ROOT, "config.ini"))
+    config = Config(cparser)
+    config.save_file = str(tmp_path / "frontier.db")
+    config.queue_dir = str(tmp_path / "frontier.queue")
+    config.checkpoint_file = str(tmp_path / "frontier.snapshot")
+    config.seed_urls = ["https://www.ics.uci.edu/"]
+    config.time_delay = 0
+    return config
+
+
+def _crawl_order(config, links, again):
+    # Order the frontier hands out the links of the seed, the first of
+    # them linking to again.
+    frontier = Frontier(config, restart=True)
+    seed = frontier.get_tbd_url()
+    for link in links:
+        frontier.add_url(link, seed)
+    frontier.mark_url_complete(seed)
+    order = [frontier.get_tbd_url()]
+    # Found again once queued in memory, it moves up.
+    frontier.add_url(again, order[0])
+    frontier.mark_url_complete(order[0])
+    while True:
+        url, _ = frontier.next_tbd_url()
+        if url is None:
+            return order
+        order.append(url)
+        frontier.mark_url_complete(url)
+
+
+def test_frontier_order(frontier_config):
+    host = "https://www.ics.uci.edu"
+    links = [f"{host}/a", f"{host}/b", f"{host}/c"]
+    frontier_config.priority = "inlinks:1"
+    assert _crawl_order(frontier_config, links, f"{host}/c") == [
+        f"{host}/a", f"{host}/c", f"{host}/b"]
+    frontier_config.priority = ""
+    assert _crawl_order(frontier_config, links, f"{host}/c") == links
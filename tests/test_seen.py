@@ -0,0 +1,57 @@
+from crawler.seen import BloomFilter, SeenFilter
+from utils import get_urlfingerprint
+
+
+def _fingerprints(prefix, n):
+    return [get_urlfingerprint(f"https://www.ics.uci.edu/{prefix}/{i}")
+            for i in range(n)]
+
+
+def _false_positive_rate(seen, probes):
+    return sum(fingerprint in seen for fingerprint in probes) / len(probes)
+
+
+def test_bloom_filter_false_positive_rate():
+    bloom = BloomFilter(20000, 0.01)
+    added = _fingerprints("added", 20000)
+    for fingerprint in added:
+        bloom.add(fingerprint)
+    assert all(fingerprint in bloom for fingerprint in added)
+    assert _false_positive_rate(bloom, _fingerprints("other", 20000)) < 0.015
+
+
+def test_seen_filter_keeps_its_rate_past_capacity():
+    seen = SeenFilter(5000, 0.01)
+    added = _fingerprints("added", 35000)
+    for fingerprint in added:
+        seen.add(fingerprint)
+    # 5000 + 10000 + 20000: three filters, none over its capacity.
+    assert [bloom.capacity for bloom in seen.filters] == [5000, 10000, 20000]
+    assert len(seen) == len(added)
+    assert all(fingerprint in seen for fingerprint in added)
+    assert _false_positive_rate(seen, _fingerprints("other", 20000)) < 0.015
+
+
+def test_negative_fingerprints():
+    # Fingerprints are signed 64-bit integers once stored in SQLite.
+    seen = SeenFilter(100, 0.01)
+    seen.add(-1)
+    seen.add(-(1 << 63))
+    assert -1 in seen and -(1 << 63) in seen
+    assert (1 << 64) - 1 in seen
+
+
+def test_round_trip():
+    seen = SeenFilter(1000, 0.01)
+    added = _fingerprints("added", 2500)
+    for fingerprint in added:
+        seen.add(fingerprint)
+    loaded = SeenFilter.from_bytes(seen.to_bytes())
+    assert loaded.error_rate == seen.error_rate
+    assert [bloom.bits for bloom in loaded.filters] == \
+        [bloom.bits for bloom in seen.filters]
+    assert len(loaded) == len(seen)
+    assert all(fingerprint in loaded for fingerprint in added)
+    # The last filter keeps filling up where it was.
+    loaded.add(get_urlfingerprint("https://www.ics.uci.edu/new"))
+    assert len(loaded.filters) == len(seen.filters)
@@ -0,0 +1,102 @@
+import os
+
+from crawler.segments import SegmentQueue, encode_block, decode_block, BLOCK_HEADER
+
+
+def _urls(prefix, n, score=0.5, depth=1):
+    return [(score, f"https://www.ics.uci.edu/{prefix}/{i}", depth)
+            for i in range(n)]
+
+
+def _push(queue, entries):
+    for entry in entries:
+        queue.push(*entry)
+
+
+def _segments(directory):
+    return sorted(name for name in os.listdir(directory) if name.endswith(".seg"))
+
+
+def test_block_round_trip():
+    entries = [(0.25, "https://www.ics.uci.edu/a/b", 3),
+               (1.5, "https://www.ics.uci.edu/a", 0),
+               (-2.0, "https://www.ics.uci.edu/é/ß", 200),
+               (0.0, "https://www.cs.uci.edu/", 1)]
+    block = encode_block(entries)
+    assert sorted(decode_block(block[BLOCK_HEADER.size:])) == sorted(entries)
+    # Shared prefixes are stored once.
+    assert len(block) < sum(len(url) for _, url, _ in entries)
+
+
+def test_lowest_band_first_in_order(tmp_path):
+    queue = SegmentQueue(str(tmp_path / "queue"), restart=True)
+    low, high = _urls("low", 5, score=0.5), _urls("high", 5, score=3.5)
+    _push(queue, high[:2] + low[:3])
+    queue.flush()
+    _push(queue, high[2:] + low[3:])
+    assert len(queue) == 10
+    assert queue.pop_best(7) == low + high[:2]
+    assert queue.pop_best(7) == high[2:]
+    assert len(queue) == 0 and not queue.bands
+
+
+def test_resume_from_the_checkpoint(tmp_path):
+    directory = str(tmp_path / "queue")
+    queue = SegmentQueue(directory, restart=True, segment_bytes=256)
+    entries = _urls("page", 40)
+    _push(queue, entries[:20])
+    taken = queue.pop_best(5)
+    queue.checkpoint(hot=taken[:2])
+    # Taken out or queued after the checkpoint: read again on resume.
+    queue.pop_best(5)
+    _push(queue, entries[20:])
+    queue.flush()
+
+    resumed = SegmentQueue(directory)
+    assert resumed.resumed
+    assert resumed.hot == taken[:2]
+    assert len(resumed) == 35
+    # Urls are sorted within a block, so compare what is left.
+    assert sorted(resumed.pop_best(100)) == sorted(set(entries) - set(taken))
+
+
+def test_read_segments_are_deleted_by_the_checkpoint(tmp_path):
+    directory = str(tmp_path / "queue")
+    queue = SegmentQueue(directory, restart=True, segment_bytes=1)
+    for entry in _urls("page", 6):
+        queue.push(*entry)
+        queue.flush()
+    assert len(_segments(directory)) == 6
+    queue.pop_best(4)
+    queue.checkpoint(hot=[])
+    # The fourth segment is only found read to its end by the next read.
+    assert _segments(directory) == ["00000003.seg", "00000004.seg", "00000005.seg"]
+    assert sorted(os.listdir(directory)) == sorted(
+        _segments(directory) + ["hot.1", "manifest.json"])
+
+
+def test_torn_block_is_dropped(tmp_path):
+    directory = str(tmp_path / "queue")
+    queue = SegmentQueue(directory, restart=True)
+    entries = _urls("page", 4)
+    _push(queue, entries)
+    queue.checkpoint(hot=[])
+    segment = os.path.join(directory, _segments(directory)[0])
+    whole = os.path.getsize(segment)
+    with open(segment, "ab") as f:
+        f.write(encode_block(_urls("torn", 3))[:-5])
+
+    resumed = SegmentQueue(directory)
+    assert os.path.getsize(segment) == whole
+    assert resumed.pop_best(10) == entries
+
+
+def test_no_manifest_clears_stale_segments(tmp_path):
+    directory = str(tmp_path / "queue")
+    queue = SegmentQueue(directory, restart=True)
+    _push(queue, _urls("page", 4))
+    queue.flush()
+    # Killed before its first checkpoint: the save file queues them again.
+    resumed = SegmentQueue(directory)
+    assert not resumed.resumed
+    assert len(resumed) == 0 and os.listdir(directory) == []
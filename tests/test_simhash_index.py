@@ -0,0 +1,91 @@
+import random
+from types import SimpleNamespace
+
+import pytest
+
+from simhash_index import SimhashIndex
+
+
+def _flip(fingerprint, bits, rng):
+    for bit in rng.sample(range(64), bits):
+        fingerprint ^= 1 << bit
+    return fingerprint
+
+
+@pytest.mark.parametrize("k, blocks", [(3, None), (3, 6), (1, 2), (0, None)])
+def test_matches_a_linear_scan(k, blocks):
+    rng = random.Random(k)
+    index = SimhashIndex(k, blocks)
+    stored = [rng.getrandbits(64) for _ in range(1000)]
+    for fingerprint in stored:
+        index.add(fingerprint)
+    queries = [_flip(rng.choice(stored), rng.randrange(k + 3), rng)
+               for _ in range(300)]
+    for query in queries:
+        near = index.find_near_duplicate(query)
+        expected = [fingerprint for fingerprint in stored
+                    if bin(fingerprint ^ query).count("1") <= k]
+        if expected:
+            assert near in expected
+        else:
+            assert near is None
+
+
+def test_add_if_new():
+    index = SimhashIndex(3)
+    assert index.add_if_new(0xF0F0)
+    assert not index.add_if_new(0xF0F0 ^ 0b111)
+    assert index.add_if_new(0xF0F0 ^ 0b1111)
+    assert len(index) == 2
+
+
+def test_negative_fingerprints_are_64_bit():
+    index = SimhashIndex(3)
+    index.add(-1)
+    assert index.find_near_duplicate((1 << 64) - 2) == (1 << 64) - 1
+
+
+def test_blocks_must_exceed_k():
+    with pytest.raises(ValueError):
+        SimhashIndex(3, 3)
+
+
+def test_save_appends_and_reloads(tmp_path):
+    config = SimpleNamespace(
+        simhash_distance=3, simhash_blocks=None,
+        simhash_file=str(tmp_path / "simhash.idx"))
+    index = SimhashIndex()
+    index.configure(config)
+    index.add(1)
+    index.save()
+    size = (tmp_path / "simhash.idx").stat().st_size
+    index.add(2)
+    index.add(3)
+    index.save()
+    # Only the two new fingerprints were appended.
+    assert (tmp_path / "simhash.idx").stat().st_size == size + 16
+
+    with open(config.simhash_file, "ab") as f:
+        f.write(b"\x01\x02\x03")    # torn by a crash
+    reloaded = SimhashIndex()
+    reloaded.configure(config)
+    assert list(reloaded.fingerprints) == [1, 2, 3]
+    assert (tmp_path / "simhash.idx").stat().st_size == size + 16
+
+    reloaded.configure(config, restart=True)
+    assert len(reloaded) == 0
+
+
+def test_save_elsewhere(tmp_path):
+    index = SimhashIndex()
+    index.add(7)
+    path = str(tmp_path / "copy.idx")
+    index.save(path)
+    config = SimpleNamespace(
+        simhash_distance=3, simhash_blocks=None, simhash_file=path)
+    copy = SimhashIndex()
+    copy.configure(config)
+    assert list(copy.fingerprints) == [7]
+    (tmp_path / "copy.idx").write_bytes(b"nope")
+    with pytest.raises(ValueError):
+        copy.configure(config)
@@ -0,0 +1,112 @@
+import os
+from configparser import ConfigParser
+
+import pytest
+
+import crawler.frontier
+from crawler.frontier import Frontier
+from crawler.seen import SeenFilter
+from crawler.snapshot import FrontierSnapshot
+from utils import get_urlfingerprint
+from utils.config import Config
+from utils.traps import TrapDetector
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TRAP_STATE = {"patterns": [], "hosts": [["www.ics.uci.edu", 3, 1, {"useful": 2}]],
+              "rejected": {"path too deep": 4}}
+
+
+def test_checkpoint_and_delta(tmp_path):
+    path = str(tmp_path / "frontier.snapshot")
+    snapshot = FrontierSnapshot(path, restart=True)
+    assert snapshot.load() is None
+    seen = SeenFilter(100)
+    seen.add(1)
+    snapshot.checkpoint(seen, TRAP_STATE)
+    snapshot.log([2, -3])
+    snapshot.log([])
+    snapshot.delta.write(b"\x04\x00")     # torn by a crash
+    snapshot.delta.flush()
+    snapshot.close()
+
+    loaded, trap_state = FrontierSnapshot(path).load()
+    assert trap_state == TRAP_STATE
+    assert all(fingerprint in loaded for fingerprint in (1, 2, -3))
+    assert len(loaded) == 3
+
+    # The next checkpoint includes the delta and empties it.
+    snapshot = FrontierSnapshot(path)
+    snapshot.checkpoint(loaded, TRAP_STATE)
+    assert os.path.getsize(f"{path}.delta") == 0
+    assert len(snapshot.load()[0]) == 3
+
+
+def test_corrupt_snapshot_is_ignored(tmp_path):
+    path = str(tmp_path / "frontier.snapshot")
+    snapshot = FrontierSnapshot(path, restart=True)
+    snapshot.checkpoint(SeenFilter(100), TRAP_STATE)
+    with open(path, "r+b") as f:
+        f.seek(-1, os.SEEK_END)
+        f.write(b"!")
+    assert snapshot.load() is None
+    with open(path, "wb") as f:
+        f.write(b"FSNP")
+    assert snapshot.load() is None
+    # Restarting deletes both files.
+    FrontierSnapshot(path, restart=True)
+    assert not os.path.exists(path)
+
+
+@pytest.fixture
+def config(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(crawler.frontier, "traps", TrapDetector())
+    cparser = ConfigParser()
+    cparser.read(os.path.join(ROOT, "config.ini"))
+    config = Config(cparser)
+    config.save_file = str(tmp_path / "frontier.db")
+    config.queue_dir = str(tmp_path / "frontier.queue")
+    config.checkpoint_file = str(tmp_path / "frontier.snapshot")
+    config.seed_urls = ["https://www.ics.uci.edu/"]
+    config.time_delay = 0
+    config.max_queued = 4
+    return config
+
+
+def _drain(frontier):
+    urls = list()
+    while True:
+        url, _ = frontier.next_tbd_url()
+        if url is None:
+            return urls
+        urls.append(url)
+        frontier.mark_url_complete(url)
+
+
+@pytest.mark.parametrize("checkpoint", [True, False], ids=["checkpoint", "save file"])
+def test_frontier_resumes(config, checkpoint):
+    links = [f"https://www.ics.uci.edu/{i}" for i in range(10)]
+    frontier = Frontier(config, restart=True)
+    seed = frontier.get_tbd_url()
+    for link in links:
+        frontier.add_url(link, seed)
+    frontier.mark_url_complete(seed)
+    # Three downloaded, a fourth handed out but not downloaded (hot).
+    done = [frontier.get_tbd_url() for _ in range(3)]
+    for url in done:
+        frontier.mark_url_complete(url)
+    in_progress = frontier.get_tbd_url()
+    if checkpoint:
+        frontier.checkpoint()
+    frontier.save.flush()
+
+    resumed = Frontier(config, restart=False)
+    assert resumed.queue.resumed is checkpoint
+    rest = _drain(resumed)
+    assert in_progress in rest
+    assert sorted(rest) == sorted(set(links) - set(done))
+    # The seen filter came back: nothing is queued twice.
+    resumed.add_url(links[0], None)
+    assert get_urlfingerprint(links[0]) in resumed.seen
+    assert resumed.next_tbd_url() == (None, None)
@@ -0,0 +1,124 @@
+import os
+import json
+import random
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+from utils.stats import CrawlStats, TopCounter, read_page_log
+
+
+@pytest.fixture
+def config(tmp_path):
+    return SimpleNamespace(
+        stats_top_words=5, stats_longest_pages=3,
+        stats_page_log=str(tmp_path / "stats.pages"),
+        stats_snapshot=str(tmp_path / "stats.json"))
+
+
+def _stats(config, restart=False):
+    stats = CrawlStats()
+    stats.configure(config, restart=restart)
+    return stats
+
+
+def test_top_counter_bounds():
+    rng = random.Random(0)
+    counter = TopCounter(20)
+    true = dict()
+    for _ in range(200):
+        batch = dict()
+        for _ in range(50):
+            word = f"w{int(rng.paretovariate(1))}"
+            batch[word] = batch.get(word, 0) + 1
+        for word, count in batch.items():
+            true[word] = true.get(word, 0) + count
+        counter.update(batch)
+        assert len(counter.counts) <= 40
+    assert counter.floor > 0
+    for word, count in counter.counts.items():
+        assert true[word] <= count <= true[word] + counter.floor
+    for word, count in true.items():
+        if count > counter.floor:
+            assert word in counter.counts
+
+
+def test_pages_from_many_threads(config):
+    stats = _stats(config, restart=True)
+
+    def work(n):
+        for i in range(100):
+            stats.record_page(f"https://h{n}.ics.uci.edu/{i}", i, {"uci": 1, f"t{n}": 2})
+    threads = [threading.Thread(target=work, args=(n,)) for n in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert stats.merge() == 400
+    assert stats.page_count == 400
+    assert stats.word_total == 4 * sum(range(100))
+    assert stats.subdomains == {f"h{n}.ics.uci.edu": 100 for n in range(4)}
+    assert stats.words.most_common(1) == [("uci", 400)]
+    assert [count for count, _ in stats.longest] == [99, 99, 99]
+    assert len(list(read_page_log(config.stats_page_log))) == 400
+
+
+def test_resume(config):
+    stats = _stats(config, restart=True)
+    stats.record_page("https://a.ics.uci.edu/1", 10, {"x": 3})
+    stats.flush()
+    # Merged after the last snapshot: read back from the page log.
+    stats.record_page("https://b.ics.uci.edu/2", 20, {"y": 1})
+    stats.merge()
+    with open(config.stats_page_log, "ab") as f:
+        f.write(b"\x00\x00\x00\x05\x00\x00")    # torn record
+
+    resumed = _stats(config)
+    assert resumed.page_count == 2 and resumed.word_total == 30
+    assert resumed.subdomains == {"a.ics.uci.edu": 1, "b.ics.uci.edu": 1}
+    assert resumed.started == stats.started
+    assert resumed.words.most_common(1) == [("x", 3)]
+    resumed.record_page("https://a.ics.uci.edu/3", 5, {})
+    resumed.merge()
+    assert [url for url, _ in read_page_log(config.stats_page_log)] == [
+        "https://a.ics.uci.edu/1", "https://b.ics.uci.edu/2",
+        "https://a.ics.uci.edu/3"]
+
+    restarted = _stats(config, restart=True)
+    assert restarted.page_count == 0
+    assert not os.path.exists(config.stats_page_log)
+
+
+def test_absorb(config, tmp_path):
+    part = SimpleNamespace(**vars(config))
+    part.stats_page_log = str(tmp_path / "stats.pages.1")
+    part.stats_snapshot = str(tmp_path / "stats.json.1")
+    other = _stats(part, restart=True)
+    other.record_page("https://b.ics.uci.edu/", 7, {"y": 2})
+    other.flush()
+
+    stats = _stats(config, restart=True)
+    stats.record_page("https://a.ics.uci.edu/", 3, {"y": 1})
+    stats.absorb(part.stats_page_log, part.stats_snapshot)
+    assert stats.page_count == 2 and stats.word_total == 10
+    assert stats.words.most_common(1) == [("y", 3)]
+    assert len(list(read_page_log(config.stats_page_log))) == 2
+
+
+def test_results_file(config, tmp_path):
+    stats = _stats(config, restart=True)
+    stats.record_page("https://a.ics.uci.edu/short", 2, {"b": 1, "a": 2})
+    stats.record_page("https://a.ics.uci.edu/long", 9, {"b": 3})
+    path = str(tmp_path / "results.txt")
+    stats.write_results_file(path)
+    with open(path) as f:
+        assert f.read() == (
+            "WORD COUNTS\n"
+            "https://a.ics.uci.edu/long: 9\n"
+            "https://a.ics.uci.edu/short: 2\n"
+            "\nWORD FREQUENCIES\n"
+            "b: 4\n"
+            "a: 2\n")
+    with open(config.stats_snapshot) as f:
+        assert json.load(f)["pages"] == 2
@@ -0,0 +1,89 @@
+import os
+
+import pytest
+
+from crawler.store import LogStore, SQLiteStore
+from utils import get_urlfingerprint
+
+
+URLS = [f"https://www.ics.uci.edu/page{i}" for i in range(10)]
+
+
+def _fill(store, urls):
+    for url in urls:
+        store.add(get_urlfingerprint(url), url)
+
+
+@pytest.fixture(params=[SQLiteStore, LogStore], ids=["sqlite", "log"])
+def open_store(request, tmp_path):
+    path = str(tmp_path / "frontier.db")
+
+    def open_store(**kwargs):
+        kwargs.setdefault("commit_interval", 3600)
+        return request.param(path, **kwargs)
+    return open_store
+
+
+def test_records_survive_a_reopen(open_store):
+    store = open_store()
+    _fill(store, URLS)
+    store.mark_complete(get_urlfingerprint(URLS[0]), URLS[0])
+    store.close()
+
+    store = open_store()
+    assert len(store) == len(URLS)
+    assert sorted(store.pending()) == sorted(URLS[1:])
+    assert store.completed(get_urlfingerprint(URLS[0]))
+    assert not store.completed(get_urlfingerprint(URLS[1]))
+    assert set(store.fingerprints()) == {get_urlfingerprint(url) for url in URLS}
+
+
+def test_writes_are_group_committed(open_store):
+    commits = list()
+    store = open_store(commit_batch=4)
+    store.before_commit = lambda: commits.append(len(store.buffer))
+    _fill(store, URLS)
+    # Two batches of 4 committed, the last 2 urls still buffered but seen.
+    assert commits == [4, 4]
+    assert len(store.buffer) == 2
+    assert all(get_urlfingerprint(url) in store for url in URLS)
+
+    # A crash loses the buffer, never a committed batch.
+    assert len(open_store()) == 8
+
+
+def test_log_store_truncates_a_torn_tail(tmp_path):
+    path = str(tmp_path / "frontier.log")
+    store = LogStore(path)
+    _fill(store, URLS[:5])
+    store.close()
+    whole = os.path.getsize(path)
+    with open(path, "ab") as log:
+        # The header and half the url of a record being written.
+        log.write(LogStore.HEADER.pack(0, 40, 0) + b"\0" * 20)
+
+    store = LogStore(path)
+    assert sorted(store.pending()) == sorted(URLS[:5])
+    assert os.path.getsize(path) == whole
+    # Records appended after the recovery are read back.
+    _fill(store, URLS[5:])
+    store.close()
+    assert sorted(LogStore(path).pending()) == sorted(URLS)
+
+
+def test_log_store_stops_at_a_corrupt_record(tmp_path):
+    path = str(tmp_path / "frontier.log")
+    store = LogStore(path)
+    _fill(store, URLS[:6])
+    store.close()
+    with open(path, "r+b") as log:
+        # Flip a byte in the url of the fifth record.
+        record = LogStore.HEADER.size + LogStore.FINGERPRINT.size + len(URLS[0])
+        log.seek(4 * record + record - 1)
+        byte = log.read(1)
+        log.seek(-1, os.SEEK_CUR)
+        log.write(bytes([byte[0] ^ 0xFF]))
+
+    store = LogStore(path)
+    assert sorted(store.pending()) == sorted(URLS[:4])
+    assert os.path.getsize(path) == 4 * record
@@ -0,0 +1,27 @@
+from tokenizer import tokenize, iterTokens, computeWordFrequencies, countTokens
+
+
+def test_tokens():
+    assert tokenize(["Hello, World!", "it's 2024 -- ICS_31"]) == \
+        ["hello", "world", "it's", "2024", "ics", "31"]
+
+
+def test_non_ascii_characters_split_tokens():
+    # The Kelvin sign lowers to an ASCII "k" with str.lower(); it must not.
+    assert tokenize(["cafés naïve \u212aelvin straße"]) == \
+        ["caf", "s", "na", "ve", "elvin", "stra", "e"]
+
+
+def test_tokens_never_span_strings():
+    assert tokenize(["In", "formatics"]) == ["in", "formatics"]
+    assert tokenize([]) == [] and tokenize(["", " ... "]) == []
+
+
+def test_streaming_matches_the_list():
+    content = ["The cat's hat", "THE CAT", "über 42 the"]
+    assert list(iterTokens(content)) == tokenize(content)
+    assert countTokens(content) == computeWordFrequencies(tokenize(content)) == \
+        {"the": 3, "cat's": 1, "hat": 1, "cat": 1, "ber": 1, "42": 1}
+    # Strings are read one at a time.
+    tokens = iterTokens(iter(["a b", "c"]))
+    assert next(tokens) == "a"
@@ -0,0 +1,75 @@
+from utils.traps import TrapDetector, USEFUL, DUPLICATE, LOW_VALUE
+
+
+HOST = "https://www.ics.uci.edu"
+
+
+def test_path_traps():
+    traps = TrapDetector(max_depth=6, max_repeat=2, max_length=60)
+    assert traps.admit(f"{HOST}/a/b/a/b")
+    assert not traps.admit(f"{HOST}/a/b/a/b/a")
+    assert not traps.admit(f"{HOST}/1/2/3/4/5/6/7")
+    assert not traps.admit(f"{HOST}/{'x' * 40}")
+    assert traps.summary()["rejected"] == {
+        "repeating path": 1, "path too deep": 1, "url too long": 1}
+
+
+def test_low_yield_pattern_is_blacklisted():
+    traps = TrapDetector(min_samples=10, min_yield=0.2)
+    # Calendar pages are one pattern, the numbers in their paths aside.
+    for day in range(10):
+        url = f"{HOST}/events/2019-05-{day:02}"
+        assert traps.admit(url)
+        traps.record(url, DUPLICATE if day else USEFUL)
+        traps.complete(url)
+    assert not traps.admit(f"{HOST}/events/2031-01-01")
+    assert traps.summary()["blacklisted"] == ["www.ics.uci.edu/events/0-0-0?"]
+    # Other patterns of the host are still admitted.
+    assert traps.admit(f"{HOST}/about")
+
+
+def test_useful_pattern_is_not_blacklisted():
+    traps = TrapDetector(min_samples=10, min_yield=0.2)
+    for page in range(30):
+        url = f"{HOST}/news/{page}"
+        traps.admit(url)
+        traps.record(url, USEFUL if page % 2 else LOW_VALUE)
+        traps.complete(url)
+    assert traps.admit(f"{HOST}/news/31")
+    assert traps.summary()["blacklisted"] == []
+
+
+def test_pending_urls_are_throttled():
+    traps = TrapDetector(max_pending=3)
+    urls = [f"{HOST}/page/{i}" for i in range(4)]
+    assert [traps.admit(url) for url in urls] == [True, True, True, False]
+    # A downloaded url makes room for the next.
+    traps.complete(urls[0])
+    assert traps.admit(urls[3])
+
+
+def test_endless_query_values_are_slowed_down():
+    traps = TrapDetector(max_param_values=5, slow_pending=2)
+    admitted = [traps.admit(f"{HOST}/search?q={i}") for i in range(10)]
+    # Once q took more than 5 values, only 2 of its urls may wait at once.
+    assert admitted == [True] * 5 + [False] * 5
+    for i in range(5):
+        traps.complete(f"{HOST}/search?q={i}")
+    assert traps.admit(f"{HOST}/search?q=10")
+    assert traps.admit(f"{HOST}/search?q=11")
+    assert not traps.admit(f"{HOST}/search?q=12")
+
+
+def test_state_round_trip():
+    traps = TrapDetector(min_samples=2, min_yield=0.5)
+    for i in range(2):
+        url = f"{HOST}/list/{i}"
+        traps.admit(url)
+        traps.record(url, DUPLICATE)
+    traps.admit(f"{HOST}/{'a/' * 20}")
+
+    restored = TrapDetector(min_samples=2, min_yield=0.5)
+    restored.restore(traps.state())
+    assert restored.summary() == traps.summary()
+    assert restored.host_stats("www.ics.uci.edu") == (2, 0.0)
+    assert not restored.admit(f"{HOST}/list/3")
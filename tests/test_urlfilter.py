@@ -0,0 +1,63 @@
+from types import SimpleNamespace
+
+import pytest
+
+from utils.urlfilter import UrlFilter
+
+
+@pytest.mark.parametrize("url, allowed", [
+    ("https://www.ics.uci.edu/about", True),
+    ("http://ics.uci.edu", True),
+    ("HTTPS://VISION.ICS.UCI.EDU/Page.HTML", True),
+    ("https://user:pw@www.stat.uci.edu:8080/", True),
+    ("https://www.informatics.uci.edu/a;x=1", True),
+    # not one of the domains, or only looking like one
+    ("https://www.uci.edu/", False),
+    ("https://physics.uci.edu/", False),
+    ("https://notics.uci.edu/", False),
+    ("https://ics.uci.edu.evil.com/", False),
+    ("https://evil.com/?u=https://www.ics.uci.edu/", False),
+    # schemes
+    ("ftp://www.ics.uci.edu/file", False),
+    ("mailto:someone@ics.uci.edu", False),
+    ("//www.ics.uci.edu/", False),
+    # extensions of the last path segment only, query and ;params aside
+    ("https://www.ics.uci.edu/slides.PDF", False),
+    ("https://www.ics.uci.edu/a.zip;jsessionid=1", False),
+    ("https://www.ics.uci.edu/a.pdf?download=1", False),
+    ("https://www.ics.uci.edu/pdf/index", True),
+    ("https://www.ics.uci.edu/page?file=a.pdf", True),
+    ("https://www.ics.uci.edu/v1.2/", True),
+])
+def test_default_filter(url, allowed):
+    assert UrlFilter().allows(url) is allowed
+
+
+def test_rules_decide_first():
+    url_filter = UrlFilter(rules=[
+        ("deny", r"/wp-json/"),
+        ("allow", r"^https://archive\.org/details/ics"),
+        ("deny", r"\?share="),
+    ])
+    assert not url_filter("https://www.ics.uci.edu/wp-json/v2")
+    assert url_filter("https://archive.org/details/ics-lectures")
+    assert not url_filter("https://www.ics.uci.edu/post?share=twitter")
+    assert url_filter("https://www.ics.uci.edu/post")
+    with pytest.raises(ValueError):
+        UrlFilter(rules=[("skip", "x")])
+
+
+def test_filter_keeps_order():
+    urls = ["https://www.ics.uci.edu/b", "https://x.com/", "https://www.cs.uci.edu/a",
+            "https://www.ics.uci.edu/b.css"]
+    assert UrlFilter().filter(iter(urls)) == [urls[0], urls[2]]
+
+
+def test_configure():
+    url_filter = UrlFilter()
+    url_filter.configure(SimpleNamespace(
+        allowed_domains=[" .Example.org ", ""], skipped_extensions=[".html"],
+        url_rules=[]))
+    assert url_filter("https://docs.example.org/a.pdf")
+    assert not url_filter("https://docs.example.org/a.html")
+    assert not url_filter("https://www.ics.uci.edu/")
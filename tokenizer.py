@@ -1,49 +1,70 @@
+import re
 import sys
 
+from collections import Counter
+
+# ASCII letters, digits and apostrophes. Text is lowered and stripped of
+# non-ASCII characters before matching, so the pattern only needs lower case.
+TOKEN_PATTERN = re.compile(r"[a-z0-9']+")
+
+
+'''
+Turns a string into the same string with ASCII letters lowered and every non-ASCII character replaced by '?',
+which is not a token character. Lowering after encoding matters: str.lower() would turn a few non-ASCII
+characters (e.g. the Kelvin sign) into ASCII letters that the tokenizer must not see.
+
+TIME COMPLEXITY: O(n)
+Encoding, lowering and decoding are each a single pass over the n characters of the string, done in C.
+'''
+def _ascii_lower(s):
+    return s.encode('ascii', 'replace').lower().decode('ascii')
+
+
+'''
+Lazily yields the tokens of the given iterable of strings, one string at a time, without building the list of
+all tokens.
+
+Each string is tokenized on its own, so tokens never span two strings. A token is a maximal run of ASCII
+letters, digits and apostrophes, lowered.
+
+TIME COMPLEXITY: O(n)
+Let n be the total length of the strings. Each string is normalized in O(n) by _ascii_lower() and scanned once
+by the compiled TOKEN_PATTERN, so the overall time complexity of iterTokens() is O(n). Only the tokens of the
+current string are held in memory.
+'''
+def iterTokens(content):
+    findall = TOKEN_PATTERN.findall
+    for s in content:
+        yield from findall(_ascii_lower(s))
+
+
 '''
 Turns the given list of strings into a list of token strings. 
 
+Same tokens as iterTokens(), collected with one findall() per string instead of one Python-level step per
+character or token.
+
 TIME COMPLEXITY: O(n)
-Let n be the size of the file. Reading the file in BUFFER_SIZE chunks is O(n) because you are reading each
-character in the file once. Iterating through each character in the buffer ultimately means reading each
-character in the file a second time, bringing the total time complexity to O(2n). Appending to an array is
-O(1), so append() calls can be ignored. The string operations that are used in the for-loop (isalnum(), 
-isascii(), lower(), len()) are all of linear complexity with respect to the length of the input string.
-Since these operations are called on single characters or small fragments of the file, they will only add
-some O(kn) time complexity, where k is some constant. Thus, the overall time complexity of tokenize() is
-O((2+k)n), which can be simplified to O(n).
+Let n be the total length of the strings. Normalizing each string with _ascii_lower() is O(n) and findall()
+with the compiled TOKEN_PATTERN reads each character once, so the overall time complexity of tokenize() is O(n).
 '''
 def tokenize(content):
     tokens = []
-    current_token = ""
+    findall = TOKEN_PATTERN.findall
 
     for s in content:
-        s = s.replace(u'\xa0', u' ')
-        for c in s:
-            # isalnum() checks for alphanumeric characters and isascii() checks for ASCII/English characters
-            if (c.isalnum() and c.isascii()) or c == "'":
-                current_token += c.lower()
-            else:
-                # only add to tokens if non-empty string
-                if len(current_token) > 0:
-                    tokens.append(current_token)
-                    
-                current_token = ""                
-        
-        if len(current_token) > 0:
-            tokens.append(current_token)
-
-        current_token = ""
+        tokens.extend(findall(_ascii_lower(s)))
         
     return tokens
 
 
 '''
-Turns the given list of token strings into a dictionary whose keys are unique tokens and values are the frequency
-of the key/token.
+Turns the given list (or any iterable, e.g. iterTokens()) of token strings into a dictionary whose keys are unique
+tokens and values are the frequency of the key/token.
 
-Iterates through the list of tokens and either inserts a new key-value pair into a dictionary or increments the
-existing key-value pair's value, then returns the dictionary.
+Counts with collections.Counter, which inserts a new key-value pair or increments the existing key-value pair's
+value in C, then returns the dictionary. Given a generator, tokens are counted as they are produced and no token
+list is ever built.
 
 TIME COMPLEXITY: O(n)
 Let n be the number of tokens. Iterating through each token in the list is O(n), checking for a key in a dictionary
@@ -51,15 +72,18 @@ is O(1), and inserting into a dictionary is O(1). Thus, the overall time complex
 is O(n).
 '''
 def computeWordFrequencies(tokens: list):
-    freqs = {}
+    return Counter(tokens)
+
 
-    for token in tokens:
-        if token in freqs:
-            freqs[token] += 1   # increment count if token already seen
-        else:
-            freqs[token] = 1    # initialize count of new token to 1
+'''
+Counts the tokens of the given iterable of strings without building the token list first; same result as
+computeWordFrequencies(tokenize(content)).
 
-    return freqs
+TIME COMPLEXITY: O(n)
+iterTokens() is O(n) in the total length n of the strings and each token is counted in O(1).
+'''
+def countTokens(content):
+    return computeWordFrequencies(iterTokens(content))
 
 
 '''
@@ -1,35 +1,25 @@
-import os
-import logging
-from hashlib import sha256
+from hashlib import blake2b
 from urllib.parse import urlparse
 
+from utils.canonical import canonicalizer
+from utils.logs import log_hub
+
 def get_logger(name, filename=None):
-    logger = logging.getLogger(name)
-    logger.setLevel(logging.INFO)
-    if not os.path.exists("Logs"):
-        os.makedirs("Logs")
-    fh = logging.FileHandler(f"Logs/{filename if filename else name}.log")
-    fh.setLevel(logging.DEBUG)
-    ch = logging.StreamHandler()
-    ch.setLevel(logging.INFO)
-    formatter = logging.Formatter(
-       "%(asctime)s - %(name)s - %(levelname)s - %(message)s")
-    fh.setFormatter(formatter)
-    ch.setFormatter(formatter)
-    # add the handlers to the logger
-    logger.addHandler(fh)
-    logger.addHandler(ch)
-    return logger
+    # Logs to Logs/<filename or name>.log and the console, see utils/logs.py.
+    # Handlers are only added the first time a name is asked for.
+    return log_hub.get_logger(name, filename)
 
 
-def get_urlhash(url):
+def get_urlfingerprint(url):
+    ''' 64-bit signed integer fingerprint of everything in url but its
+    scheme. Small enough to keep in memory and to use as an sqlite key. '''
     parsed = urlparse(url)
-    # everything other than scheme.
-    return sha256(
+    return int.from_bytes(blake2b(
         f"{parsed.netloc}/{parsed.path}/{parsed.params}/"
-        f"{parsed.query}/{parsed.fragment}".encode("utf-8")).hexdigest()
+        f"{parsed.query}/{parsed.fragment}".encode("utf-8"),
+        digest_size=8).digest(), "big", signed=True)
 
 def normalize(url):
-    if url.endswith("/"):
-        return url.rstrip("/")
-    return url
+    ''' Canonical form of url (see utils/canonical.py), which is what the
+    frontier stores and fingerprints. '''
+    return canonicalizer.canonicalize(url)
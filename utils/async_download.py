@@ -0,0 +1,153 @@
+import asyncio
+
+from collections import deque
+from urllib.parse import urlencode
+
+from utils.response import Response, decode_cache_response
+
+
+def _decode(content):
+    return Response(decode_cache_response(content))
+
+
+class CacheConnectionPool(object):
+    ''' Keep-alive HTTP/1.1 connections to the cache server, reused across
+    requests so every download does not pay for a new TCP handshake. '''
+
+    def __init__(self, host, port, size=100, timeout=30):
+        self.host = host
+        self.port = port
+        self.size = size
+        self.timeout = timeout
+        self.idle = deque()   # (reader, writer) ready for another request
+
+    async def _connect(self):
+        while self.idle:
+            reader, writer = self.idle.pop()
+            if not reader.at_eof() and not writer.is_closing():
+                return reader, writer
+            writer.close()
+        return await asyncio.open_connection(self.host, self.port)
+
+    def _release(self, reader, writer, keep_alive):
+        if keep_alive and len(self.idle) < self.size:
+            self.idle.append((reader, writer))
+        else:
+            writer.close()
+
+    async def get(self, path):
+        ''' Sends GET path and returns (status code, body bytes). '''
+        reader, writer = await self._connect()
+        try:
+            status, keep_alive, body = await asyncio.wait_for(
+                self._exchange(reader, writer, path), self.timeout)
+        except BaseException:
+            writer.close()
+            raise
+        self._release(reader, writer, keep_alive)
+        return status, body
+
+    async def _exchange(self, reader, writer, path):
+        writer.write(
+            f"GET {path} HTTP/1.1\r\n"
+            f"Host: {self.host}:{self.port}\r\n"
+            f"Connection: keep-alive\r\n"
+            f"Accept-Encoding: identity\r\n\r\n".encode("latin-1"))
+        await writer.drain()
+
+        status_line = await reader.readline()
+        if not status_line:
+            raise ConnectionResetError("Cache server closed the connection.")
+        version, status = status_line.split(None, 2)[:2]
+        headers = dict()
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+        keep_alive = (headers.get("connection", "").lower() != "close"
+                      and version != b"HTTP/1.0")
+        if headers.get("transfer-encoding", "").lower() == "chunked":
+            chunks = list()
+            while True:
+                size = int((await reader.readline()).split(b";")[0], 16)
+                if size == 0:
+                    await reader.readline()
+                    break
+                chunks.append(await reader.readexactly(size))
+                await reader.readexactly(2)
+            body = b"".join(chunks)
+        elif "content-length" in headers:
+            body = await reader.readexactly(int(headers["content-length"]))
+        else:
+            body = await reader.read()
+            keep_alive = False
+        return int(status), keep_alive, body
+
+    def close(self):
+        while self.idle:
+            self.idle.pop()[1].close()
+
+
+class AsyncDownloader(object):
+    ''' asyncio counterpart of utils.download.download: at most concurrency
+    requests in flight over a pool of reused connections, with a timeout per
+    request and retries with exponential backoff on network errors. '''
+
+    def __init__(self, config, logger=None):
+        self.config = config
+        self.logger = logger
+        host, port = config.cache_server
+        self.pool = CacheConnectionPool(
+            host, port, config.async_concurrency, config.download_timeout)
+        self.slots = asyncio.Semaphore(config.async_concurrency)
+
+    async def _get(self, url):
+        query = urlencode([("q", f"{url}"), ("u", f"{self.config.user_agent}")])
+        for attempt in range(self.config.download_retries + 1):
+            try:
+                async with self.slots:
+                    return await self.pool.get(f"/?{query}")
+            except (OSError, EOFError, ValueError,
+                    asyncio.TimeoutError, asyncio.IncompleteReadError) as e:
+                if attempt == self.config.download_retries:
+                    raise
+                if self.logger:
+                    self.logger.warning(
+                        f"Retrying {url} after error {e!r} "
+                        f"(attempt {attempt + 1}).")
+                await asyncio.sleep(
+                    self.config.download_backoff * (2 ** attempt))
+
+    async def download(self, url):
+        try:
+            status, content = await self._get(url)
+        except (OSError, EOFError, ValueError,
+                asyncio.TimeoutError, asyncio.IncompleteReadError) as e:
+            # No answer from the cache server at all, report it as a cache
+            # error so the scraper skips the page.
+            status, content = 600, None
+            error = e
+        else:
+            error = status
+        try:
+            if content and status < 400:
+                if len(content) >= self.config.cbor_offload_bytes:
+                    # Big pages are decoded off the event loop.
+                    return await asyncio.get_running_loop().run_in_executor(
+                        None, _decode, content)
+                return _decode(content)
+        except (EOFError, ValueError) as e:
+            pass
+        if self.logger:
+            self.logger.error(
+                f"Spacetime Response error {error} with url {url}.")
+        return Response({
+            "error": f"Spacetime Response error {error} with url {url}.",
+            "status": status,
+            "url": url})
+
+    def close(self):
+        self.pool.close()
@@ -0,0 +1,203 @@
+import re
+import time
+import zlib
+import cbor
+import pickle
+import random
+import requests
+
+from datetime import date, timedelta
+from itertools import accumulate
+from threading import Thread
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qsl
+from requests.structures import CaseInsensitiveDict
+
+
+PAGE_PATH = re.compile(r"/pages/(\d+)\.html")
+CALENDAR_PATH = re.compile(r"/calendar/(\d{4})-(\d{2})-(\d{2})")
+ARCHIVE_PATH = re.compile(r"/pages/(archive/)+index\.html")
+
+
+class SyntheticSite(object):
+    ''' A deterministic web on the crawl's domains, for benchmarks.
+
+    Page i lives at https://<host>/pages/<i>.html, the host chosen round
+    robin from HOSTS, and page 0 is the seed. Each page has about `words`
+    words drawn from a Zipf-like vocabulary and `fanout` links to random
+    pages, written in the forms the scraper must resolve: absolute, host
+    relative, dot relative, with a fragment and with tracking parameters.
+    Every duplicate_every-th page repeats the text of the page before it
+    (a near-duplicate), every large_every-th page has large_words words and
+    every trap_every-th page links into two traps: an endless calendar
+    (/calendar/<day>, which links to other days and shows the same events
+    every day) and a relative link that nests forever (archive/index.html,
+    served as /pages/archive/index.html, /pages/archive/archive/index.html
+    and so on).
+    robots.txt disallows /private/, which every page links to. '''
+
+    HOSTS = ("www.ics.uci.edu", "vision.ics.uci.edu", "www.cs.uci.edu",
+             "www.informatics.uci.edu", "www.stat.uci.edu")
+    ROBOTS_TXT = "User-agent: *\nDisallow: /private/\n"
+    VOCABULARY = 5000
+
+    def __init__(self, pages=2000, fanout=8, words=400, duplicate_every=10,
+                 large_every=100, large_words=50000, trap_every=200, seed=0):
+        self.pages = pages
+        self.fanout = fanout
+        self.words = words
+        self.duplicate_every = duplicate_every
+        self.large_every = large_every
+        self.large_words = large_words
+        self.trap_every = trap_every
+        self.seed = seed
+        self.vocabulary = [f"word{rank}" for rank in range(self.VOCABULARY)]
+        self.cumulative_weights = list(accumulate(
+            1 / (rank + 1) for rank in range(self.VOCABULARY)))
+
+    def url(self, i):
+        return f"https://{self.HOSTS[i % len(self.HOSTS)]}/pages/{i}.html"
+
+    def _text(self, i):
+        if self.duplicate_every and i and i % self.duplicate_every == 0:
+            i -= 1
+        count = self.large_words if self.large_every and i and \
+            i % self.large_every == 0 else self.words
+        rng = random.Random(self.seed * 1000003 + i)
+        return " ".join(rng.choices(
+            self.vocabulary, cum_weights=self.cumulative_weights, k=count))
+
+    def _links(self, i):
+        rng = random.Random(self.seed * 1000003 + i + 7)
+        host = self.HOSTS[i % len(self.HOSTS)]
+        links = list()
+        for n in range(self.fanout):
+            j = rng.randrange(self.pages)
+            form = n % 5
+            if form == 0 or self.HOSTS[j % len(self.HOSTS)] != host:
+                links.append(self.url(j))
+            elif form == 1:
+                links.append(f"/pages/{j}.html")
+            elif form == 2:
+                links.append(f"../pages/{j}.html")
+            elif form == 3:
+                links.append(f"{j}.html#section")
+            else:
+                links.append(f"{j}.html?utm_source=feed&utm_medium=rss")
+        links.append("/private/admin.html")
+        if self.trap_every and i % self.trap_every == 0:
+            links.append("/calendar/2020-01-01")
+            links.append("archive/index.html")
+        return links
+
+    def _html(self, title, text, links):
+        anchors = "".join(f'<a href="{link}">{link}</a> ' for link in links)
+        return (f"<html><head><title>{title}</title></head><body>"
+                f"<p>{text}</p><div>{anchors}</div></body></html>"
+                ).encode("utf-8")
+
+    def get(self, url):
+        ''' (status, headers, body) served for url. '''
+        parts = urlsplit(url)
+        if parts.hostname not in self.HOSTS:
+            return 404, {}, b""
+        if parts.path == "/robots.txt":
+            return 200, {"Content-Type": "text/plain"}, \
+                self.ROBOTS_TXT.encode("utf-8")
+        headers = {"Content-Type": "text/html; charset=utf-8"}
+        match = PAGE_PATH.fullmatch(parts.path)
+        if match and int(match.group(1)) < self.pages:
+            i = int(match.group(1))
+            return 200, headers, self._html(
+                f"Page {i}", self._text(i), self._links(i))
+        match = CALENDAR_PATH.fullmatch(parts.path)
+        if match:
+            day = date(*map(int, match.groups()))
+            links = [f"/calendar/{day + timedelta(days=delta)}"
+                     for delta in (-1, 1, 7, 30)]
+            # The same events every day: near-duplicates the trap
+            # detector must notice.
+            rng = random.Random(self.seed)
+            text = " ".join(rng.choices(
+                self.vocabulary[:1000], k=300)) + f" events of {day}"
+            return 200, headers, self._html(f"Calendar {day}", text, links)
+        if ARCHIVE_PATH.fullmatch(parts.path):
+            rng = random.Random(zlib.crc32(parts.path.encode("utf-8")))
+            text = " ".join(rng.choices(
+                self.vocabulary, cum_weights=self.cumulative_weights,
+                k=self.words))
+            return 200, headers, self._html(
+                "Archive", text, ["archive/index.html"])
+        return 404, headers, b"<html><body>Not found</body></html>"
+
+
+def cache_response(url, status, headers, body):
+    ''' The cbor body the cache server answers with: the status and a
+    pickled requests.Response of the page, as utils.download reads it. '''
+    raw = requests.models.Response()
+    raw.url = url
+    raw.status_code = status
+    raw.headers = CaseInsensitiveDict(headers)
+    raw._content = body
+    raw.encoding = "utf-8"
+    return cbor.dumps({
+        "url": url, "status": status, "response": pickle.dumps(raw)})
+
+
+class CacheServerEmulator(object):
+    ''' Local stand-in for the cache server: answers GET /?q=<url>&u=<user
+    agent> with the cbor encoded response to url from site, after latency
+    seconds, over keep-alive HTTP/1.1. Set config.cache_server to the
+    address start() returns instead of registering with
+    utils.server_registration.get_cache_server. '''
+
+    def __init__(self, site, host="127.0.0.1", port=0, latency=0.0):
+        self.site = site
+        self.latency = latency
+        emulator = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # Headers and body are two writes: with Nagle's algorithm the
+            # body would wait for the client's delayed ACK.
+            disable_nagle_algorithm = True
+
+            def do_GET(self):
+                query = dict(parse_qsl(urlsplit(self.path).query))
+                url = query.get("q")
+                if not url:
+                    self.send_error(400, "Missing q")
+                    return
+                if emulator.latency:
+                    time.sleep(emulator.latency)
+                body = cache_response(url, *emulator.site.get(url))
+                self.send_response(200)
+                self.send_header("Content-Type", "application/cbor")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self.thread = Thread(target=self.server.serve_forever, daemon=True)
+
+    def start(self):
+        ''' Serves in a background thread, returns (host, port). '''
+        self.thread.start()
+        return self.server.server_address[:2]
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def serve(site, latency, connection):
+    ''' Runs an emulator for site in this process (e.g. a child process,
+    so the server's CPU time is not counted with the crawler's) and sends
+    its address over connection. '''
+    emulator = CacheServerEmulator(site, latency=latency)
+    connection.send(emulator.start())
+    emulator.thread.join()
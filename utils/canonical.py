@@ -0,0 +1,146 @@
+import re
+
+from functools import lru_cache
+from urllib.parse import urljoin, urlsplit, urlunsplit, unquote_plus
+
+
+DEFAULT_PORTS = {"http": 80, "https": 443}
+# Query (and ;path) parameters that name a session or a campaign, not a
+# page. A trailing * matches any parameter starting with the rest.
+DEFAULT_STRIPPED_PARAMS = (
+    "jsessionid", "phpsessid", "aspsessionid", "sessionid", "session_id",
+    "sid", "cfid", "cftoken", "utm_*", "fbclid", "gclid", "msclkid",
+    "mc_cid", "mc_eid", "_ga", "_gl")
+
+PERCENT_ESCAPE = re.compile(r"%[0-9a-fA-F]{2}")
+PATH_PARAM = re.compile(r";([^/;=]*)(=[^/;]*)?")
+UNRESERVED = frozenset(
+    "ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789-._~")
+
+
+def _normalize_escape(match):
+    # %7e -> ~ (unreserved characters are never escaped), %2f -> %2F
+    char = chr(int(match.group(0)[1:], 16))
+    return char if char in UNRESERVED else match.group(0).upper()
+
+
+def _remove_dot_segments(path):
+    # RFC 3986 5.2.4: /a/./b/../c -> /a/c
+    if "/." not in path:
+        return path
+    output = list()
+    for segment in path.split("/"):
+        if segment == "..":
+            if len(output) > 1:
+                output.pop()
+        elif segment != ".":
+            output.append(segment)
+    if path.endswith(("/.", "/..")):
+        output.append("")
+    return "/".join(output)
+
+
+class Canonicalizer(object):
+    ''' Turns the urls the crawler sees into one canonical form, so that the
+    frontier downloads a page once however it is linked to.
+
+    Relative links are resolved with urljoin. For http(s) urls the scheme
+    and host are lowercased, default ports, userinfo, fragments and
+    trailing slashes (except the root's) are dropped, dot segments are
+    resolved and percent escapes normalized. Session and tracking
+    parameters (stripped_params) are removed from the query and the path,
+    and the query is sorted; with a query_whitelist, only the parameters it
+    names are kept. Other schemes are returned as they are.
+
+    Results are memoized in an LRU cache of memo_size urls: navigation
+    links and the pages' own urls come back on nearly every page. '''
+
+    def __init__(self, stripped_params=DEFAULT_STRIPPED_PARAMS,
+                 query_whitelist=(), memo_size=65536):
+        self._reset(stripped_params, query_whitelist, memo_size)
+
+    def _reset(self, stripped_params, query_whitelist, memo_size):
+        names = [name.strip().lower() for name in stripped_params]
+        self.stripped = frozenset(
+            name for name in names if name and not name.endswith("*"))
+        self.stripped_prefixes = tuple(
+            name[:-1] for name in names if name.endswith("*"))
+        self.query_whitelist = frozenset(
+            name.strip().lower() for name in query_whitelist if name.strip())
+        self._memo = lru_cache(maxsize=memo_size)(self._canonicalize)
+
+    def configure(self, config):
+        self._reset(config.stripped_params, config.query_whitelist,
+                    config.canonical_memo_size)
+
+    def _is_stripped(self, name):
+        return name in self.stripped or name.startswith(self.stripped_prefixes)
+
+    def _keeps(self, name):
+        name = name.lower()
+        if self._is_stripped(name):
+            return False
+        return not self.query_whitelist or name in self.query_whitelist
+
+    def _path_param(self, match):
+        return "" if self._is_stripped(match.group(1).lower()) else match.group(0)
+
+    def _canonicalize(self, url):
+        try:
+            parts = urlsplit(url.strip())
+            port = parts.port
+        except ValueError:
+            # e.g. a malformed IPv6 host or a port out of range
+            return url
+        scheme = parts.scheme.lower()
+        if scheme not in DEFAULT_PORTS or not parts.hostname:
+            return url
+
+        netloc = parts.hostname.rstrip(".")
+        if ":" in netloc:
+            netloc = f"[{netloc}]"
+        if port is not None and port != DEFAULT_PORTS[scheme]:
+            netloc = f"{netloc}:{port}"
+
+        path = parts.path
+        if "%" in path:
+            path = PERCENT_ESCAPE.sub(_normalize_escape, path)
+        if ";" in path:
+            path = PATH_PARAM.sub(self._path_param, path)
+        path = _remove_dot_segments(path).rstrip("/") or "/"
+
+        query = ""
+        if parts.query:
+            # The pairs are sorted as they are written: decoding and encoding
+            # them again would change the url (?foo -> ?foo=, ?C=N;O=D ->
+            # ?C=N%3BO%3DD) and maybe the page the server returns.
+            query = "&".join(sorted(
+                pair for pair in parts.query.split("&")
+                if pair and self._keeps(unquote_plus(pair.split("=", 1)[0]))))
+        return urlunsplit((scheme, netloc, path, query, ""))
+
+    def canonicalize(self, url, base=None):
+        ''' Canonical form of url, resolved against base if given. '''
+        if base:
+            url = urljoin(base, url)
+        return self._memo(url)
+
+    __call__ = canonicalize
+
+    def resolve_links(self, base, hrefs):
+        ''' Canonical absolute urls of the hrefs of the page at base, in
+        order, without duplicates or links to the page's own fragments. '''
+        canonical = self._memo
+        links = dict()
+        for href in hrefs:
+            href = href.strip()
+            if not href or href.startswith("#"):
+                continue
+            try:
+                links[canonical(urljoin(base, href))] = None
+            except ValueError:
+                continue
+        return list(links)
+
+
+canonicalizer = Canonicalizer()
@@ -1,5 +1,8 @@
 import re
 
+from utils.urlfilter import DEFAULT_DOMAINS, DEFAULT_EXTENSIONS
+from utils.canonical import DEFAULT_STRIPPED_PARAMS
+
 
 class Config(object):
     def __init__(self, config):
@@ -9,11 +12,100 @@ class Config(object):
         assert re.match(r"^[a-zA-Z0-9_ ,]+$", self.user_agent), "User agent should not have any special characters outside '_', ',' and 'space'"
         self.threads_count = int(config["LOCAL PROPERTIES"]["THREADCOUNT"])
         self.save_file = config["LOCAL PROPERTIES"]["SAVE"]
+        self.store = config["LOCAL PROPERTIES"].get("STORE", "sqlite")
+        self.commit_batch = int(config["LOCAL PROPERTIES"].get("COMMITBATCH", "500"))
+        self.commit_interval = float(config["LOCAL PROPERTIES"].get("COMMITINTERVAL", "1.0"))
+        self.seen_capacity = int(config["LOCAL PROPERTIES"].get("SEENCAPACITY", "1000000"))
+        self.simhash_file = config["LOCAL PROPERTIES"].get("SIMHASHFILE", "simhash.idx")
+        # crawl stats are merged and snapshotted every STATSINTERVAL seconds
+        self.stats_interval = float(config["LOCAL PROPERTIES"].get("STATSINTERVAL", "30"))
+        self.stats_page_log = config["LOCAL PROPERTIES"].get("STATSPAGELOG", "stats.pages")
+        self.stats_snapshot = config["LOCAL PROPERTIES"].get("STATSSNAPSHOT", "stats.json")
+        self.stats_top_words = int(config["LOCAL PROPERTIES"].get("STATSTOPWORDS", "500"))
+        self.stats_longest_pages = int(config["LOCAL PROPERTIES"].get("STATSLONGESTPAGES", "50"))
+        self.results_file = config["LOCAL PROPERTIES"].get("RESULTS", "results.txt")
+        # per-stage timings and counters, see utils/metrics.py
+        self.metrics_file = config["LOCAL PROPERTIES"].get("METRICSFILE", "metrics.json")
+        self.metrics_port = int(config["LOCAL PROPERTIES"].get("METRICSPORT", "0"))
+        # logging, see utils/logs.py
+        self.log_mode = config["LOCAL PROPERTIES"].get("LOGMODE", "queue")
+        self.log_format = config["LOCAL PROPERTIES"].get("LOGFORMAT", "text")
+        self.log_max_bytes = int(config["LOCAL PROPERTIES"].get("LOGMAXBYTES", "10485760"))
+        self.log_backups = int(config["LOCAL PROPERTIES"].get("LOGBACKUPS", "5"))
+        self.log_batch = int(config["LOCAL PROPERTIES"].get("LOGBATCH", "256"))
+        self.log_queue_size = int(config["LOCAL PROPERTIES"].get("LOGQUEUESIZE", "100000"))
+        self.log_partition = None   # set for the processes of a multi-process crawl
+        # frontier order and memory: see crawler/scoring.py
+        self.priority = config["LOCAL PROPERTIES"].get("PRIORITY", "depth:1, inlinks:1, freshness:0.5, yield:4")
+        self.max_queued = int(config["LOCAL PROPERTIES"].get("MAXQUEUED", "100000"))
+        # urls waiting to be queued in memory: see crawler/segments.py
+        self.queue_dir = config["LOCAL PROPERTIES"].get("QUEUEDIR", "frontier.queue")
+        self.queue_band_width = float(config["LOCAL PROPERTIES"].get("QUEUEBANDWIDTH", "1"))
+        self.segment_size = int(config["LOCAL PROPERTIES"].get("SEGMENTSIZE", "8388608"))
+        # seen filter and trap detector, checkpointed with the queue
+        self.checkpoint_file = config["LOCAL PROPERTIES"].get("CHECKPOINT", "frontier.snapshot")
+        self.seen_error_rate = float(config["LOCAL PROPERTIES"].get("SEENERRORRATE", "0.01"))
+
+        self.worker_mode = config["LOCAL PROPERTIES"].get("WORKER", "thread")
+        self.async_concurrency = int(config["LOCAL PROPERTIES"].get("ASYNCCONCURRENCY", "100"))
+        # pages are parsed by PARSEPROCESSES processes (0 = by the workers)
+        self.parse_processes = int(config["LOCAL PROPERTIES"].get("PARSEPROCESSES", "0"))
+        self.parse_queue = int(config["LOCAL PROPERTIES"].get("PARSEQUEUE", "64"))
+        self.backpressure = config["LOCAL PROPERTIES"].get("BACKPRESSURE", "block")
+        # crawl processes, each owning a partition of the hosts
+        self.processes = int(config["LOCAL PROPERTIES"].get("PROCESSES", "1"))
 
         self.host = config["CONNECTION"]["HOST"]
         self.port = int(config["CONNECTION"]["PORT"])
+        self.download_timeout = float(config["CONNECTION"].get("TIMEOUT", "30"))
+        self.download_retries = int(config["CONNECTION"].get("RETRIES", "3"))
+        self.download_backoff = float(config["CONNECTION"].get("RETRYBACKOFF", "0.5"))
+        self.cbor_offload_bytes = int(config["CONNECTION"].get("CBOROFFLOADBYTES", "65536"))
 
         self.seed_urls = config["CRAWLER"]["SEEDURL"].split(",")
         self.time_delay = float(config["CRAWLER"]["POLITENESS"])
+        # robots.txt files are cached per host for ROBOTSTTL seconds
+        self.robots_ttl = float(config["CRAWLER"].get("ROBOTSTTL", "3600"))
+        self.robots_negative_ttl = float(config["CRAWLER"].get("ROBOTSFAILURETTL", "300"))
+        # pages are parsed only if html and at most MAXPAGEBYTES long
+        self.max_page_bytes = int(config["CRAWLER"].get("MAXPAGEBYTES", "2000000"))
+        self.oversize_policy = config["CRAWLER"].get("OVERSIZE", "truncate")
+        self.robots_cache_size = int(config["CRAWLER"].get("ROBOTSCACHESIZE", "1024"))
+        # pages within SIMHASHDISTANCE bits of a kept page are near-duplicates
+        self.simhash_distance = int(config["CRAWLER"].get("SIMHASHDISTANCE", "3"))
+        self.simhash_blocks = int(config["CRAWLER"].get("SIMHASHBLOCKS", "0")) or None
+        # urls are crawled if their host is in (or under) one of DOMAINS and
+        # their path does not end in one of SKIPEXTENSIONS, unless URLRULES
+        # (lines of "allow <regex>" or "deny <regex>") decide first
+        self.allowed_domains = [
+            domain for domain in config["CRAWLER"].get("DOMAINS", ",".join(DEFAULT_DOMAINS)).split(",")
+            if domain.strip()]
+        self.skipped_extensions = re.split(
+            r"[\s,]+", config["CRAWLER"].get("SKIPEXTENSIONS", " ".join(DEFAULT_EXTENSIONS)).strip())
+        # incremental crawls: page history and revisit schedule, see utils/revisit.py
+        self.incremental = config["CRAWLER"].getboolean("INCREMENTAL", False)
+        self.revisit_file = config["CRAWLER"].get("REVISITFILE", "revisits.db")
+        self.revisit_min = float(config["CRAWLER"].get("REVISITMIN", "3600"))
+        self.revisit_max = float(config["CRAWLER"].get("REVISITMAX", "604800"))
+        # crawler trap detection, see utils/traps.py
+        self.trap_max_depth = int(config["CRAWLER"].get("TRAPMAXDEPTH", "12"))
+        self.trap_max_repeat = int(config["CRAWLER"].get("TRAPMAXREPEAT", "2"))
+        self.trap_max_length = int(config["CRAWLER"].get("TRAPMAXLENGTH", "300"))
+        self.trap_min_samples = int(config["CRAWLER"].get("TRAPMINSAMPLES", "20"))
+        self.trap_min_yield = float(config["CRAWLER"].get("TRAPMINYIELD", "0.1"))
+        self.trap_param_values = int(config["CRAWLER"].get("TRAPPARAMVALUES", "200"))
+        self.trap_max_pending = int(config["CRAWLER"].get("TRAPMAXPENDING", "500"))
+        self.trap_slow_pending = int(config["CRAWLER"].get("TRAPSLOWPENDING", "10"))
+        self.trap_max_patterns = int(config["CRAWLER"].get("TRAPMAXPATTERNS", "100000"))
+        # urls are canonicalized without the STRIPPARAMS query parameters
+        # (name* = any name starting with name) and, if QUERYWHITELIST is set,
+        # with only the parameters it names; CANONICALMEMO urls are memoized
+        self.stripped_params = re.split(
+            r"[\s,]+", config["CRAWLER"].get("STRIPPARAMS", " ".join(DEFAULT_STRIPPED_PARAMS)).strip())
+        self.query_whitelist = re.split(r"[\s,]+", config["CRAWLER"].get("QUERYWHITELIST", "").strip())
+        self.canonical_memo_size = int(config["CRAWLER"].get("CANONICALMEMO", "65536"))
+        self.url_rules = [
+            tuple(line.split(None, 1)) for line in config["CRAWLER"].get("URLRULES", "").splitlines()
+            if line.strip()]
 
         self.cache_server = None
\ No newline at end of file
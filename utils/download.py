@@ -1,17 +1,51 @@
 import requests
-import cbor
 import time
 
-from utils.response import Response
+from threading import local
 
-def download(url, config, logger=None):
+from utils.response import Response, decode_cache_response
+
+# One Session per worker thread so connections to the cache server are reused.
+_sessions = local()
+
+def _get_session():
+    session = getattr(_sessions, "session", None)
+    if session is None:
+        session = _sessions.session = requests.Session()
+    return session
+
+def _get(url, config, logger):
+    # Retries network errors with exponential backoff, as AsyncDownloader does.
     host, port = config.cache_server
-    resp = requests.get(
-        f"http://{host}:{port}/",
-        params=[("q", f"{url}"), ("u", f"{config.user_agent}")])
+    for attempt in range(config.download_retries + 1):
+        try:
+            return _get_session().get(
+                f"http://{host}:{port}/",
+                params=[("q", f"{url}"), ("u", f"{config.user_agent}")],
+                timeout=config.download_timeout)
+        except requests.exceptions.RequestException as e:
+            if attempt == config.download_retries:
+                raise
+            if logger:
+                logger.warning(
+                    f"Retrying {url} after error {e!r} (attempt {attempt + 1}).")
+            time.sleep(config.download_backoff * (2 ** attempt))
+
+def download(url, config, logger=None):
+    try:
+        resp = _get(url, config, logger)
+    except requests.exceptions.RequestException as e:
+        # No answer from the cache server at all, report it as a cache
+        # error so the scraper skips the page.
+        if logger:
+            logger.error(f"Spacetime Response error {e!r} with url {url}.")
+        return Response({
+            "error": f"Spacetime Response error {e!r} with url {url}.",
+            "status": 600,
+            "url": url})
     try:
         if resp and resp.content:
-            return Response(cbor.loads(resp.content))
+            return Response(decode_cache_response(resp.content))
     except (EOFError, ValueError) as e:
         pass
     logger.error(f"Spacetime Response error {resp} with url {url}.")
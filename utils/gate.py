@@ -0,0 +1,74 @@
+# Signatures of binary formats that are sometimes served under urls (or
+# content types) that look like web pages, e.g. .ppsx slides are zip files.
+MAGIC_BYTES = [
+    (b"%PDF-", "pdf"),
+    (b"PK\x03\x04", "zip (office document)"),
+    (b"\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1", "ole2 (office document)"),
+    (b"{\\rtf", "rtf"),
+    (b"%!PS", "postscript"),
+    (b"\x89PNG\r\n\x1a\n", "png"),
+    (b"GIF87a", "gif"),
+    (b"GIF89a", "gif"),
+    (b"\xff\xd8\xff", "jpeg"),
+    (b"II*\x00", "tiff"),
+    (b"MM\x00*", "tiff"),
+    (b"\x1f\x8b", "gzip"),
+    (b"BZh", "bzip2"),
+    (b"7z\xbc\xaf\x27\x1c", "7z"),
+    (b"Rar!\x1a\x07", "rar"),
+    (b"\xfd7zXZ\x00", "xz"),
+    (b"ID3", "mp3"),
+    (b"OggS", "ogg"),
+    (b"RIFF", "riff (wav/avi)"),
+    (b"\x1aE\xdf\xa3", "matroska"),
+    (b"MZ", "executable"),
+    (b"\x7fELF", "executable"),
+]
+
+HTML_CONTENT_TYPES = ("text/html", "application/xhtml+xml")
+
+
+class ContentGate(object):
+    ''' Decides from a downloaded Response whether its body is worth parsing,
+    before any parser runs: it has to be html by Content-Type (when the
+    header is there) and by its first bytes, and fit in max_bytes. Oversized
+    pages are cut to max_bytes when oversize is "truncate", and rejected
+    when it is "skip". '''
+
+    def __init__(self, max_bytes, oversize="truncate"):
+        self.max_bytes = max_bytes
+        self.oversize = oversize
+
+    def check(self, resp):
+        ''' Returns None if resp may be scraped (truncating its body if
+        needed), or the reason it must not be. '''
+        if resp.raw_response is None:
+            return None
+        headers = resp.headers
+
+        content_type = headers.get("Content-Type")
+        if content_type:
+            media_type = content_type.split(";", 1)[0].strip().lower()
+            if media_type not in HTML_CONTENT_TYPES:
+                return f"content type {media_type}"
+
+        oversized = False
+        content_length = headers.get("Content-Length")
+        if content_length and content_length.isdigit():
+            oversized = int(content_length) > self.max_bytes
+
+        body = resp.body
+        if not body:
+            return None
+        head = bytes(body[:1024])
+        for magic, kind in MAGIC_BYTES:
+            if head.startswith(magic):
+                return f"{kind} body"
+        if b"\x00" in head:
+            return "binary body"
+
+        if oversized or len(body) > self.max_bytes:
+            if self.oversize == "skip":
+                return f"body larger than {self.max_bytes} bytes"
+            resp.truncate(self.max_bytes)
+        return None
@@ -0,0 +1,277 @@
+import os
+import sys
+import json
+import atexit
+import logging
+
+from queue import Queue, Empty, Full
+from threading import Lock, Thread, Event
+from logging.handlers import QueueHandler, RotatingFileHandler
+
+from utils.metrics import metrics
+
+
+LOG_DIR = "Logs"
+TEXT_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+
+
+class JsonFormatter(logging.Formatter):
+    ''' One json object per line: time, level, logger, thread, process and
+    message (with the traceback, if any). '''
+
+    def format(self, record):
+        message = record.getMessage()
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            message = f"{message}\n{record.exc_text}"
+        return json.dumps({
+            "time": record.created,
+            "level": record.levelname,
+            "logger": record.name,
+            "thread": record.threadName,
+            "process": record.process,
+            "message": message,
+        }, ensure_ascii=False)
+
+
+class _LogFile(object):
+    ''' A log file the listener appends batches of lines to, rotated like
+    RotatingFileHandler: past max_bytes it becomes <path>.1, the previous
+    <path>.1 becomes <path>.2 and so on, keeping backups of them. '''
+
+    def __init__(self, path, max_bytes, backups):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.file = open(path, "a", encoding="utf-8")
+        self.size = self.file.tell()
+
+    def write(self, lines):
+        text = "".join(lines)
+        if self.max_bytes and self.size and \
+                self.size + len(text) > self.max_bytes:
+            self._rotate()
+        self.file.write(text)
+        self.file.flush()
+        self.size += len(text)
+
+    def _rotate(self):
+        self.file.close()
+        if self.backups:
+            for i in range(self.backups - 1, 0, -1):
+                if os.path.exists(f"{self.path}.{i}"):
+                    os.replace(f"{self.path}.{i}", f"{self.path}.{i + 1}")
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            open(self.path, "w").close()
+        self.file = open(self.path, "a", encoding="utf-8")
+        self.size = 0
+
+    def close(self):
+        self.file.close()
+
+
+class _NonBlockingQueueHandler(QueueHandler):
+    # A full queue drops the record instead of waiting: logging never holds
+    # up a worker.
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except Full:
+            metrics.count("logs.dropped")
+
+
+class LogHub(object):
+    ''' Where the records of every logger made by get_logger go: a file per
+    name under Logs/ (shared by loggers given the same filename) and the
+    console for INFO and above. A logger gets its handlers once, however
+    many times get_logger is called for it.
+
+    In "queue" mode (LOGMODE) loggers only put their records on a bounded
+    queue, without formatting or writing anything; a single listener thread
+    takes them off in batches of up to LOGBATCH, formats them and appends
+    each batch to each file with one write. When the queue is full records
+    are dropped (and counted by the metrics) rather than blocking the
+    caller. In "sync" mode every record is written by the calling thread,
+    as the logging module does by default.
+
+    Each process of a multi-process crawl writes its own files, <name>.<n>.log
+    for partition n. Files are rotated past LOGMAXBYTES, keeping LOGBACKUPS
+    old ones, and
+    LOGFORMAT "json" writes one json object per record (JsonFormatter)
+    instead of text lines. '''
+
+    def __init__(self):
+        self.lock = Lock()
+        self.filenames = dict()     # key = logger name, val = log file name
+        self.files = dict()     # key = logger name, val = log file path
+        self.handlers = list()  # handlers attached to the loggers
+        self.sync_handlers = dict()     # key = path, val = RotatingFileHandler
+        self.queue = None
+        self.listener = None
+        self.stopping = None
+        self.mode = "sync"
+        self.formatter = logging.Formatter(TEXT_FORMAT)
+        self.max_bytes = 0
+        self.backups = 0
+        self.batch = 256
+        self.queue_size = 10000
+        self.partition = None
+        atexit.register(self.stop)
+
+    def get_logger(self, name, filename=None):
+        logger = logging.getLogger(name)
+        with self.lock:
+            if name not in self.files:
+                logger.setLevel(logging.INFO)
+                os.makedirs(LOG_DIR, exist_ok=True)
+                self.filenames[name] = filename if filename else name
+                self.files[name] = self._path(self.filenames[name])
+                self._attach(logger, self.files[name])
+        return logger
+
+    def _path(self, filename):
+        if self.partition is not None:
+            filename = f"{filename}.{self.partition}"
+        return os.path.abspath(os.path.join(LOG_DIR, f"{filename}.log"))
+
+    def configure(self, config):
+        ''' Switches every logger to the mode and format of config. '''
+        self.stop()
+        with self.lock:
+            for name in self.files:
+                logger = logging.getLogger(name)
+                for handler in logger.handlers[:]:
+                    if handler in self.handlers:
+                        logger.removeHandler(handler)
+            for handler in self.handlers:
+                handler.close()
+            self.handlers = list()
+            self.sync_handlers = dict()
+            if config.log_mode not in ("queue", "sync"):
+                raise ValueError(
+                    f"Unknown LOGMODE {config.log_mode}, use queue or sync.")
+            self.mode = config.log_mode
+            self.formatter = JsonFormatter() if config.log_format == "json" \
+                else logging.Formatter(TEXT_FORMAT)
+            self.max_bytes = config.log_max_bytes
+            self.backups = config.log_backups
+            self.batch = config.log_batch
+            self.queue_size = config.log_queue_size
+            self.partition = config.log_partition
+            # The paths are made again, from the current directory.
+            os.makedirs(LOG_DIR, exist_ok=True)
+            self.files = {name: self._path(filename)
+                          for name, filename in self.filenames.items()}
+            for name, path in self.files.items():
+                self._attach(logging.getLogger(name), path)
+
+    def _attach(self, logger, path):
+        # Caller must hold self.lock.
+        if self.mode == "queue":
+            if self.listener is None:
+                self._start()
+            handlers = [self.handlers[0]]
+        else:
+            if not self.handlers:
+                console = logging.StreamHandler()
+                console.setLevel(logging.INFO)
+                console.setFormatter(self.formatter)
+                self.handlers.append(console)
+            handler = self.sync_handlers.get(path)
+            if handler is None:
+                handler = self.sync_handlers[path] = RotatingFileHandler(
+                    path, maxBytes=self.max_bytes, backupCount=self.backups,
+                    encoding="utf-8")
+                handler.setLevel(logging.DEBUG)
+                handler.setFormatter(self.formatter)
+                self.handlers.append(handler)
+            handlers = [self.handlers[0], handler]
+        for handler in handlers:
+            if handler not in logger.handlers:
+                logger.addHandler(handler)
+
+    def _start(self):
+        # Caller must hold self.lock.
+        self.queue = Queue(self.queue_size)
+        self.handlers = [_NonBlockingQueueHandler(self.queue)]
+        self.stopping = Event()
+        self.listener = Thread(
+            target=self._listen, args=(self.queue, self.stopping),
+            name="LogListener", daemon=True)
+        self.listener.start()
+
+    def _listen(self, queue, stopping):
+        files = dict()      # key = path, val = _LogFile
+        try:
+            while not (stopping.is_set() and queue.empty()):
+                try:
+                    batch = [queue.get(timeout=0.5)]
+                except Empty:
+                    continue
+                while len(batch) < self.batch:
+                    try:
+                        batch.append(queue.get_nowait())
+                    except Empty:
+                        break
+                self._write(batch, files)
+        finally:
+            for log_file in files.values():
+                log_file.close()
+
+    def _write(self, batch, files):
+        lines = dict()      # key = path, val = formatted lines
+        console = list()
+        flushed = list()
+        for record in batch:
+            if isinstance(record, Event):
+                flushed.append(record)
+                continue
+            try:
+                line = self.formatter.format(record) + "\n"
+            except Exception:
+                continue
+            path = self.files.get(record.name)
+            if path is not None:
+                lines.setdefault(path, list()).append(line)
+            if record.levelno >= logging.INFO:
+                console.append(line)
+        for path, path_lines in lines.items():
+            log_file = files.get(path)
+            if log_file is None:
+                log_file = files[path] = _LogFile(
+                    path, self.max_bytes, self.backups)
+            try:
+                log_file.write(path_lines)
+            except OSError:
+                metrics.count("logs.dropped", len(path_lines))
+        if console:
+            sys.stderr.write("".join(console))
+            sys.stderr.flush()
+        for event in flushed:
+            event.set()
+
+    def flush(self, timeout=10):
+        ''' Waits until the listener wrote every record queued so far. '''
+        if self.listener is None:
+            return
+        done = Event()
+        try:
+            self.queue.put(done, timeout=timeout)
+        except Full:
+            return
+        done.wait(timeout)
+
+    def stop(self):
+        ''' Writes what is queued and stops the listener. '''
+        with self.lock:
+            listener, self.listener = self.listener, None
+            if listener is None:
+                return
+            self.stopping.set()
+        listener.join()
+
+
+log_hub = LogHub()
@@ -0,0 +1,269 @@
+import os
+import json
+import time
+
+from bisect import bisect_left
+from threading import Lock, Thread, local
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+
+# Upper bounds of the histogram buckets in seconds: two per power of two
+# from 1 microsecond to about 12 seconds, and one more for anything longer.
+BUCKETS = tuple(1e-6 * 2 ** (i / 2) for i in range(48))
+
+
+class Histogram(object):
+    ''' Durations in fixed log-spaced buckets. Recording is a bisect and a
+    few additions, histograms merge by adding their counts, and percentiles
+    are bucket upper bounds (at most 41% above the true value). '''
+
+    __slots__ = ("counts", "total", "max")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds):
+        self.counts[bisect_left(BUCKETS, seconds)] += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    @property
+    def count(self):
+        return sum(self.counts)
+
+    def merge(self, other):
+        for i, count in enumerate(other.counts):
+            self.counts[i] += count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+
+    def state(self):
+        ''' [total, max, {bucket: count}], small enough to send per page. '''
+        return [self.total, self.max,
+                {i: count for i, count in enumerate(self.counts) if count}]
+
+    @classmethod
+    def from_state(cls, state):
+        histogram = cls()
+        histogram.total, histogram.max, counts = state
+        for i, count in counts.items():
+            histogram.counts[int(i)] += count
+        return histogram
+
+    def percentile(self, fraction):
+        rank = fraction * self.count
+        seen = 0
+        for i, count in enumerate(self.counts):
+            seen += count
+            if count and seen >= rank:
+                return min(BUCKETS[i], self.max) if i < len(BUCKETS) \
+                    else self.max
+        return 0.0
+
+    def summary(self):
+        count = self.count
+        return {
+            "count": count,
+            "total": self.total,
+            "mean": self.total / count if count else 0.0,
+            "p50": self.percentile(0.5),
+            "p90": self.percentile(0.9),
+            "p99": self.percentile(0.99),
+            "max": self.max,
+        }
+
+
+class _Shard(object):
+    ''' Metrics recorded by one thread. Its lock is only ever contended by
+    snapshot(), never by another worker. '''
+
+    def __init__(self):
+        self.lock = Lock()
+        self.histograms = dict()    # key = stage, val = Histogram
+        self.counters = dict()      # key = name, val = count
+
+
+class _Timer(object):
+    __slots__ = ("metrics", "stage", "start")
+
+    def __init__(self, metrics, stage):
+        self.metrics = metrics
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.metrics.observe(self.stage, time.perf_counter() - self.start)
+
+
+class Metrics(object):
+    ''' Hot path instrumentation: a latency histogram per crawl stage and
+    event counters, recorded into per-thread shards (as in CrawlStats) so
+    workers never wait on each other, and gauges, functions read only when
+    a snapshot is taken (e.g. the frontier's queue sizes).
+
+    Counters named <name>.hit and <name>.miss also give the rate
+    <name> = hit / (hit + miss) in the snapshot. Stages timed in the
+    pipeline's processes are sent back with each page (see drain()).
+
+    The crawler writes snapshot() to METRICSFILE every STATSINTERVAL
+    seconds; with METRICSPORT it is also served as json at
+    http://127.0.0.1:<METRICSPORT>/metrics. '''
+
+    def __init__(self):
+        self.shards = list()
+        self.shards_lock = Lock()
+        self.local = local()
+        self.gauges = dict()    # key = name, val = function returning json
+        self.path = None
+        self.server = None
+        self.started = time.time()
+
+    def configure(self, config):
+        self.close()
+        with self.shards_lock:
+            for shard in self.shards:
+                with shard.lock:
+                    shard.histograms = dict()
+                    shard.counters = dict()
+        self.gauges = dict()
+        self.started = time.time()
+        self.path = config.metrics_file
+        if config.metrics_port:
+            self.serve(config.metrics_port)
+
+    def _shard(self):
+        shard = getattr(self.local, "shard", None)
+        if shard is None:
+            shard = self.local.shard = _Shard()
+            with self.shards_lock:
+                self.shards.append(shard)
+        return shard
+
+    def timer(self, stage):
+        ''' Context manager that records the time spent in its block. '''
+        return _Timer(self, stage)
+
+    def observe(self, stage, seconds):
+        shard = self._shard()
+        with shard.lock:
+            histogram = shard.histograms.get(stage)
+            if histogram is None:
+                histogram = shard.histograms[stage] = Histogram()
+            histogram.observe(seconds)
+
+    def count(self, name, n=1):
+        shard = self._shard()
+        with shard.lock:
+            shard.counters[name] = shard.counters.get(name, 0) + n
+
+    def gauge(self, name, read):
+        ''' Adds read() to every snapshot under name. '''
+        self.gauges[name] = read
+
+    def _merged(self, reset=False):
+        histograms = dict()
+        counters = dict()
+        with self.shards_lock:
+            shards = list(self.shards)
+        for shard in shards:
+            with shard.lock:
+                for stage, histogram in shard.histograms.items():
+                    histograms.setdefault(stage, Histogram()).merge(histogram)
+                for name, count in shard.counters.items():
+                    counters[name] = counters.get(name, 0) + count
+                if reset:
+                    shard.histograms = dict()
+                    shard.counters = dict()
+        return histograms, counters
+
+    def drain(self):
+        ''' Takes out what this process recorded since the last drain, for
+        absorb() in another process. '''
+        histograms, counters = self._merged(reset=True)
+        return ({stage: histogram.state()
+                 for stage, histogram in histograms.items()}, counters)
+
+    def absorb(self, drained):
+        histograms, counters = drained
+        shard = self._shard()
+        with shard.lock:
+            for stage, state in histograms.items():
+                histogram = shard.histograms.get(stage)
+                if histogram is None:
+                    histogram = shard.histograms[stage] = Histogram()
+                histogram.merge(Histogram.from_state(state))
+            for name, count in counters.items():
+                shard.counters[name] = shard.counters.get(name, 0) + count
+
+    def snapshot(self):
+        histograms, counters = self._merged()
+        rates = dict()
+        for name in counters:
+            base, _, kind = name.rpartition(".")
+            if kind in ("hit", "miss") and base not in rates:
+                hits = counters.get(f"{base}.hit", 0)
+                rates[base] = hits / (hits + counters.get(f"{base}.miss", 0))
+        gauges = dict()
+        for name, read in list(self.gauges.items()):
+            try:
+                gauges[name] = read()
+            except Exception as e:
+                gauges[name] = repr(e)
+        return {
+            "time": time.time(),
+            "uptime": time.time() - self.started,
+            "stages": {stage: histogram.summary()
+                       for stage, histogram in sorted(histograms.items())},
+            "counters": dict(sorted(counters.items())),
+            "rates": dict(sorted(rates.items())),
+            "gauges": gauges,
+        }
+
+    def write(self):
+        ''' Atomically replaces the snapshot file, if one is configured. '''
+        if not self.path:
+            return
+        with open(f"{self.path}.tmp", "w") as f:
+            json.dump(self.snapshot(), f, indent=1)
+        os.replace(f"{self.path}.tmp", self.path)
+
+    def serve(self, port, host="127.0.0.1"):
+        ''' Serves snapshot() at /metrics from a background thread. '''
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            disable_nagle_algorithm = True
+
+            def do_GET(self):
+                if self.path.split("?")[0] not in ("/", "/metrics"):
+                    self.send_error(404)
+                    return
+                body = json.dumps(metrics.snapshot(), indent=1).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        Thread(target=self.server.serve_forever, daemon=True).start()
+        return self.server.server_address[:2]
+
+    def close(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+
+metrics = Metrics()
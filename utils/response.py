@@ -1,14 +1,325 @@
+import io
 import pickle
+import struct
+
+from collections.abc import Mapping
+
+import cbor
+
+from utils.metrics import metrics
+
+
+class Headers(Mapping):
+    ''' Stand-in for requests.structures.CaseInsensitiveDict: read-only,
+    looked up case-insensitively, iterated in the original case. '''
+
+    def __init__(self, headers=()):
+        self._store = {key.lower(): (key, value)
+                       for key, value in dict(headers).items()}
+
+    def __setstate__(self, state):
+        # A CaseInsensitiveDict pickles its OrderedDict of lowercase key to
+        # (key, value), unpickled as a plain dict.
+        self._store = dict(state.get("_store") or {})
+
+    def __getitem__(self, key):
+        return self._store[key.lower()][1]
+
+    def __iter__(self):
+        return (key for key, _ in self._store.values())
+
+    def __len__(self):
+        return len(self._store)
+
+    def __repr__(self):
+        return repr(dict(self.items()))
+
+
+class RawResponse(object):
+    ''' Stand-in for the requests.models.Response the cache server pickles,
+    with its url, status_code, headers, encoding and reason but not its
+    cookie jar, request or history. body is the page as a memoryview of the
+    downloaded bytes; content makes a bytes copy of it on first use. '''
+
+    def __init__(self):
+        self.url = None
+        self.status_code = None
+        self.headers = Headers()
+        self.encoding = None
+        self.reason = None
+        self.body = None
+        self._content = None
+
+    def __setstate__(self, state):
+        self.__init__()
+        self.url = state.get("url")
+        self.status_code = state.get("status_code")
+        self.headers = state.get("headers") or Headers()
+        self.encoding = state.get("encoding")
+        self.reason = state.get("reason")
+        content = state.get("_content")
+        if isinstance(content, (bytes, bytearray)):
+            self._content = bytes(content)
+            self.body = memoryview(self._content)
+
+    @property
+    def content(self):
+        if self._content is None and self.body is not None:
+            self._content = self.body.tobytes()
+        return self._content
+
+
+class _Ignored(object):
+    # Whatever else the pickle holds (cookie jars, prepared requests, ...):
+    # takes any arguments and state and keeps none of it.
+
+    def __new__(cls, *args, **kwargs):
+        return object.__new__(cls)
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def __setstate__(self, state):
+        pass
+
+
+class _StandInUnpickler(pickle.Unpickler):
+    ''' Unpickles a requests Response into a RawResponse. No class of the
+    pickle is ever imported or called: the Response and its headers map to
+    the stand-ins above, plain containers to dict, and everything else to
+    _Ignored, so a malicious pickle can not run code either. '''
+
+    CLASSES = {
+        ("requests.models", "Response"): RawResponse,
+        ("requests.structures", "CaseInsensitiveDict"): Headers,
+        ("collections", "OrderedDict"): dict,
+        # how protocol 2 pickles empty bytes
+        ("__builtin__", "bytes"): bytes,
+        ("builtins", "bytes"): bytes,
+    }
+
+    def find_class(self, module, name):
+        if (module, name) == ("_codecs", "encode"):
+            # how protocols 0 to 2 pickle bytes
+            return _encode
+        if (module, name) in (("copyreg", "_reconstructor"),
+                              ("copy_reg", "_reconstructor")):
+            # how protocols 0 and 1 pickle objects
+            return _reconstruct
+        return self.CLASSES.get((module, name), _Ignored)
+
+
+def _encode(text, encoding="utf-8"):
+    if encoding != "latin1":
+        raise pickle.UnpicklingError(f"Unexpected bytes encoding {encoding}.")
+    return text.encode("latin1")
+
+
+def _reconstruct(cls, base, state):
+    # copyreg._reconstructor, limited to the stand-ins: their state is set
+    # afterwards by __setstate__, as with the later protocols.
+    if cls in (RawResponse, Headers):
+        return object.__new__(cls)
+    return _Ignored()
+
+
+# How a pickled requests Response starts its state: the "_content" key, as
+# SHORT_BINUNICODE (protocol 4+) or BINUNICODE (protocol 3), then a memo op.
+_CONTENT_KEYS = (b"\x8c\x08_content", b"X\x08\x00\x00\x00_content")
+_MEMO_OPS = {0x94: 0, ord("q"): 1, ord("r"): 4}   # op: argument bytes
+# Bytes ops: op: (length format, header size)
+_BYTES_OPS = {ord("C"): ("<B", 2), ord("B"): ("<I", 5), 0x8e: ("<Q", 9)}
+_FRAME = 0x95
+
+
+def _split_body(pickled):
+    ''' Finds the body in a pickled requests Response without unpickling it.
+    Returns (the pickle with an empty body, body start, body end), or None
+    if the pickle is not laid out as expected. '''
+    head = bytes(pickled[:4096])
+    for key in _CONTENT_KEYS:
+        position = head.find(key)
+        if position != -1:
+            break
+    else:
+        return None
+    position += len(key)
+    if position >= len(head) or head[position] not in _MEMO_OPS:
+        return None
+    op = position + 1 + _MEMO_OPS[head[position]]
+    if op >= len(head) or head[op] not in _BYTES_OPS:
+        return None
+    length_format, header_size = _BYTES_OPS[head[op]]
+    start = op + header_size
+    end = start + struct.unpack_from(length_format, head, op + 1)[0]
+    if end > len(pickled):
+        return None
+    prefix = bytearray(head[:op])
+    if prefix[2:3] == bytes([_FRAME]):
+        # Protocol 4+: the body is either inside the first frame, which is
+        # then shorter, or written right after it, outside of any frame.
+        frame_end = 11 + struct.unpack_from("<Q", prefix, 3)[0]
+        if op < frame_end:
+            struct.pack_into("<Q", prefix, 3, frame_end - 11 - (end - op) + 2)
+        elif op != frame_end:
+            return None
+    return bytes(prefix) + b"C\x00" + bytes(pickled[end:]), start, end
+
+
+def load_raw_response(pickled):
+    ''' RawResponse of the pickled requests Response the cache server sends.
+    Its body is a view of pickled when the body can be found in it, so the
+    page is never copied; otherwise the whole pickle is read. '''
+    split = _split_body(pickled)
+    if split is not None:
+        stub, start, end = split
+        try:
+            raw = _StandInUnpickler(io.BytesIO(stub)).load()
+        except Exception:
+            # The body was looked for in the wrong place (e.g. "_content"
+            # appears earlier in the pickle): read all of it below.
+            raw = None
+        if isinstance(raw, RawResponse) and raw._content == b"":
+            raw._content = None
+            raw.body = memoryview(pickled)[start:end]
+            return raw
+    raw = _StandInUnpickler(io.BytesIO(pickled)).load()
+    if not isinstance(raw, RawResponse):
+        raise pickle.UnpicklingError("Not a pickled requests Response.")
+    return raw
+
+
+_CBOR_LENGTHS = {24: "!B", 25: "!H", 26: "!I", 27: "!Q"}
+
+
+def _cbor_item(data, offset):
+    # One cbor item of a kind the cache server sends (integers, byte and text
+    # strings, true, false, null, floats) and the offset after it. Byte
+    # strings are memoryview slices of data.
+    initial = data[offset]
+    major, info = initial >> 5, initial & 0x1f
+    offset += 1
+    if major == 7:
+        if info in (20, 21, 22):
+            return (False, True, None)[info - 20], offset
+        if info in (26, 27):
+            size = 4 if info == 26 else 8
+            value = struct.unpack_from("!f" if info == 26 else "!d", data, offset)[0]
+            return value, offset + size
+        raise ValueError(f"Unsupported cbor simple value {info}.")
+    if info < 24:
+        value = info
+    elif info in _CBOR_LENGTHS:
+        value = struct.unpack_from(_CBOR_LENGTHS[info], data, offset)[0]
+        offset += struct.calcsize(_CBOR_LENGTHS[info])
+    else:
+        raise ValueError("Unsupported cbor length.")
+    if major == 0:
+        return value, offset
+    if major == 1:
+        return -1 - value, offset
+    if major in (2, 3):
+        if offset + value > len(data):
+            raise ValueError("Truncated cbor string.")
+        item = data[offset:offset + value]
+        if major == 3:
+            item = str(item, "utf-8")
+        return item, offset + value
+    raise ValueError(f"Unsupported cbor major type {major}.")
+
+
+def decode_cache_response(content):
+    ''' The dict of a cache server response (a cbor map), with byte strings
+    as views of content instead of copies. Falls back to cbor.loads for
+    anything but a flat map of plain values. '''
+    data = memoryview(content)
+    try:
+        initial = data[0]
+        if initial >> 5 != 5:
+            raise ValueError("Not a cbor map.")
+        count, offset = initial & 0x1f, 1
+        if count in _CBOR_LENGTHS:
+            count_format = _CBOR_LENGTHS[count]
+            count = struct.unpack_from(count_format, data, offset)[0]
+            offset += struct.calcsize(count_format)
+        elif count >= 24:
+            raise ValueError("Unsupported cbor map length.")
+        resp_dict = dict()
+        for _ in range(count):
+            key, offset = _cbor_item(data, offset)
+            value, offset = _cbor_item(data, offset)
+            resp_dict[key] = value
+        if offset != len(data):
+            raise ValueError("Trailing data after the cbor map.")
+        return resp_dict
+    except (ValueError, IndexError, struct.error):
+        return cbor.loads(bytes(content))
+
 
 class Response(object):
+    ''' A page as the cache server returns it. url, status and error are read
+    right away; the pickled requests Response only when the headers, body
+    or raw_response are first used (never, for error statuses), into
+    stand-in objects (see load_raw_response) without copying the body.
+
+    body is a memoryview of the page, content the same as bytes (a copy,
+    made once). Both are cut to the content gate's byte budget once the
+    page is truncated. '''
+
     def __init__(self, resp_dict):
         self.url = resp_dict["url"]
         self.status = resp_dict["status"]
         self.error = resp_dict["error"] if "error" in resp_dict else None
+        self.truncated = False
+        self._pickled = resp_dict.get("response")
+        self._raw_response = None
+        self._body = None
+        self._content = None
+
+    def _load(self):
+        pickled, self._pickled = self._pickled, None
+        if pickled is None:
+            return
         try:
-            self.raw_response = (
-                pickle.loads(resp_dict["response"])
-                if "response" in resp_dict else
-                None)
-        except TypeError:
-            self.raw_response = None
+            self._raw_response = load_raw_response(pickled)
+        except (pickle.UnpicklingError, EOFError, TypeError, ValueError,
+                AttributeError, IndexError, KeyError, struct.error):
+            # The scraper skips the page, as one without a body.
+            metrics.count("responses.undecodable")
+            return
+        self._body = self._raw_response.body
+
+    @property
+    def raw_response(self):
+        if self._pickled is not None:
+            self._load()
+        return self._raw_response
+
+    @property
+    def body(self):
+        ''' The page as a memoryview, or None when there is no raw response. '''
+        if self._pickled is not None:
+            self._load()
+        return self._body
+
+    @property
+    def content(self):
+        ''' The page as bytes, or None when there is no raw response. '''
+        if self._content is None:
+            body = self.body
+            if body is not None:
+                self._content = body.tobytes()
+        return self._content
+
+    @property
+    def headers(self):
+        if self.raw_response is None:
+            return {}
+        return self.raw_response.headers
+
+    def truncate(self, size):
+        body = self.body
+        if body is not None and len(body) > size:
+            self._body = body[:size]
+            self._content = None
+            self.truncated = True
@@ -0,0 +1,189 @@
+import math
+import time
+import sqlite3
+
+from hashlib import blake2b
+from threading import Lock
+
+from utils import get_urlfingerprint
+
+
+# Columns of a page's history, in table order.
+COLUMNS = (
+    "fingerprint", "url", "etag", "last_modified", "body_hash", "outcome",
+    "word_count", "simhash", "first_fetched", "last_fetched", "checks",
+    "changes", "next_visit")
+URL, ETAG, LAST_MODIFIED, BODY_HASH, OUTCOME, WORD_COUNT, SIMHASH, \
+    FIRST_FETCHED, LAST_FETCHED, CHECKS, CHANGES, NEXT_VISIT = range(1, 13)
+
+
+def _signed(value):
+    # sqlite integers are signed 64-bit.
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+
+def body_hash(content):
+    return int.from_bytes(
+        blake2b(content, digest_size=8).digest(), "big", signed=True)
+
+
+class RevisitHistory(object):
+    ''' What every downloaded page looked like, for incremental crawls.
+
+    For each url it keeps the ETag and Last-Modified headers and a hash of
+    the body, what the scraper made of the page (its outcome, word count
+    and simhash), and when it was fetched and found changed. A page whose
+    body hash matches its last download is unchanged: its stored results
+    are counted again instead of parsing it. The validators are only kept,
+    a server may send the same ones for a changed body.
+
+    Every fetch also schedules the next visit from the page's estimated
+    rate of change. With n checks after the first download, X of which
+    found a change, over an average of I seconds apart, the rate is
+    lambda = -ln((n - X + 0.5) / (n + 0.5)) / I (Cho and Garcia-Molina,
+    "Estimating frequency of change"), and the page is due again in
+    1 / lambda seconds; a page never seen changing waits twice as long as
+    it has been stable. Intervals are kept within [min_interval,
+    max_interval]. The frontier only admits urls that are due, and a
+    crawl started with --restart queues every due url after the seeds.
+
+    Disabled (every url due, nothing recorded) unless configured with
+    INCREMENTAL. Writes are buffered and committed by flush(). When the
+    pages are next due is also kept in memory, so due() never waits on
+    the database. '''
+
+    def __init__(self):
+        self.enabled = False
+        self.lock = Lock()
+        self.db = None
+        self.buffer = dict()    # key = fingerprint, val = row (a list)
+        self.next_visits = dict()   # key = fingerprint, val = next visit, of pages not due yet
+
+    def configure(self, config):
+        with self.lock:
+            self.enabled = config.incremental
+            self.min_interval = config.revisit_min
+            self.max_interval = config.revisit_max
+            self.buffer = dict()
+            self.next_visits = dict()
+            if self.db is not None:
+                self.db.close()
+                self.db = None
+            if not self.enabled:
+                return
+            self.db = sqlite3.connect(
+                config.revisit_file, check_same_thread=False)
+            self.db.execute("PRAGMA journal_mode=WAL")
+            self.db.execute(
+                "CREATE TABLE IF NOT EXISTS pages ("
+                "fingerprint INTEGER PRIMARY KEY, url TEXT NOT NULL, "
+                "etag TEXT, last_modified TEXT, body_hash INTEGER, "
+                "outcome TEXT, word_count INTEGER, simhash INTEGER, "
+                "first_fetched REAL, last_fetched REAL, checks INTEGER, "
+                "changes INTEGER, next_visit REAL)")
+            self.db.execute(
+                "CREATE INDEX IF NOT EXISTS by_visit ON pages(next_visit)")
+            self.db.commit()
+            self.next_visits = dict(self.db.execute(
+                "SELECT fingerprint, next_visit FROM pages "
+                "WHERE next_visit > ?", (time.time(),)))
+
+    def _get(self, fingerprint):
+        # Caller must hold self.lock.
+        row = self.buffer.get(fingerprint)
+        if row is None:
+            row = self.db.execute(
+                "SELECT * FROM pages WHERE fingerprint = ?", (fingerprint,)
+                ).fetchone()
+        return row
+
+    def due(self, url):
+        ''' True if url was never downloaded or is due for a revisit. '''
+        if not self.enabled:
+            return True
+        next_visit = self.next_visits.get(get_urlfingerprint(url))
+        return next_visit is None or next_visit <= time.time()
+
+    def due_urls(self):
+        ''' Yields the urls due for a revisit. '''
+        if not self.enabled:
+            return
+        self.flush()
+        with self.lock:
+            rows = self.db.execute(
+                "SELECT url FROM pages WHERE next_visit <= ?",
+                (time.time(),)).fetchall()
+        for url, in rows:
+            yield url
+
+    def _interval(self, row, now):
+        checks, changes = row[CHECKS], row[CHANGES]
+        if not checks:
+            interval = self.min_interval
+        elif not changes:
+            interval = 2 * (now - row[FIRST_FETCHED])
+        else:
+            mean = (now - row[FIRST_FETCHED]) / checks
+            rate = -math.log((checks - changes + 0.5) / (checks + 0.5)) / mean \
+                if mean > 0 else 0
+            interval = 1 / rate if rate > 0 else self.max_interval
+        return min(max(interval, self.min_interval), self.max_interval)
+
+    def unchanged(self, url, resp):
+        ''' Records the download of url and returns its row as stored
+        before this download if the page did not change since then, else
+        None. '''
+        if not self.enabled or not resp.body or not 200 <= resp.status < 300:
+            return None
+        headers = resp.headers
+        etag = headers.get("ETag")
+        last_modified = headers.get("Last-Modified")
+        content_hash = body_hash(resp.body)
+        fingerprint = get_urlfingerprint(url)
+        now = time.time()
+        with self.lock:
+            row = self._get(fingerprint)
+            if row is None:
+                row = [fingerprint, url, etag, last_modified, content_hash,
+                       None, 0, 0, now, now, 0, 0, 0]
+                same = False
+            else:
+                previous = tuple(row)
+                row = list(row)
+                same = content_hash == row[BODY_HASH]
+                row[CHECKS] += 1
+                if not same:
+                    row[CHANGES] += 1
+                    row[OUTCOME] = None
+                row[ETAG], row[LAST_MODIFIED] = etag, last_modified
+                row[BODY_HASH], row[LAST_FETCHED] = content_hash, now
+            row[NEXT_VISIT] = now + self._interval(row, now)
+            self.next_visits[fingerprint] = row[NEXT_VISIT]
+            self.buffer[fingerprint] = row
+        # A page whose processing never finished is parsed again.
+        return previous if same and row[OUTCOME] is not None else None
+
+    def record_page(self, url, outcome, word_count=0, simhash=0):
+        ''' Stores what the scraper made of the page just downloaded. '''
+        if not self.enabled:
+            return
+        fingerprint = get_urlfingerprint(url)
+        with self.lock:
+            row = self._get(fingerprint)
+            if row is None:
+                return
+            row = list(row)
+            row[OUTCOME], row[WORD_COUNT] = outcome, word_count
+            row[SIMHASH] = _signed(simhash)
+            self.buffer[fingerprint] = row
+
+    def flush(self):
+        with self.lock:
+            if not self.buffer:
+                return
+            with self.db:
+                self.db.executemany(
+                    f"INSERT OR REPLACE INTO pages VALUES "
+                    f"({', '.join('?' * len(COLUMNS))})",
+                    self.buffer.values())
+            self.buffer = dict()
@@ -0,0 +1,119 @@
+import time
+import urllib.error
+import urllib.request
+import urllib.robotparser
+
+from collections import OrderedDict
+from threading import Lock
+from urllib.parse import urlparse
+
+
+class RobotsCache(object):
+    ''' Process-wide cache of parsed robots.txt files keyed by scheme+netloc.
+
+    Entries expire after ttl seconds. Hosts whose robots.txt could not be
+    fetched are cached as "allow everything" for negative_ttl seconds so a
+    dead host is not retried on every page. At most max_size hosts are kept,
+    evicting the least recently used one. '''
+
+    def __init__(self, ttl=3600, negative_ttl=300, max_size=1024, timeout=10,
+                 user_agent="*"):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_size = max_size
+        self.timeout = timeout
+        self.user_agent = user_agent
+        self.entries = OrderedDict()  # key = scheme://netloc, val = (parser, expires)
+        self.lock = Lock()
+        self.fetch_locks = dict()     # key = scheme://netloc, val = Lock
+
+    def configure(self, config):
+        self.ttl = config.robots_ttl
+        self.negative_ttl = config.robots_negative_ttl
+        self.max_size = config.robots_cache_size
+        self.user_agent = config.user_agent
+
+    def _lookup(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            parser, expires = entry
+            if expires < time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return parser
+
+    def _store(self, key, parser, ttl):
+        with self.lock:
+            self.entries[key] = (parser, time.monotonic() + ttl)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+            self.fetch_locks.pop(key, None)
+
+    def _fetch(self, key):
+        # Same status handling as RobotFileParser.read, but with a timeout.
+        parser = urllib.robotparser.RobotFileParser(f"{key}/robots.txt")
+        try:
+            with urllib.request.urlopen(
+                    parser.url, timeout=self.timeout) as f:
+                parser.parse(f.read().decode("utf-8", "replace").splitlines())
+        except urllib.error.HTTPError as err:
+            if err.code in (401, 403):
+                parser.disallow_all = True
+            else:
+                parser.allow_all = True
+            if err.code >= 500:
+                return parser, self.negative_ttl
+        except (OSError, ValueError, UnicodeError):
+            # Unreachable host or malformed url: allow, retry later.
+            parser.allow_all = True
+            return parser, self.negative_ttl
+        return parser, self.ttl
+
+    def get(self, url):
+        ''' Returns the RobotFileParser for the host of url, fetching it only
+        when it is not cached. '''
+        parsed = urlparse(url)
+        key = f"{parsed.scheme}://{parsed.netloc}"
+        parser = self._lookup(key)
+        if parser is not None:
+            return parser
+        with self.lock:
+            fetch_lock = self.fetch_locks.setdefault(key, Lock())
+        # Only one thread fetches a given host; the others wait for its result.
+        with fetch_lock:
+            parser = self._lookup(key)
+            if parser is None:
+                parser, ttl = self._fetch(key)
+                self._store(key, parser, ttl)
+        return parser
+
+    def add(self, url, text):
+        ''' Caches text as the robots.txt of the host of url, as if it was
+        fetched (e.g. for a site served by a local stand-in server). '''
+        parsed = urlparse(url)
+        key = f"{parsed.scheme}://{parsed.netloc}"
+        parser = urllib.robotparser.RobotFileParser(f"{key}/robots.txt")
+        parser.parse(text.splitlines())
+        self._store(key, parser, self.ttl)
+
+    def can_fetch(self, url):
+        return self.get(url).can_fetch(self.user_agent, url)
+
+    def crawl_delay(self, url):
+        ''' Returns the delay in seconds robots.txt asks for between requests
+        to the host of url, or None if it does not specify one. '''
+        parser = self.get(url)
+        delay = parser.crawl_delay(self.user_agent)
+        if delay is not None:
+            return float(delay)
+        rate = parser.request_rate(self.user_agent)
+        if rate and rate.requests:
+            return rate.seconds / rate.requests
+        return None
+
+
+robots_cache = RobotsCache()
@@ -0,0 +1,266 @@
+import os
+import json
+import time
+import heapq
+import struct
+
+from threading import Lock, RLock, local
+from urllib.parse import urlparse
+
+
+# One page log record: word count, length of the utf-8 url, then the url.
+PAGE_RECORD = struct.Struct("!II")
+
+
+class TopCounter(object):
+    ''' Bounded word counter (space-saving with batched eviction). Holds at
+    most 2 * capacity words; when full it keeps the capacity largest and
+    remembers the largest count it dropped as floor. A word that comes back
+    after being dropped starts from floor, so every count is exact or an
+    overestimate by at most floor, and any word counted more than floor
+    times is never missing from the top. '''
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.counts = dict()
+        self.floor = 0
+
+    def update(self, counts):
+        own = self.counts
+        floor = self.floor
+        for word, count in counts.items():
+            own[word] = own.get(word, floor) + count
+        if len(own) > 2 * self.capacity:
+            kept = heapq.nlargest(
+                self.capacity + 1, own.items(), key=lambda item: item[1])
+            self.floor = max(self.floor, kept.pop()[1])
+            self.counts = dict(kept)
+
+    def most_common(self, n):
+        return heapq.nlargest(n, self.counts.items(), key=lambda item: item[1])
+
+
+class _Shard(object):
+    ''' Stats recorded by one thread since the last merge. Its lock is only
+    ever contended by the merge, never by another worker. '''
+
+    def __init__(self):
+        self.lock = Lock()
+        self.pages = list()     # (url, word count)
+        self.words = dict()     # key = word, val = frequency
+
+
+class CrawlStats(object):
+    ''' Crawl statistics with per-thread shards. Workers record into their
+    own shard; merge() (run by the crawler's background thread) folds the
+    shards into the totals, appends the new pages to an append-only page
+    log and rewrites a small json snapshot atomically. Nothing on the crawl
+    path sorts or writes the full result set. '''
+
+    def __init__(self, top_words=500, longest_pages=50):
+        self.top_words = top_words
+        self.longest_pages = longest_pages
+        self.shards = list()
+        self.shards_lock = Lock()
+        self.local = local()
+        self.merge_lock = RLock()
+        self.page_log_path = None
+        self.snapshot_path = None
+        self._reset()
+
+    def _reset(self):
+        self.page_count = 0
+        self.word_total = 0
+        self.words = TopCounter(self.top_words * 20)
+        self.longest = list()   # min-heap of (word count, url)
+        self.subdomains = dict()    # key = netloc, val = page count
+        self.page_log_size = 0      # bytes of the page log counted above
+        self.started = time.time()  # of the crawl these stats count, kept on resume
+
+    def configure(self, config, restart=False):
+        self.top_words = config.stats_top_words
+        self.longest_pages = config.stats_longest_pages
+        self.page_log_path = config.stats_page_log
+        self.snapshot_path = config.stats_snapshot
+        self._reset()
+        if restart:
+            for path in (self.page_log_path, self.snapshot_path):
+                if os.path.exists(path):
+                    os.remove(path)
+            return
+        # Resume: totals come back from the last snapshot and the pages
+        # logged after it (the whole page log for snapshots without an
+        # offset), word counts from the top words of the snapshot.
+        offset = 0
+        if os.path.exists(self.snapshot_path):
+            with open(self.snapshot_path) as f:
+                snapshot = json.load(f)
+            top_words = snapshot["top_words"]
+            error = snapshot["word_count_error"]
+            if top_words and len(top_words) >= self.top_words:
+                # Words the snapshot left out had at most its last count.
+                error = max(error, top_words[-1][1])
+            self.words.update(dict(top_words))
+            self.words.floor = error
+            self.started = snapshot.get("started", self.started)
+            if "page_log_offset" in snapshot:
+                self._restore(snapshot)
+                offset = snapshot["page_log_offset"]
+        if os.path.exists(self.page_log_path):
+            self.page_log_size = offset
+            for url, word_count in read_page_log(self.page_log_path, offset):
+                self._count_page(url, word_count)
+                self.page_log_size += PAGE_RECORD.size + len(url.encode("utf-8"))
+            if self.page_log_size < os.path.getsize(self.page_log_path):
+                # torn last record, appending after it would garble the log
+                with open(self.page_log_path, "r+b") as page_log:
+                    page_log.truncate(self.page_log_size)
+
+    def _restore(self, snapshot):
+        self.page_count = snapshot["pages"]
+        self.word_total = snapshot["words"]
+        self.longest = [(count, url) for url, count in snapshot["longest_pages"]]
+        heapq.heapify(self.longest)
+        self.subdomains = dict(snapshot["subdomains"])
+
+    def _shard(self):
+        shard = getattr(self.local, "shard", None)
+        if shard is None:
+            shard = self.local.shard = _Shard()
+            with self.shards_lock:
+                self.shards.append(shard)
+        return shard
+
+    def record_page(self, url, word_count, word_frequencies):
+        ''' Records a crawled page with its number of words and the
+        frequencies of the words that count for the report. '''
+        shard = self._shard()
+        with shard.lock:
+            shard.pages.append((url, word_count))
+            words = shard.words
+            for word, count in word_frequencies.items():
+                words[word] = words.get(word, 0) + count
+
+    def merge(self):
+        ''' Folds every shard into the totals and appends the new pages to
+        the page log. Returns the number of pages merged. '''
+        with self.merge_lock:
+            with self.shards_lock:
+                shards = list(self.shards)
+            pages = list()
+            for shard in shards:
+                with shard.lock:
+                    shard_pages, shard.pages = shard.pages, list()
+                    shard_words, shard.words = shard.words, dict()
+                pages.extend(shard_pages)
+                self.words.update(shard_words)
+
+            records = list()
+            for url, word_count in pages:
+                self._count_page(url, word_count)
+                encoded = url.encode("utf-8")
+                records.append(PAGE_RECORD.pack(word_count, len(encoded)))
+                records.append(encoded)
+            if records and self.page_log_path:
+                data = b"".join(records)
+                with open(self.page_log_path, "ab") as page_log:
+                    page_log.write(data)
+                self.page_log_size += len(data)
+            return len(pages)
+
+    def absorb(self, page_log_path, snapshot_path):
+        ''' Adds the pages and words recorded by another CrawlStats (e.g. of
+        one crawl process) in its page log and snapshot. Word counts are then
+        within word_count_error of the true count either way: a word missing
+        from a full top words list may have been counted up to its last
+        count there. '''
+        with self.merge_lock:
+            self.merge()
+            if os.path.exists(page_log_path):
+                # Records are copied one by one rather than as raw bytes, so a
+                # torn last record is not carried over.
+                with open(self.page_log_path or os.devnull, "ab") as page_log:
+                    for url, word_count in read_page_log(page_log_path):
+                        self._count_page(url, word_count)
+                        encoded = url.encode("utf-8")
+                        page_log.write(
+                            PAGE_RECORD.pack(word_count, len(encoded)))
+                        page_log.write(encoded)
+                        self.page_log_size += PAGE_RECORD.size + len(encoded)
+            if os.path.exists(snapshot_path):
+                with open(snapshot_path) as f:
+                    snapshot = json.load(f)
+                top_words = snapshot["top_words"]
+                error = snapshot["word_count_error"]
+                if top_words and len(top_words) >= self.top_words:
+                    error = max(error, top_words[-1][1])
+                self.words.update(dict(top_words))
+                self.words.floor += error
+
+    def _count_page(self, url, word_count):
+        self.page_count += 1
+        self.word_total += word_count
+        netloc = urlparse(url).netloc.lower()
+        self.subdomains[netloc] = self.subdomains.get(netloc, 0) + 1
+        if len(self.longest) < self.longest_pages:
+            heapq.heappush(self.longest, (word_count, url))
+        elif word_count > self.longest[0][0]:
+            heapq.heapreplace(self.longest, (word_count, url))
+
+    def snapshot(self):
+        return {
+            "pages": self.page_count,
+            "words": self.word_total,
+            "longest_pages": sorted(
+                ([url, count] for count, url in self.longest),
+                key=lambda item: item[1], reverse=True),
+            "top_words": self.words.most_common(self.top_words),
+            "word_count_error": self.words.floor,
+            "subdomains": self.subdomains,
+            "page_log_offset": self.page_log_size,
+            "started": self.started,
+        }
+
+    def flush(self):
+        ''' Merges the shards and atomically replaces the snapshot file. '''
+        with self.merge_lock:
+            self.merge()
+            if not self.snapshot_path:
+                return
+            with open(f"{self.snapshot_path}.tmp", "w") as f:
+                json.dump(self.snapshot(), f, separators=(",", ":"))
+            os.replace(f"{self.snapshot_path}.tmp", self.snapshot_path)
+
+    def write_results_file(self, path="results.txt"):
+        ''' Writes results.txt in the format report.py reads: every page by
+        descending word count, then the 50 most frequent words. Sorts the
+        whole page log, so it is only meant for the end of the crawl. '''
+        self.flush()
+        pages = list()
+        if self.page_log_path and os.path.exists(self.page_log_path):
+            pages = sorted(read_page_log(self.page_log_path),
+                           key=lambda item: item[1], reverse=True)
+        with open(f"{path}.tmp", "w") as f:
+            f.write('WORD COUNTS\n')
+            for url, word_count in pages:
+                f.write(f"{url}: {word_count}\n")
+            f.write('\nWORD FREQUENCIES\n')
+            for word, count in self.words.most_common(50):
+                f.write(f"{word}: {count}\n")
+        os.replace(f"{path}.tmp", path)
+
+
+def read_page_log(path, offset=0):
+    ''' Yields (url, word count) for every page in a page log from offset
+    on, streaming. '''
+    with open(path, "rb") as page_log:
+        page_log.seek(offset)
+        while True:
+            header = page_log.read(PAGE_RECORD.size)
+            if len(header) < PAGE_RECORD.size:
+                return
+            word_count, length = PAGE_RECORD.unpack(header)
+            url = page_log.read(length)
+            if len(url) < length:
+                return
+            yield url.decode("utf-8"), word_count
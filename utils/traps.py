@@ -0,0 +1,265 @@
+import re
+
+from collections import OrderedDict
+from threading import Lock
+from urllib.parse import urlsplit, parse_qsl
+
+from utils import get_logger
+
+
+# Outcomes of a downloaded page, as recorded by the scraper.
+USEFUL = "useful"           # new content, its links were followed
+DUPLICATE = "duplicate"     # near-duplicate of a page already crawled
+LOW_VALUE = "low value"     # no text, or too few or too many unique words
+FAILED = "failed"           # error status or empty body
+
+DIGITS = re.compile(r"\d+")
+
+
+class _Stats(object):
+    ''' Counters of one host or one url pattern. '''
+
+    __slots__ = ("admitted", "pending", "outcomes", "params", "blacklisted")
+
+    def __init__(self):
+        self.admitted = 0
+        self.pending = 0        # admitted urls not completed yet
+        self.outcomes = dict()  # key = outcome, val = count
+        self.params = dict()    # key = query parameter, val = set of values
+        self.blacklisted = False
+
+    @property
+    def fetched(self):
+        return sum(self.outcomes.values())
+
+    @property
+    def yield_ratio(self):
+        fetched = self.fetched
+        return self.outcomes.get(USEFUL, 0) / fetched if fetched else 1.0
+
+    @property
+    def duplicate_rate(self):
+        fetched = self.fetched
+        return self.outcomes.get(DUPLICATE, 0) / fetched if fetched else 0.0
+
+
+class TrapDetector(object):
+    ''' Keeps the frontier out of crawler traps: infinite calendars, paths
+    that repeat themselves and endless query permutations.
+
+    Every url maps to a pattern: its host, its path with numbers replaced by
+    0 and the names (not values) of its query parameters, so
+    /events/2019-05-12?date=... and /events/2031-01-01?date=... are the same
+    pattern. For every pattern and host the detector counts the urls
+    admitted and still pending and, once downloaded, what they yielded (new
+    content, near-duplicate, low value, error), and how many distinct values
+    each query parameter took.
+
+    admit() is asked before a url enters the frontier. It refuses:
+    - urls deeper than max_depth segments, with a segment repeated more
+      than max_repeat times, or longer than max_length characters;
+    - urls of a pattern whose yield of new content fell below min_yield
+      after min_samples downloads (the pattern is blacklisted for good);
+    - urls of a pattern with max_pending urls already waiting;
+    - urls of a pattern with a query parameter seen with more than
+      max_param_values values, or of a host whose yield is below
+      min_yield, while slow_pending of its urls are waiting. '''
+
+    def __init__(self, max_depth=12, max_repeat=2, max_length=300,
+                 min_samples=20, min_yield=0.1, max_param_values=200,
+                 max_pending=500, slow_pending=10, max_patterns=100000):
+        self.logger = None  # made by configure(), importing must not create a log file
+        self.lock = Lock()
+        self._reset(max_depth, max_repeat, max_length, min_samples,
+                    min_yield, max_param_values, max_pending, slow_pending,
+                    max_patterns)
+
+    def _reset(self, max_depth, max_repeat, max_length, min_samples,
+               min_yield, max_param_values, max_pending, slow_pending,
+               max_patterns):
+        self.max_depth = max_depth
+        self.max_repeat = max_repeat
+        self.max_length = max_length
+        self.min_samples = min_samples
+        self.min_yield = min_yield
+        self.max_param_values = max_param_values
+        self.max_pending = max_pending
+        self.slow_pending = slow_pending
+        self.max_patterns = max_patterns
+        self.patterns = OrderedDict()   # key = pattern, val = _Stats
+        self.hosts = dict()             # key = host, val = _Stats
+        self.rejected = dict()          # key = reason, val = count
+
+    def configure(self, config):
+        with self.lock:
+            self.logger = get_logger("TRAPS")
+            self._reset(
+                config.trap_max_depth, config.trap_max_repeat,
+                config.trap_max_length, config.trap_min_samples,
+                config.trap_min_yield, config.trap_param_values,
+                config.trap_max_pending, config.trap_slow_pending,
+                config.trap_max_patterns)
+
+    def _split(self, url):
+        parts = urlsplit(url)
+        host = parts.netloc.lower()
+        segments = [segment for segment in parts.path.split("/") if segment]
+        params = parse_qsl(parts.query, keep_blank_values=True)
+        pattern = "{}/{}?{}".format(
+            host, DIGITS.sub("0", "/".join(segments)),
+            "&".join(sorted({name for name, _ in params})))
+        return host, segments, params, pattern
+
+    def _path_trap(self, url, segments):
+        if len(url) > self.max_length:
+            return "url too long"
+        if len(segments) > self.max_depth:
+            return "path too deep"
+        counts = dict()
+        for segment in segments:
+            counts[segment] = counts.get(segment, 0) + 1
+            if counts[segment] > self.max_repeat:
+                return "repeating path"
+        return None
+
+    def _pattern(self, pattern):
+        # Caller must hold self.lock.
+        stats = self.patterns.get(pattern)
+        if stats is None:
+            stats = self.patterns[pattern] = _Stats()
+            if len(self.patterns) > self.max_patterns:
+                self.patterns.popitem(last=False)
+        else:
+            self.patterns.move_to_end(pattern)
+        return stats
+
+    def _host(self, host):
+        stats = self.hosts.get(host)
+        if stats is None:
+            stats = self.hosts[host] = _Stats()
+        return stats
+
+    def _low_yield(self, stats):
+        return (stats.fetched >= self.min_samples
+                and stats.yield_ratio < self.min_yield)
+
+    def _reject(self, reason):
+        self.rejected[reason] = self.rejected.get(reason, 0) + 1
+        return False
+
+    def admit(self, url):
+        ''' Returns True if url may enter the frontier, and counts it as
+        pending if so. '''
+        host, segments, params, pattern = self._split(url)
+        with self.lock:
+            reason = self._path_trap(url, segments)
+            if reason:
+                return self._reject(reason)
+            stats = self._pattern(pattern)
+            if stats.blacklisted:
+                return self._reject("blacklisted pattern")
+            if stats.pending >= self.max_pending:
+                return self._reject("throttled pattern")
+
+            host_stats = self._host(host)
+            endless = False
+            for name, value in params:
+                values = stats.params.get(name)
+                if values is None:
+                    values = stats.params[name] = set()
+                if len(values) <= self.max_param_values:
+                    values.add(value)
+                if len(values) > self.max_param_values:
+                    endless = True
+            if (endless or self._low_yield(host_stats)) and \
+                    stats.pending >= self.slow_pending:
+                return self._reject("throttled pattern")
+
+            for counters in (stats, host_stats):
+                counters.admitted += 1
+                counters.pending += 1
+            return True
+
+    def record(self, url, outcome):
+        ''' Records what the download of url yielded and blacklists its
+        pattern once it has proved to be a trap. '''
+        host, _, _, pattern = self._split(url)
+        with self.lock:
+            stats = self._pattern(pattern)
+            for counters in (stats, self._host(host)):
+                counters.outcomes[outcome] = counters.outcomes.get(outcome, 0) + 1
+            if not stats.blacklisted and self._low_yield(stats):
+                stats.blacklisted = True
+                if self.logger:
+                    self.logger.info(
+                        f"Blacklisted {pattern}: {stats.yield_ratio:.0%} new "
+                        f"content, {stats.duplicate_rate:.0%} duplicates in "
+                        f"{stats.fetched} pages.")
+
+    def complete(self, url):
+        ''' Called when url leaves the frontier, downloaded or not. '''
+        host, _, _, pattern = self._split(url)
+        with self.lock:
+            for counters in (self._pattern(pattern), self._host(host)):
+                counters.pending = max(counters.pending - 1, 0)
+
+    def host_stats(self, host):
+        ''' (pages downloaded, share of them with new content) of host. '''
+        with self.lock:
+            stats = self.hosts.get(host)
+            if stats is None:
+                return 0, 1.0
+            return stats.fetched, stats.yield_ratio
+
+    def state(self):
+        ''' Counters of every pattern and host, as lists and dicts that
+        restore() takes back (e.g. from a checkpoint). '''
+        with self.lock:
+            return {
+                "patterns": [
+                    [pattern, stats.admitted, stats.pending, stats.outcomes,
+                     {name: sorted(values)
+                      for name, values in stats.params.items()},
+                     stats.blacklisted]
+                    for pattern, stats in self.patterns.items()],
+                "hosts": [
+                    [host, stats.admitted, stats.pending, stats.outcomes]
+                    for host, stats in self.hosts.items()],
+                "rejected": dict(self.rejected),
+            }
+
+    def restore(self, state):
+        with self.lock:
+            self.patterns = OrderedDict()
+            for pattern, admitted, pending, outcomes, params, blacklisted \
+                    in state["patterns"]:
+                stats = self.patterns[pattern] = _Stats()
+                stats.admitted = admitted
+                stats.pending = pending
+                stats.outcomes = dict(outcomes)
+                stats.params = {
+                    name: set(values) for name, values in params.items()}
+                stats.blacklisted = blacklisted
+            self.hosts = dict()
+            for host, admitted, pending, outcomes in state["hosts"]:
+                stats = self.hosts[host] = _Stats()
+                stats.admitted = admitted
+                stats.pending = pending
+                stats.outcomes = dict(outcomes)
+            self.rejected = dict(state["rejected"])
+
+    def summary(self):
+        ''' Urls refused by reason, and the blacklisted patterns. '''
+        with self.lock:
+            return {
+                "rejected": dict(self.rejected),
+                "blacklisted": sorted(
+                    pattern for pattern, stats in self.patterns.items()
+                    if stats.blacklisted),
+                "hosts": {
+                    host: {"admitted": stats.admitted,
+                           "fetched": stats.fetched,
+                           "yield": round(stats.yield_ratio, 3),
+                           "duplicates": round(stats.duplicate_rate, 3)}
+                    for host, stats in self.hosts.items()},
+            }
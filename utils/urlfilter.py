@@ -0,0 +1,83 @@
+import re
+
+
+DEFAULT_SCHEMES = ("http", "https")
+DEFAULT_DOMAINS = ("ics.uci.edu", "cs.uci.edu", "informatics.uci.edu",
+                   "stat.uci.edu")
+# Extensions of files that are not web pages.
+DEFAULT_EXTENSIONS = (
+    "css js bmp gif jpeg jpg ico png tif tiff mid mp2 mp3 mp4 wav avi mov "
+    "mpeg ram m4v mkv ogg ogv pdf ps eps tex ppt pptx pps ppsx doc docx xls "
+    "xlsx names data dat exe bz2 tar msi bin 7z psd dmg iso epub dll cnf tgz "
+    "sha1 thmx mso arff rtf jar csv rm smil wmv swf wma zip rar gz").split()
+
+# scheme://netloc/path, the parts of a url the filter looks at. A regex match
+# is several times faster than urlsplit, which also parses the query and
+# fragment and validates the port.
+URL_PATTERN = re.compile(r"([a-zA-Z][a-zA-Z0-9+.-]*)://([^/?#]*)([^?#]*)")
+
+
+class UrlFilter(object):
+    ''' Decides which urls to crawl. Built once, then every check is a few
+    string operations: the scheme and extension are looked up in sets, the
+    host is matched against the allowed domains by suffix (a domain allows
+    itself and all its subdomains).
+
+    rules is an ordered list of ("allow" | "deny", regex) checked against
+    the whole url before the domain and extension checks; the first rule
+    that matches decides. '''
+
+    ACTIONS = ("allow", "deny")
+
+    def __init__(self, domains=DEFAULT_DOMAINS, extensions=DEFAULT_EXTENSIONS,
+                 rules=(), schemes=DEFAULT_SCHEMES):
+        self._reset(domains, extensions, rules, schemes)
+
+    def _reset(self, domains, extensions, rules, schemes):
+        domains = [domain.strip().strip(".").lower() for domain in domains]
+        self.domains = frozenset(domain for domain in domains if domain)
+        self.domain_suffixes = tuple(f".{domain}" for domain in self.domains)
+        self.extensions = frozenset(
+            extension.strip().lstrip(".").lower() for extension in extensions)
+        self.schemes = frozenset(scheme.lower() for scheme in schemes)
+        self.rules = list()
+        for action, pattern in rules:
+            if action not in self.ACTIONS:
+                raise ValueError(
+                    f"Unknown url rule action {action}, "
+                    f"use one of {', '.join(self.ACTIONS)}.")
+            self.rules.append((action == "allow", re.compile(pattern)))
+
+    def configure(self, config):
+        self._reset(config.allowed_domains, config.skipped_extensions,
+                    config.url_rules, DEFAULT_SCHEMES)
+
+    def allows(self, url):
+        match = URL_PATTERN.match(url)
+        if match is None:
+            return False
+        scheme, netloc, path = match.groups()
+        if scheme.lower() not in self.schemes:
+            return False
+
+        for allow, pattern in self.rules:
+            if pattern.search(url):
+                return allow
+
+        # user:password@host:port -> host
+        host = netloc.rpartition("@")[2].partition(":")[0].lower()
+        if not (host in self.domains or host.endswith(self.domain_suffixes)):
+            return False
+
+        # extension of the last path segment, without ;params
+        segment = path.rpartition("/")[2].partition(";")[0]
+        dot = segment.rfind(".")
+        return dot == -1 or segment[dot + 1:].lower() not in self.extensions
+
+    __call__ = allows
+
+    def filter(self, urls):
+        ''' Returns the urls of an iterable (e.g. the links of a page) that
+        are allowed, in order. '''
+        allows = self.allows
+        return [url for url in urls if allows(url)]